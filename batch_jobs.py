@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import time
+
+from google.genai.types import UploadFileConfig
+
+from structured_log import get_logger, log_event
+
+logger = get_logger("batch_jobs")
+
+BATCH_POLL_SECONDS = 60
+BATCH_TIMEOUT_SECONDS = 48 * 3600  # Gemini batch jobs expire after 48 hours
+
+SUCCEEDED_STATES = {"JOB_STATE_SUCCEEDED"}
+FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+class BatchJobError(Exception):
+    """A batch job ended without results (failed, cancelled, expired or timed out)."""
+
+    def __init__(self, message: str, job_name: str, state: str):
+        super().__init__(message)
+        self.job_name = job_name
+        self.state = state
+
+
+def _generation_config(config) -> dict:
+    # Sampling, length and output-schema settings travel in a batch line; none of our batched prompts use tools
+    return config.model_dump(
+        mode="json", exclude_none=True,
+        include={"temperature", "max_output_tokens", "top_p", "top_k", "response_mime_type", "response_schema"},
+    )
+
+
+def write_batch_requests(path: str, requests) -> int:
+    """
+    Write (key, prompt, config) tuples as a Gemini batch input file (one JSON request per line).
+
+    Returns:
+        int: Number of requests written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as requests_file:
+        for key, prompt, config in requests:
+            line = {
+                "key": key,
+                "request": {
+                    "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                    "generation_config": _generation_config(config),
+                },
+            }
+            requests_file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _response_text(response: dict) -> str:
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts if not part.get("thought"))
+
+
+def read_batch_results(path: str) -> dict:
+    """
+    Read a batch output file into {key: text}. Requests that failed inside the job map to
+    None, so callers can tell them apart from an empty answer.
+    """
+    results = {}
+    with open(path, encoding="utf-8") as results_file:
+        for line in results_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("error") or "response" not in entry:
+                log_event(logger, logging.WARNING, "batch request failed", key=entry.get("key"), error=entry.get("error"))
+                results[entry.get("key")] = None
+            else:
+                results[entry["key"]] = _response_text(entry["response"]).strip()
+    return results
+
+
+class GeminiBatchBackend:
+    """Submits batch input files through the Gemini Files and Batches APIs."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, model: str, requests_path: str, display_name: str) -> str:
+        uploaded = self.client.files.upload(
+            file=requests_path,
+            config=UploadFileConfig(display_name=display_name, mime_type="jsonl"),
+        )
+        job = self.client.batches.create(model=model, src=uploaded.name, config={"display_name": display_name})
+        return job.name
+
+    def state(self, job_name: str) -> str:
+        job = self.client.batches.get(name=job_name)
+        return job.state.name if hasattr(job.state, "name") else str(job.state)
+
+    def download_results(self, job_name: str, results_path: str) -> None:
+        job = self.client.batches.get(name=job_name)
+        self.client.files.download(file=job.dest.file_name, destination=results_path)
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for GeminiBatchBackend: each request line is answered through
+    `client.models.generate_content` (a fake or real client) when the job is submitted,
+    and the job reports RUNNING for `polls_until_done` polls before it succeeds.
+    """
+
+    def __init__(self, client, polls_until_done: int = 1):
+        self.client = client
+        self.polls_until_done = polls_until_done
+        self.jobs = {}
+
+    def submit(self, model: str, requests_path: str, display_name: str) -> str:
+        lines = []
+        with open(requests_path, encoding="utf-8") as requests_file:
+            for line in requests_file:
+                entry = json.loads(line)
+                request = entry["request"]
+                prompt = "".join(part["text"] for part in request["contents"][0]["parts"])
+                try:
+                    response = self.client.models.generate_content(
+                        model=model, contents=prompt, config=request.get("generation_config")
+                    )
+                    result = {"key": entry["key"], "response": {
+                        "candidates": [{"content": {"role": "model", "parts": [{"text": response.text or ""}]}}]
+                    }}
+                except Exception as e:
+                    result = {"key": entry["key"], "error": {"message": str(e)}}
+                lines.append(json.dumps(result, ensure_ascii=False))
+        job_name = f"batches/local-{len(self.jobs) + 1}"
+        self.jobs[job_name] = {"lines": lines, "polls": 0}
+        return job_name
+
+    def state(self, job_name: str) -> str:
+        job = self.jobs[job_name]
+        job["polls"] += 1
+        return "JOB_STATE_SUCCEEDED" if job["polls"] >= self.polls_until_done else "JOB_STATE_RUNNING"
+
+    def download_results(self, job_name: str, results_path: str) -> None:
+        with open(results_path, "w", encoding="utf-8") as results_file:
+            results_file.write("\n".join(self.jobs[job_name]["lines"]) + "\n")
+
+
+def run_batch_job(backend, model: str, requests_path: str, results_path: str, display_name: str,
+                  job_name: str | None = None, poll_seconds: float | None = None,
+                  timeout_seconds: float = BATCH_TIMEOUT_SECONDS, on_submitted=None) -> dict:
+    """
+    Submit a batch input file (or attach to `job_name` if given), poll until the job
+    finishes, download its output and return {key: text}.
+
+    Args:
+        backend: GeminiBatchBackend, LocalBatchBackend or any object with submit/state/download_results.
+        on_submitted (callable | None): Called with the job name right after submission, so the
+            caller can persist it and re-attach after a restart instead of paying for a new job.
+
+    Raises:
+        BatchJobError: If the job fails, is cancelled or expires, or `timeout_seconds` passes.
+    """
+    if job_name is None:
+        job_name = backend.submit(model, requests_path, display_name)
+        log_event(logger, logging.INFO, "batch job submitted", job=job_name)
+        if on_submitted is not None:
+            on_submitted(job_name)
+    else:
+        log_event(logger, logging.INFO, "attaching to batch job", job=job_name)
+
+    started = time.monotonic()
+    last_state = None
+    while True:
+        state = backend.state(job_name)
+        if state != last_state:
+            log_event(logger, logging.INFO, "batch job state", job=job_name, state=state)
+            last_state = state
+        if state in SUCCEEDED_STATES:
+            break
+        if state in FAILED_STATES:
+            raise BatchJobError(f"Batch job {job_name} ended in {state}", job_name, state)
+        if time.monotonic() - started > timeout_seconds:
+            raise BatchJobError(f"Batch job {job_name} still {state} after {timeout_seconds:.0f}s", job_name, state)
+        time.sleep(BATCH_POLL_SECONDS if poll_seconds is None else poll_seconds)
+
+    backend.download_results(job_name, results_path)
+    return read_batch_results(results_path)
+
+
+def remove_batch_files(*paths: str) -> None:
+    """Delete local batch input/output/job files once their results are merged."""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
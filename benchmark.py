@@ -0,0 +1,300 @@
+"""
+End-to-end throughput benchmarks against the offline fake Gemini backend.
+
+Each scenario runs in a fresh process (so peak RSS is per scenario) with
+fake_gemini.FakeGeminiClient installed, on a synthetic sheet of the requested size, and
+reports rows/sec, p50/p95/p99 row latency, peak RSS and tokens per row. Results are
+written as JSON; pass --compare with an earlier results file to see the deltas.
+
+    python benchmark.py --sizes 100 10000 --concurrency 10 50 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from excel_stream import StreamingExcelWriter
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+DEFAULT_CONCURRENCY = [10, 50, 200]
+DEFAULT_RESULTS_DIR = "benchmark_results"
+# Streaming keeps memory flat on the large sheets; the in-memory path is what small runs use
+STREAMING_THRESHOLD_ROWS = 10_000
+
+SYNTHETIC_POST = """Feed post number {number}
+
+{name}
+{name}
+• 2nd
+Founder at {company}
+{age}mo •  {age} months ago • Visible to anyone on or off LinkedIn
+Follow
+We just shipped a new release of our {product} platform. Huge thanks to the team and our {customers} customers!
+Like
+Comment
+Repost
+Send
+"""
+
+
+def make_synthetic_sheet(filename: str, rows: int, seed: int = 0) -> None:
+    """Write a sheet shaped like an Apollo export: a company website and scraped LinkedIn posts per row."""
+    rng = random.Random(seed)
+    with StreamingExcelWriter(filename, ["company website", "posts"]) as writer:
+        for index in range(rows):
+            company = f"company{index}"
+            posts = "".join(
+                SYNTHETIC_POST.format(
+                    number=number + 1, name=f"Founder {index}", company=company, age=rng.randint(1, 24),
+                    product=rng.choice(("analytics", "payments", "logistics", "hiring")),
+                    customers=rng.randint(10, 5000),
+                )
+                for number in range(rng.randint(1, 5))
+            )
+            writer.append({"company website": f"https://www.{company}.com/", "posts": posts})
+
+
+def _percentile(values: list[float], percentile: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = min(len(ordered) - 1, max(0, round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[position]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _install_backend(backend_options: dict):
+    from fake_gemini import FakeGeminiClient, LatencyModel, install_fake_client
+    from rate_limiter import configure_rate_limit
+
+    fake = install_fake_client(FakeGeminiClient(
+        latency=LatencyModel(**backend_options["latency"]),
+        error_rates={int(code): rate for code, rate in backend_options["error_rates"].items()},
+        seed=backend_options["seed"],
+    ))
+    if not backend_options["respect_rate_limits"]:
+        # Measure the pipeline itself, not the (real-quota) limiter
+        for model in ("gemini-2.0-flash", "gemini-2.5-flash-preview-05-20"):
+            configure_rate_limit(model, 1e9, 1e12)
+    return fake
+
+
+def _run_final(input_filename, workdir, rows, concurrency, options):
+    from final import process_excel_filter_and_generate_emails
+
+    row_results = process_excel_filter_and_generate_emails(
+        input_filename, os.path.join(workdir, "output.xlsx"), "Write a short, friendly cold email.",
+        "Write a short LinkedIn connection note.", async_mode=concurrency > 1, concurrency=concurrency,
+        streaming=rows >= STREAMING_THRESHOLD_ROWS, **options
+    )
+    latencies = [result["stage_timings"]["row"] for result in row_results if "row" in result.get("stage_timings", {})]
+    return latencies, sum(1 for result in row_results if result.get("error"))
+
+
+def _run_values_check(input_filename, workdir, rows, concurrency, options):
+    from values_check import process_excel_and_write_true_only
+
+    process_excel_and_write_true_only(input_filename, os.path.join(workdir, "true_only.xlsx"), limit_rows=-1)
+    return [], 0
+
+
+def _run_generators(input_filename, workdir, rows, concurrency, options):
+    from email_crafting import generate_cold_email_async
+    from excel_stream import iter_excel_rows
+    from linkeding_message_crafting import generate_linkedin_connection_note_async
+    from resilient_call import GeminiCallError
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        failed = 0
+
+        async def one(values):
+            nonlocal failed
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await generate_cold_email_async(values["company website"], values["posts"], "Write a short email.")
+                    await generate_linkedin_connection_note_async(values["company website"], values["posts"], "Write a note.")
+                except GeminiCallError:
+                    failed += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(values) for _, values in iter_excel_rows(input_filename, ["company website", "posts"])))
+        return latencies, failed
+
+    return asyncio.run(run())
+
+
+SCENARIOS = {
+    "final": _run_final,                # screen + email + LinkedIn through process_excel_filter_and_generate_emails
+    "values_check": _run_values_check,  # process_excel_and_write_true_only over the whole sheet
+    "generators": _run_generators,      # email + LinkedIn generators only, no screening
+}
+
+
+def _run_scenario(scenario, input_filename, rows, concurrency, backend_options, options):
+    # Runs in a fresh worker process; per-row log lines would only measure the terminal
+    from structured_log import configure_logging
+
+    configure_logging(level="WARNING")
+    fake = _install_backend(backend_options)
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        latencies, failed = SCENARIOS[scenario](input_filename, workdir, rows, concurrency, options)
+        elapsed = time.perf_counter() - started
+    return {
+        "scenario": scenario,
+        "rows": rows,
+        "concurrency": concurrency,
+        "failed_rows": failed,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 2) if elapsed > 0 else None,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_p99": _percentile(latencies, 99),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "calls": fake.calls,
+        "injected_errors": {str(code): count for code, count in fake.errors.items()},
+        "input_tokens_per_row": round(fake.input_tokens / rows, 1) if rows else None,
+        "output_tokens_per_row": round(fake.output_tokens / rows, 1) if rows else None,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=None, concurrency_levels=None, scenarios=("final",), backend_options=None, options=None,
+                   results_dir=DEFAULT_RESULTS_DIR) -> str:
+    """
+    Run every scenario x size x concurrency combination, each in its own process, and
+    write the results to a timestamped JSON file in `results_dir`.
+
+    Returns:
+        str: Path of the results file.
+    """
+    sizes = sizes or DEFAULT_SIZES
+    concurrency_levels = concurrency_levels or DEFAULT_CONCURRENCY
+    backend_options = backend_options or {
+        "latency": {"distribution": "lognormal", "median": 0.05, "sigma": 0.5},
+        "error_rates": {}, "seed": 0, "respect_rate_limits": False,
+    }
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as sheets_dir:
+        for rows in sizes:
+            input_filename = os.path.join(sheets_dir, f"synthetic_{rows}.xlsx")
+            make_synthetic_sheet(input_filename, rows)
+            for scenario in scenarios:
+                # values_check ignores concurrency; run it once per size
+                levels = [1] if scenario == "values_check" else concurrency_levels
+                for concurrency in levels:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        result = pool.submit(
+                            _run_scenario, scenario, input_filename, rows, concurrency, backend_options, options or {}
+                        ).result()
+                    latencies = "  ".join(
+                        f"{name}={result['latency_' + name]:.3f}s" for name in ("p50", "p95", "p99")
+                        if result["latency_" + name] is not None
+                    )
+                    print(
+                        f"{scenario:<12} rows={result['rows']:<7} concurrency={concurrency:<4} "
+                        f"{result['rows_per_second']} rows/s  {latencies}  rss={result['peak_rss_mb']}MB  "
+                        f"tokens/row={result['input_tokens_per_row']}+{result['output_tokens_per_row']}"
+                    )
+                    results.append(result)
+
+    os.makedirs(results_dir, exist_ok=True)
+    results_filename = os.path.join(results_dir, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_filename, "w", encoding="utf-8") as results_file:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend_options,
+            "options": options or {},
+            "results": results,
+        }, results_file, indent=2)
+    print(f"\nBenchmark results saved to {results_filename}")
+    return results_filename
+
+
+def compare_results(baseline_filename: str, current_filename: str, tolerance: float = 0.1) -> list[str]:
+    """
+    Compare two results files run for run (same scenario, rows and concurrency). Returns a
+    line per throughput drop or p95 latency increase larger than `tolerance` (10%).
+    """
+    def load(filename):
+        with open(filename, encoding="utf-8") as results_file:
+            return {
+                (result["scenario"], result["rows"], result["concurrency"]): result
+                for result in json.load(results_file)["results"]
+            }
+
+    baseline, current = load(baseline_filename), load(current_filename)
+    regressions = []
+    for key, result in current.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if before["rows_per_second"] and result["rows_per_second"] < before["rows_per_second"] * (1 - tolerance):
+            regressions.append(f"{key}: rows/s {before['rows_per_second']} -> {result['rows_per_second']}")
+        if before["latency_p95"] and result["latency_p95"] and result["latency_p95"] > before["latency_p95"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {before['latency_p95']:.3f}s -> {result['latency_p95']:.3f}s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmarks against the fake Gemini backend")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--scenarios", nargs="+", default=["final"], choices=sorted(SCENARIOS))
+    parser.add_argument("--latency-distribution", default="lognormal")
+    parser.add_argument("--latency-median", type=float, default=0.05, help="seconds per fake call")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--respect-rate-limits", action="store_true", help="keep the real per-model RPM/TPM limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream-email", action="store_true", help="final scenario: stream emails with early stop")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    args = parser.parse_args()
+
+    results_filename = run_benchmarks(
+        sizes=args.sizes,
+        concurrency_levels=args.concurrency,
+        scenarios=args.scenarios,
+        backend_options={
+            "latency": {"distribution": args.latency_distribution, "median": args.latency_median, "sigma": args.latency_sigma},
+            "error_rates": {429: args.rate_429, 500: args.rate_500},
+            "seed": args.seed,
+            "respect_rate_limits": args.respect_rate_limits,
+        },
+        options={"stream_email": True} if args.stream_email else None,
+        results_dir=args.results_dir,
+    )
+    if args.compare:
+        regressions = compare_results(args.compare, results_filename)
+        print("\n".join(["Regressions:"] + regressions) if regressions else "No regressions against " + args.compare)
@@ -0,0 +1,259 @@
+import contextvars
+import copy
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+# USD per 1M tokens (input, output) on the paid tier; thinking tokens are billed as output.
+# Cached input tokens (context caching) are billed at CACHED_INPUT_PRICE_RATIO of the input price.
+PRICES_PER_MILLION_TOKENS = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash-preview-05-20": (0.15, 0.60),
+}
+CACHED_INPUT_PRICE_RATIO = 0.25
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Row id (and any other tag) of the calls made in the current thread / asyncio task
+_call_tags = contextvars.ContextVar("gemini_call_tags", default={})
+
+
+@contextmanager
+def tag_calls(**tags):
+    """
+    Tag every Gemini call made inside the block, e.g. `with tag_calls(row=index):`.
+    asyncio tasks started inside the block inherit the tags.
+    """
+    token = _call_tags.set({**_call_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _call_tags.reset(token)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float | None:
+    """Estimated USD cost of one call from its token counts, or None for a model without a known price."""
+    prices = PRICES_PER_MILLION_TOKENS.get(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    uncached = max(0, input_tokens - cached_tokens)
+    return (
+        uncached * input_price + cached_tokens * input_price * CACHED_INPUT_PRICE_RATIO + output_tokens * output_price
+    ) / 1_000_000
+
+
+@dataclass
+class CallRecord:
+    """One Gemini call as seen by the caller, including rate-limiter waits and retries."""
+    model: str
+    stage: str | None
+    row: int | None
+    status: str                  # "ok" or "error"
+    attempts: int
+    wall_seconds: float          # from the first limiter wait to the final answer
+    ttft_seconds: float | None   # from sending the successful request to its first token
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    cost_usd: float | None
+
+
+def _usage(response) -> tuple[int, int, int]:
+    metadata = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(metadata, "prompt_token_count", None) or 0
+    output_tokens = (getattr(metadata, "candidates_token_count", None) or 0) + (
+        getattr(metadata, "thoughts_token_count", None) or 0
+    )
+    cached_tokens = getattr(metadata, "cached_content_token_count", None) or 0
+    return input_tokens, output_tokens, cached_tokens
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process store of per-call records and their aggregates, shared by every call site
+    through resilient_call. Export with write_prometheus() (text exposition format, e.g.
+    for node_exporter's textfile collector) or write_summary() (per-run JSON).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far (called at the start of each run)."""
+        with self._lock:
+            self.calls = []
+            self._series = {}
+
+    def record(self, call: CallRecord) -> None:
+        with self._lock:
+            self.calls.append(call)
+            series = self._series.setdefault((call.model, call.stage or ""), {
+                "calls": {}, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0,
+                "retries": 0, "wall": [0] * (len(LATENCY_BUCKETS) + 1), "wall_sum": 0.0,
+                "ttft": [0] * (len(LATENCY_BUCKETS) + 1), "ttft_sum": 0.0,
+            })
+            series["calls"][call.status] = series["calls"].get(call.status, 0) + 1
+            series["input_tokens"] += call.input_tokens
+            series["output_tokens"] += call.output_tokens
+            series["cached_tokens"] += call.cached_tokens
+            series["cost_usd"] += call.cost_usd or 0.0
+            series["retries"] += call.attempts - 1
+            series["wall"][self._bucket(call.wall_seconds)] += 1
+            series["wall_sum"] += call.wall_seconds
+            if call.ttft_seconds is not None:
+                series["ttft"][self._bucket(call.ttft_seconds)] += 1
+                series["ttft_sum"] += call.ttft_seconds
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        for position, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                return position
+        return len(LATENCY_BUCKETS)
+
+    def summary(self) -> dict:
+        """
+        Totals for the run plus a breakdown per (model, stage) and per row.
+
+        Returns:
+            dict: {"totals", "by_model_stage", "by_row"}; token counts, cost in USD, wall times in seconds.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        totals = {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+        by_model_stage = {}
+        by_row = {}
+        for call in calls:
+            for entry in (
+                totals,
+                by_model_stage.setdefault(f"{call.model}/{call.stage or '-'}", {
+                    "calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                    "wall_seconds": [], "ttft_seconds": [],
+                }),
+                by_row.setdefault(str(call.row) if call.row is not None else "-", {
+                    "calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                }),
+            ):
+                entry["calls"] += 1
+                entry["errors"] += call.status != "ok"
+                entry["input_tokens"] += call.input_tokens
+                entry["output_tokens"] += call.output_tokens
+                entry["cost_usd"] += call.cost_usd or 0.0
+            stage_entry = by_model_stage[f"{call.model}/{call.stage or '-'}"]
+            stage_entry["wall_seconds"].append(call.wall_seconds)
+            if call.ttft_seconds is not None:
+                stage_entry["ttft_seconds"].append(call.ttft_seconds)
+        for entry in by_model_stage.values():
+            for name in ("wall_seconds", "ttft_seconds"):
+                values = sorted(entry.pop(name))
+                prefix = name.replace("_seconds", "")
+                entry[f"{prefix}_mean"] = sum(values) / len(values) if values else None
+                entry[f"{prefix}_p50"] = values[len(values) // 2] if values else None
+                entry[f"{prefix}_p95"] = values[min(len(values) - 1, int(len(values) * 0.95))] if values else None
+                entry[f"{prefix}_max"] = values[-1] if values else None
+        return {"totals": totals, "by_model_stage": by_model_stage, "by_row": by_row}
+
+    def write_summary(self, filename: str, include_calls: bool = False, **run_info) -> None:
+        """Write summary() (plus `run_info` and, if asked, every call record) as JSON."""
+        document = {**run_info, **self.summary()}
+        if include_calls:
+            with self._lock:
+                document["calls"] = [asdict(call) for call in self.calls]
+        with open(filename, "w", encoding="utf-8") as summary_file:
+            json.dump(document, summary_file, indent=2)
+
+    def prometheus_text(self) -> str:
+        """Aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            series = copy.deepcopy(self._series)
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        metric("gemini_calls_total", "counter", "Gemini calls by final status.", [
+            f"gemini_calls_total{_labels(model=model, stage=stage, status=status)} {count}"
+            for (model, stage), entry in series.items() for status, count in entry["calls"].items()
+        ])
+        metric("gemini_call_retries_total", "counter", "Retried attempts of Gemini calls.", [
+            f"gemini_call_retries_total{_labels(model=model, stage=stage)} {entry['retries']}"
+            for (model, stage), entry in series.items()
+        ])
+        metric("gemini_tokens_total", "counter", "Tokens reported in usage_metadata.", [
+            f"gemini_tokens_total{_labels(model=model, stage=stage, type=kind)} {entry[kind + '_tokens']}"
+            for (model, stage), entry in series.items() for kind in ("input", "output", "cached")
+        ])
+        metric("gemini_cost_usd_total", "counter", "Estimated cost in US dollars.", [
+            f"gemini_cost_usd_total{_labels(model=model, stage=stage)} {entry['cost_usd']:.6f}"
+            for (model, stage), entry in series.items()
+        ])
+        for name, key, help_text in (
+            ("gemini_call_duration_seconds", "wall", "Wall time of Gemini calls including limiter waits and retries."),
+            ("gemini_time_to_first_token_seconds", "ttft", "Time from sending a request to its first token."),
+        ):
+            samples = []
+            for (model, stage), entry in series.items():
+                cumulative = 0
+                for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), entry[key]):
+                    cumulative += count
+                    samples.append(f"{name}_bucket{_labels(model=model, stage=stage, le=bound)} {cumulative}")
+                total = entry["wall_sum"] if key == "wall" else entry["ttft_sum"]
+                samples.append(f"{name}_sum{_labels(model=model, stage=stage)} {total:.6f}")
+                samples.append(f"{name}_count{_labels(model=model, stage=stage)} {cumulative}")
+            metric(name, "histogram", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename: str) -> None:
+        """Write prometheus_text() atomically, so a scraper never reads a half-written file."""
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.prometheus_text())
+        os.replace(temporary, filename)
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the process-wide registry every Gemini call is recorded in."""
+    return _registry
+
+
+def record_call(model: str, stage: str | None, wall_seconds: float, ttft_seconds: float | None, response,
+                attempts: int, error: BaseException | None = None, output_tokens: int | None = None) -> CallRecord:
+    """
+    Record one call (tagged with the current row) in the process-wide registry.
+    `output_tokens` overrides the response's count (a stream stopped before its final usage report).
+    """
+    input_tokens, reported_output_tokens, cached_tokens = _usage(response) if response is not None else (0, 0, 0)
+    output_tokens = reported_output_tokens if output_tokens is None else output_tokens
+    call = CallRecord(
+        model=model,
+        stage=stage,
+        row=_call_tags.get().get("row"),
+        status="ok" if error is None else "error",
+        attempts=attempts,
+        wall_seconds=wall_seconds,
+        ttft_seconds=ttft_seconds,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        cost_usd=estimate_cost(model, input_tokens, output_tokens, cached_tokens),
+    )
+    _registry.record(call)
+    return call
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from google.genai.types import CreateCachedContentConfig
+
+from prompt_budget import estimate_tokens
+from structured_log import get_logger, log_event
+
+logger = get_logger("context_cache")
+
+
+def _text_hash(model: str, static_text: str) -> str:
+    return hashlib.sha256(f"{model}\n{static_text}".encode("utf-8")).hexdigest()[:16]
+
+
+class _ContextCacheBase(ABC):
+    """
+    Shared bookkeeping for instruction-prefix caches.
+
+    prepare() turns (static instructions, per-row prompt, config) into the (contents, config)
+    actually sent: the per-row prompt only, plus a reference to the cached instructions.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.cached_input_tokens = 0
+        self._names = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _cache_name(self, model: str, static_text: str) -> str | None:
+        """Name of the cached content holding `static_text`, registering it first if needed; None sends it inline."""
+
+    def _registered_name(self, model: str, static_text: str) -> tuple[bool, str | None]:
+        """(True, name) if _cache_name() would answer without an API call, else (False, None)."""
+        return False, None
+
+    def prepare(self, model: str, static_text: str, row_prompt: str, config):
+        with self._lock:
+            return self._use(self._cache_name(model, static_text), static_text, row_prompt, config)
+
+    async def prepare_async(self, model: str, static_text: str, row_prompt: str, config):
+        """
+        Async prepare(). Registering a block is a blocking API call made under the lock that
+        keeps it to one registration per block, so it runs in a worker thread; blocks that are
+        already registered are answered on the event loop. The loop never waits for the lock:
+        while another caller holds it (e.g. mid-registration) this call goes to a thread too.
+        """
+        if self._lock.acquire(blocking=False):
+            try:
+                registered, name = self._registered_name(model, static_text)
+                if registered:
+                    return self._use(name, static_text, row_prompt, config)
+            finally:
+                self._lock.release()
+        return await asyncio.to_thread(self.prepare, model, static_text, row_prompt, config)
+
+    def _use(self, name: str | None, static_text: str, row_prompt: str, config):
+        # Called with the lock held
+        if name is None:
+            # Caching unavailable for this block (e.g. below the model's minimum size): send it inline
+            return f"{static_text}\n\n{row_prompt}", config
+        self.calls += 1
+        self.cached_input_tokens += estimate_tokens(static_text)
+        # Requests that use cached content may not repeat tools or a system instruction
+        return row_prompt, config.model_copy(update={"cached_content": name, "tools": None, "system_instruction": None})
+
+
+class GeminiContextCache(_ContextCacheBase):
+    """
+    Registers each static instruction block once as Gemini cached content (client.caches)
+    and refreshes it shortly before its TTL runs out, so long runs never hit an expired cache.
+
+    If creation fails - most often because the block is below the model's minimum cacheable
+    size - the failure is remembered and that block is sent inline from then on.
+    """
+
+    def __init__(self, client, ttl_seconds: int = 3600, refresh_margin_seconds: int = 300):
+        super().__init__()
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._created_at = {}
+
+    def _registered_name(self, model: str, static_text: str) -> tuple[bool, str | None]:
+        key = _text_hash(model, static_text)
+        if key in self._names and (
+            self._names[key] is None
+            or time.monotonic() - self._created_at[key] < self.ttl_seconds - self.refresh_margin_seconds
+        ):
+            return True, self._names[key]
+        return False, None
+
+    def _cache_name(self, model: str, static_text: str) -> str | None:
+        registered, name = self._registered_name(model, static_text)
+        if registered:
+            return name
+        key = _text_hash(model, static_text)
+        try:
+            cached = self.client.caches.create(
+                model=model,
+                config=CreateCachedContentConfig(
+                    system_instruction=static_text,
+                    display_name=f"instructions-{key}",
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            log_event(
+                logger, logging.WARNING, "context caching unavailable, sending instructions inline", model=model,
+                error=str(e)
+            )
+            self._names[key] = None
+            return None
+        self._names[key] = cached.name
+        self._created_at[key] = time.monotonic()
+        return cached.name
+
+    def delete_all(self) -> None:
+        """Delete every cached content entry this instance created (they also expire on their own)."""
+        with self._lock:
+            for name in filter(None, self._names.values()):
+                try:
+                    self.client.caches.delete(name=name)
+                except Exception as e:
+                    log_event(logger, logging.WARNING, "could not delete cached content", name=name, error=str(e))
+            self._names.clear()
+            self._created_at.clear()
+
+
+class LocalContextCache(_ContextCacheBase):
+    """
+    Offline stand-in for GeminiContextCache: registers blocks in memory under
+    "cachedContents/local-<hash>" names that resolve() maps back to the text.
+    Meant for fake or offline clients only; the real API does not know these names.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.registrations = 0
+
+    def _registered_name(self, model: str, static_text: str) -> tuple[bool, str | None]:
+        # Registering locally never calls the API
+        return True, self._cache_name(model, static_text)
+
+    def _cache_name(self, model: str, static_text: str) -> str | None:
+        key = _text_hash(model, static_text)
+        if key not in self._names:
+            self._names[key] = (f"cachedContents/local-{key}", static_text)
+            self.registrations += 1
+        return self._names[key][0]
+
+    def resolve(self, name: str) -> str | None:
+        """Return the static text registered under a local cached-content name."""
+        with self._lock:
+            for registered_name, static_text in self._names.values():
+                if registered_name == name:
+                    return static_text
+        return None
@@ -1,95 +1,566 @@
-import os
-from google import genai
-from google.genai.types import GenerateContentConfig
+import json
+import logging
+import re
+from google.genai.types import FinishReason, GenerateContentConfig, Schema, Type
+from gemini_client import get_client
+from llm_cache import ResponseCache
+from prompt_budget import build_budgeted_prompt, estimate_request_tokens, estimate_tokens
+from resilient_call import (
+    GeminiCallError, generate_content, generate_content_async, generate_content_stream, generate_content_stream_async
+)
+from structured_log import get_logger, log_event, log_output
+
+logger = get_logger("email")
+
+
+EMAIL_MODEL = "gemini-2.0-flash"
+# How many times a half-parsed email (subject without body, or the reverse) is re-asked for the missing part
+MAX_REPAIR_ATTEMPTS = 1
+# A repair asks for one field from a compact prompt: the posts are cut to fit this many tokens
+REPAIR_INPUT_TOKEN_BUDGET = 400
+REPAIR_MAX_OUTPUT_TOKENS = {"subject": 60, "body": 700}
+
+# Subject and body come back as schema-constrained JSON, so no delimiter scanning is needed
+EMAIL_FORMAT_INSTRUCTIONS = """Please write a full cold email including subject line and body based on the above.
+Return the subject line as "subject" and the full email body as "body".
+"""
 
-# Initialize Gemini client (make sure GEMINI_API_KEY is set in your environment)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
-client = genai.Client(api_key=GEMINI_API_KEY)
+EMAIL_SCHEMA = Schema(
+    type=Type.OBJECT,
+    properties={
+        "subject": Schema(type=Type.STRING, description="Cold email subject line"),
+        "body": Schema(type=Type.STRING, description="Cold email body"),
+    },
+    required=["subject", "body"],
+    # Subject first, so it is complete early in a streamed or truncated answer
+    property_ordering=["subject", "body"],
+)
+
+# Salvages complete fields from truncated JSON, and reads answers cached before structured
+# output (---SUBJECT_START--- ... ---BODY_END---), in one scan of the text
+EMAIL_PART_PATTERN = re.compile(
+    r'"(subject|body)"\s*:\s*"((?:[^"\\]|\\.)*)"|---(SUBJECT|BODY)_START---(.*?)---\3_END---', re.DOTALL
+)
+
+
+def _build_email_prompt(company_website: str, posts: str, instructions: str) -> str:
+    return f"""
+Company Website:
+{company_website}
 
-def generate_cold_email(company_website: str, posts: str, instructions: str) -> tuple[str, str]:
-    """
-    Generate a personalized cold email (subject and body) using Gemini AI without web search tool.
+LinkedIn Posts:
+{posts if posts.strip() else "No specific social media content provided."}
 
-    Args:
-        company_website (str): URL of the company website.
-        posts (str): LinkedIn posts or social media content for personalization.
-        instructions (str): Full detailed instructions for email crafting.
+Instructions:
+{instructions}
 
-    Returns:
-        tuple[str, str]: A tuple containing (subject_line, email_body).
-                        Returns (error_msg, error_msg) if an error occurs.
-    """
+{EMAIL_FORMAT_INSTRUCTIONS}"""
 
-    # Added clear instructions for formatting the output with a separator
-    prompt = f"""
+
+def _email_static_block(instructions: str) -> str:
+    # The part of the prompt that is identical for every row, registered once with a context cache
+    return f"""Instructions:
+{instructions}
+
+{EMAIL_FORMAT_INSTRUCTIONS.replace("based on the above", "based on the prospect details in each request")}"""
+
+
+def _build_email_row_prompt(company_website: str, posts: str) -> str:
+    return f"""
 Company Website:
 {company_website}
 
 LinkedIn Posts:
 {posts if posts.strip() else "No specific social media content provided."}
 
-Instructions:
-{instructions}
-
-Please write a full cold email including subject line and body based on the above.
-Crucially, format your response strictly as follows:
----SUBJECT_START---
-[Your Generated Subject Line Here]
----SUBJECT_END---
----BODY_START---
-[Your Generated Email Body Here]
----BODY_END---
-Do not include any other text or formatting outside these delimiters.
+Write the cold email for this prospect following the instructions, in the required format.
 """
 
-    config = GenerateContentConfig(
+
+def _email_prompt(company_website: str, posts: str, instructions: str, input_token_budget: int | None,
+                  prompt_stats: dict | None, context_cache) -> tuple[str | None, str, str]:
+    """
+    Build the prompt text for one email: returns (static_text, prompt, cache_text). With a
+    context cache, static_text is the shared instruction block and prompt the per-row part;
+    without one static_text is None. cache_text is the full logical prompt used for
+    response-cache keys whether or not a context cache is used.
+    """
+    if context_cache is None:
+        prompt, stats = build_budgeted_prompt(
+            lambda fitted_posts: _build_email_prompt(company_website, fitted_posts, instructions), posts, input_token_budget
+        )
+        static_text, cache_text = None, prompt
+    else:
+        static_text = _email_static_block(instructions)
+        prompt, stats = build_budgeted_prompt(
+            lambda fitted_posts: _build_email_row_prompt(company_website, fitted_posts), posts, input_token_budget
+        )
+        cache_text = f"{static_text}\n\n{prompt}"
+    if prompt_stats is not None:
+        prompt_stats.update(stats)
+    return static_text, prompt, cache_text
+
+
+def _prepare_email_request(company_website: str, posts: str, instructions: str, input_token_budget: int | None,
+                           prompt_stats: dict | None, context_cache):
+    """Build what is sent for one email: returns (contents, config, cache_text)."""
+    static_text, prompt, cache_text = _email_prompt(
+        company_website, posts, instructions, input_token_budget, prompt_stats, context_cache
+    )
+    if static_text is None:
+        return prompt, _email_config(), cache_text
+    return (*context_cache.prepare(EMAIL_MODEL, static_text, prompt, _email_config()), cache_text)
+
+
+async def _prepare_email_request_async(company_website: str, posts: str, instructions: str,
+                                       input_token_budget: int | None, prompt_stats: dict | None, context_cache):
+    """Async _prepare_email_request: registering the instructions with a context cache does not block the loop."""
+    static_text, prompt, cache_text = _email_prompt(
+        company_website, posts, instructions, input_token_budget, prompt_stats, context_cache
+    )
+    if static_text is None:
+        return prompt, _email_config(), cache_text
+    return (*await context_cache.prepare_async(EMAIL_MODEL, static_text, prompt, _email_config()), cache_text)
+
+
+def _email_config() -> GenerateContentConfig:
+    return GenerateContentConfig(
         max_output_tokens=1000,
         temperature=0.7,
+        response_mime_type="application/json",
+        response_schema=EMAIL_SCHEMA,
         tools=[]  # No search tool enabled
     )
 
+
+def _parse_email_parts(full_response_text: str) -> dict:
+    # Returns {"subject": ..., "body": ...} with only the parts that came back complete
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=config
+        answer = json.loads(full_response_text)
+    except json.JSONDecodeError:
+        answer = None
+    if isinstance(answer, dict):
+        return {part: answer[part].strip() for part in ("subject", "body") if isinstance(answer.get(part), str)}
+
+    parts = {}
+    for match in EMAIL_PART_PATTERN.finditer(full_response_text):
+        if match.group(1):
+            # strict=False: salvaged text may hold raw newlines; a field that still does not decode
+            # (e.g. cut off inside an escape) is treated as missing
+            try:
+                parts[match.group(1)] = json.loads(f'"{match.group(2)}"', strict=False).strip()
+            except json.JSONDecodeError:
+                continue
+        else:
+            parts[match.group(3).lower()] = match.group(4).strip()
+    return parts
+
+
+def _parse_email_response(full_response_text: str) -> tuple[str, str]:
+    # Parse the response to extract subject and body
+    return _email_result(_parse_email_parts(full_response_text), full_response_text)
+
+
+def _email_result(parts: dict, full_response_text: str) -> tuple[str, str]:
+    subject_line = parts.get("subject", "")
+    email_body = parts.get("body", "")
+
+    # Fallback if parsing fails
+    if not subject_line and not email_body:
+        # If nothing parsed, treat the whole response as body and leave subject empty
+        log_output(logger, "email parsing failed, using the whole response as body", full_response_text, error=True)
+        email_body = full_response_text
+        subject_line = "Subject Parsing Failed" # Provide a default subject for clarity
+
+    return subject_line, email_body
+
+
+def _build_repair_prompt(missing: str, parts: dict, company_website: str, posts: str) -> str:
+    if missing == "subject":
+        # The body already carries the personalization; the subject only has to match it
+        return f"""
+Here is a cold email body that still needs a subject line:
+{parts["body"]}
+
+Write a subject line for this email. Return it as "subject".
+"""
+    # The subject already fixes what the email is about; the full instructions are not resent
+    return f"""
+Company Website:
+{company_website}
+
+LinkedIn Posts (excerpt):
+{posts if posts.strip() else "No specific social media content provided."}
+
+The subject line of a short, personalized cold email to this company is already written:
+{parts["subject"]}
+
+Write only the email body that goes with this subject line. Return it as "body".
+"""
+
+
+def _repair_config(missing: str) -> GenerateContentConfig:
+    return GenerateContentConfig(
+        max_output_tokens=REPAIR_MAX_OUTPUT_TOKENS[missing],
+        temperature=0.7,
+        response_mime_type="application/json",
+        response_schema=Schema(type=Type.OBJECT, properties={missing: EMAIL_SCHEMA.properties[missing]}, required=[missing]),
+        tools=[]  # No search tool enabled
+    )
+
+
+def _repair_request(parts: dict, company_website: str, posts: str, input_token_budget: int | None):
+    # Returns (missing part, prompt, config), or None if there is nothing a partial re-ask can fix
+    present = [part for part in ("subject", "body") if parts.get(part)]
+    if len(present) != 1:
+        return None
+    missing = "body" if present[0] == "subject" else "subject"
+    budget = REPAIR_INPUT_TOKEN_BUDGET if input_token_budget is None else min(input_token_budget, REPAIR_INPUT_TOKEN_BUDGET)
+    prompt, _ = build_budgeted_prompt(
+        lambda fitted_posts: _build_repair_prompt(missing, parts, company_website, fitted_posts), posts, budget
+    )
+    return missing, prompt, _repair_config(missing)
+
+
+def _finish_reason(response):
+    # Why the model stopped (None for a cached answer, or a stream closed before its last chunk)
+    candidates = getattr(response, "candidates", None)
+    return getattr(candidates[0], "finish_reason", None) if candidates else None
+
+
+def _record_repair(prompt_stats: dict | None, missing: str, prompt: str, response, repaired: bool) -> None:
+    # Repair cost goes into the row's email prompt stats: attempts, part re-asked, tokens spent
+    if prompt_stats is None:
+        return
+    metadata = getattr(response, "usage_metadata", None)
+    prompt_stats["repair_attempts"] = prompt_stats.get("repair_attempts", 0) + 1
+    prompt_stats["repaired_part"] = missing
+    prompt_stats["repaired"] = repaired
+    prompt_stats["repair_input_tokens"] = prompt_stats.get("repair_input_tokens", 0) + (
+        getattr(metadata, "prompt_token_count", None) or estimate_tokens(prompt)
+    )
+    prompt_stats["repair_output_tokens"] = prompt_stats.get("repair_output_tokens", 0) + (
+        getattr(metadata, "candidates_token_count", None) or 0
+    )
+
+
+def _cache_email(cache: ResponseCache | None, cache_key: str | None, parts: dict) -> None:
+    # Only complete emails are cached (after any repair, so it is not paid for again); an empty,
+    # unparsed or half answer would otherwise be replayed on every run instead of retried
+    if cache is not None and parts.get("subject") and parts.get("body"):
+        cache.set(cache_key, EMAIL_MODEL, json.dumps(parts, ensure_ascii=False))
+
+
+def _record_usage(response, usage: dict | None) -> None:
+    # Accumulate token counts reported by the API into a caller-supplied dict
+    if usage is None:
+        return
+    metadata = getattr(response, "usage_metadata", None)
+    usage["input_tokens"] = usage.get("input_tokens", 0) + (getattr(metadata, "prompt_token_count", None) or 0)
+    usage["output_tokens"] = usage.get("output_tokens", 0) + (getattr(metadata, "candidates_token_count", None) or 0)
+
+
+def _email_stream_watcher(on_subject):
+    """
+    Build the on_text callback for a streamed email: reports the subject to `on_subject` as
+    soon as it is complete, and stops the stream once the body is complete too (its closing
+    quote, or ---BODY_END--- in the delimited format), so trailing output is never read.
+    """
+    state = {"reported": False}
+
+    def on_text(text_so_far):
+        parts = _parse_email_parts(text_so_far)
+        _report_subject(parts, on_subject, state)
+        return bool(parts.get("subject")) and "body" in parts
+
+    return on_text, state
+
+
+def _report_subject(parts: dict, on_subject, state: dict) -> None:
+    if on_subject is not None and parts.get("subject") and not state["reported"]:
+        state["reported"] = True
+        on_subject(parts["subject"])
+
+
+class _EmailCall:
+    """
+    Everything about one cold email except the model calls, shared by the four public
+    generators (blocking or async, whole answer or streamed):
+
+        call = _EmailCall(...)
+        if call.prepare(context_cache):          # False when the response cache has the answer
+            call.answered(text, response)         # after the generator's own model call
+        while (request := call.next_repair()) is not None:
+            call.repaired(request, response)      # or call.repair_failed(request, error)
+        return call.result()
+    """
+
+    def __init__(self, company_website: str, posts: str, instructions: str, cache: ResponseCache | None,
+                 input_token_budget: int | None, prompt_stats: dict | None, usage: dict | None = None,
+                 on_subject=None):
+        self.company_website = company_website
+        self.posts = posts
+        self.instructions = instructions
+        self.cache = cache
+        self.input_token_budget = input_token_budget
+        self.prompt_stats = prompt_stats
+        self.usage = usage
+        self.on_subject = on_subject
+        self.on_text, self._subject_state = _email_stream_watcher(on_subject)
+        self.contents = self.config = self.reserved_tokens = None
+        self.cache_key = self.text = self.finish_reason = None
+        self.parts = {}
+        self._repair_attempts = 0
+        self._dirty = False
+
+    def prepare(self, context_cache) -> bool:
+        """Build the request; returns True if the model has to be called."""
+        return self._start(*_prepare_email_request(
+            self.company_website, self.posts, self.instructions, self.input_token_budget, self.prompt_stats,
+            context_cache
+        ))
+
+    async def prepare_async(self, context_cache) -> bool:
+        """Async prepare(): registering the instructions with the context cache runs off the event loop."""
+        return self._start(*await _prepare_email_request_async(
+            self.company_website, self.posts, self.instructions, self.input_token_budget, self.prompt_stats,
+            context_cache
+        ))
+
+    def _start(self, contents: str, config: GenerateContentConfig, cache_text: str) -> bool:
+        self.contents, self.config = contents, config
+        self.reserved_tokens = estimate_request_tokens(contents, config.max_output_tokens)
+        if self.usage is not None:
+            self.usage["estimated_input_tokens"] = estimate_tokens(contents)
+        if self.cache is not None:
+            self.cache_key = self.cache.make_key(EMAIL_MODEL, cache_text, _email_config())
+            self.text = self.cache.get(self.cache_key)
+        if self.text is None:
+            return True
+        self.parts = _parse_email_parts(self.text)
+        return False
+
+    def answered(self, text: str, response) -> None:
+        """Take the model's answer (`response` is the response, or the last chunk of a stream)."""
+        _record_usage(response, self.usage)
+        self.finish_reason = _finish_reason(response)
+        self.text = text.strip()
+        self.parts = _parse_email_parts(self.text)
+        # A fresh answer is cached even if no repair follows
+        self._dirty = True
+
+    def next_repair(self):
+        """(missing part, prompt, config) for the next repair call, or None when there is nothing to repair."""
+        if self._repair_attempts >= MAX_REPAIR_ATTEMPTS:
+            return None
+        request = _repair_request(self.parts, self.company_website, self.posts, self.input_token_budget)
+        if request is not None and self.finish_reason == FinishReason.MAX_TOKENS:
+            # The answer ran into the output limit; a re-ask would most likely be cut off the same way
+            log_event(logger, logging.WARNING, "email truncated at the output token limit, not repairing", part=request[0])
+            return None
+        if request is not None:
+            self._repair_attempts += 1
+            log_event(logger, logging.WARNING, "email part missing, regenerating it", part=request[0])
+        return request
+
+    def repaired(self, request, response) -> None:
+        missing, prompt, _ = request
+        value = _parse_email_parts((response.text or "").strip()).get(missing)
+        _record_repair(self.prompt_stats, missing, prompt, response, bool(value))
+        if value:
+            self.parts = {**self.parts, missing: value}
+            self._dirty = True
+
+    def repair_failed(self, request, error: GeminiCallError) -> None:
+        # The part we have is still worth keeping; leave the row partial rather than failed
+        missing, prompt, _ = request
+        log_event(logger, logging.WARNING, "email repair failed", part=missing, error=str(error))
+        _record_repair(self.prompt_stats, missing, prompt, None, False)
+        self._repair_attempts = MAX_REPAIR_ATTEMPTS
+
+    def result(self) -> tuple[str, str]:
+        if self._dirty:
+            _cache_email(self.cache, self.cache_key, self.parts)
+        # Cached answers and repaired subjects are reported here
+        _report_subject(self.parts, self.on_subject, self._subject_state)
+        return _email_result(self.parts, self.text)
+
+
+def _repair_email(call: _EmailCall) -> None:
+    """Re-ask for the one part (subject or body) that did not come back, keeping the other."""
+    while (request := call.next_repair()) is not None:
+        _, prompt, config = request
+        try:
+            response = generate_content(
+                get_client(), EMAIL_MODEL, prompt, config,
+                reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="email_repair"
+            )
+        except GeminiCallError as e:
+            call.repair_failed(request, e)
+        else:
+            call.repaired(request, response)
+
+
+async def _repair_email_async(call: _EmailCall) -> None:
+    """Async counterpart of _repair_email."""
+    while (request := call.next_repair()) is not None:
+        _, prompt, config = request
+        try:
+            response = await generate_content_async(
+                get_client(), EMAIL_MODEL, prompt, config,
+                reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="email_repair"
+            )
+        except GeminiCallError as e:
+            call.repair_failed(request, e)
+        else:
+            call.repaired(request, response)
+
+
+def generate_cold_email(company_website: str, posts: str, instructions: str, cache: ResponseCache | None = None,
+                        input_token_budget: int | None = None, prompt_stats: dict | None = None,
+                        context_cache=None) -> tuple[str, str]:
+    """
+    Generate a personalized cold email (subject and body) using Gemini AI without web search tool.
+
+    Args:
+        company_website (str): URL of the company website.
+        posts (str): LinkedIn posts or social media content for personalization.
+        instructions (str): Full detailed instructions for email crafting.
+        cache (ResponseCache | None): Optional response cache; identical prompt, model and
+            config are answered from disk instead of calling the API.
+        input_token_budget (int | None): If set, posts are trimmed (oldest/reposted posts first) so the
+            locally estimated prompt size stays within this many tokens.
+        prompt_stats (dict | None): Optional dict that receives the estimated "input_tokens" of the
+            prompt and how many posts were dropped to fit the budget, plus "repair_attempts",
+            "repaired" and "repair_input_tokens"/"repair_output_tokens" if only the subject or
+            only the body came back and the missing part had to be regenerated.
+        context_cache (GeminiContextCache | LocalContextCache | None): If set, the instructions and
+            output format are registered once as cached content and each call sends only the
+            website and posts.
+
+    Returns:
+        tuple[str, str]: A tuple containing (subject_line, email_body).
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+            A failed repair of a missing subject or body only leaves that part empty.
+    """
+    call = _EmailCall(company_website, posts, instructions, cache, input_token_budget, prompt_stats)
+    if call.prepare(context_cache):
+        response = generate_content(
+            get_client(), EMAIL_MODEL, call.contents, call.config, reserved_tokens=call.reserved_tokens, stage="email"
+        )
+        call.answered(response.text or "", response)
+    _repair_email(call)
+    return call.result()
+
+
+def build_cold_email_request(company_website: str, posts: str, instructions: str,
+                             input_token_budget: int | None = None, prompt_stats: dict | None = None):
+    """
+    Return the (prompt, config) generate_cold_email would send, for callers that submit
+    requests themselves (e.g. batch jobs). Parse the answer with parse_cold_email_response.
+    """
+    contents, config, _ = _prepare_email_request(
+        company_website, posts, instructions, input_token_budget, prompt_stats, None
+    )
+    return contents, config
+
+
+def parse_cold_email_response(full_response_text: str) -> tuple[str, str]:
+    """Split a raw model answer into (subject_line, email_body), as generate_cold_email does."""
+    return _parse_email_response(full_response_text.strip())
+
+
+async def generate_cold_email_async(company_website: str, posts: str, instructions: str, usage: dict | None = None,
+                                    cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                                    prompt_stats: dict | None = None, context_cache=None) -> tuple[str, str]:
+    """
+    Async counterpart of generate_cold_email, built on the client.aio API so many
+    rows can be in flight at once.
+
+    Args:
+        usage (dict | None): Optional dict that receives "estimated_input_tokens" before the
+            call and the "input_tokens"/"output_tokens" reported by the API after it.
+        cache, input_token_budget, prompt_stats, context_cache: As in generate_cold_email.
+
+    Returns:
+        tuple[str, str]: A tuple containing (subject_line, email_body).
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+    """
+    call = _EmailCall(company_website, posts, instructions, cache, input_token_budget, prompt_stats, usage=usage)
+    if await call.prepare_async(context_cache):
+        response = await generate_content_async(
+            get_client(), EMAIL_MODEL, call.contents, call.config, reserved_tokens=call.reserved_tokens, stage="email"
+        )
+        call.answered(response.text or "", response)
+    await _repair_email_async(call)
+    return call.result()
+
+
+def generate_cold_email_stream(company_website: str, posts: str, instructions: str, on_subject=None,
+                               cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                               prompt_stats: dict | None = None, context_cache=None) -> tuple[str, str]:
+    """
+    Streaming variant of generate_cold_email: the answer is parsed as it arrives and the
+    subject is handed to `on_subject` as soon as it is complete.
+
+    The stream is also closed once the body's closing quote arrives. With schema-constrained
+    JSON output that saves little (the closing brace and the wait for the final chunk); it is
+    kept as a guard against runaway output after the body, not as a token saving. The
+    subject callback is what streaming is for.
+
+    Args:
+        on_subject (Callable[[str], None] | None): Called once with the subject line as soon as
+            it is complete, typically well before the body has finished.
+        cache, input_token_budget, prompt_stats, context_cache: As in generate_cold_email.
+
+    Returns:
+        tuple[str, str]: A tuple containing (subject_line, email_body).
+
+    Raises:
+        GeminiCallError: If the call fails permanently, fails mid-stream, or transient errors
+            outlast the retries.
+    """
+    call = _EmailCall(company_website, posts, instructions, cache, input_token_budget, prompt_stats,
+                      on_subject=on_subject)
+    if call.prepare(context_cache):
+        text, last_chunk = generate_content_stream(
+            get_client(), EMAIL_MODEL, call.contents, call.config, reserved_tokens=call.reserved_tokens,
+            on_text=call.on_text, stage="email"
+        )
+        call.answered(text, last_chunk)
+    _repair_email(call)
+    return call.result()
+
+
+async def generate_cold_email_stream_async(company_website: str, posts: str, instructions: str, on_subject=None,
+                                           usage: dict | None = None, cache: ResponseCache | None = None,
+                                           input_token_budget: int | None = None, prompt_stats: dict | None = None,
+                                           context_cache=None) -> tuple[str, str]:
+    """
+    Async counterpart of generate_cold_email_stream. `on_subject` is a plain function called
+    from the event loop; `usage` works as in generate_cold_email_async.
+
+    Returns:
+        tuple[str, str]: A tuple containing (subject_line, email_body).
+
+    Raises:
+        GeminiCallError: If the call fails permanently, fails mid-stream, or transient errors
+            outlast the retries.
+    """
+    call = _EmailCall(company_website, posts, instructions, cache, input_token_budget, prompt_stats, usage=usage,
+                      on_subject=on_subject)
+    if await call.prepare_async(context_cache):
+        text, last_chunk = await generate_content_stream_async(
+            get_client(), EMAIL_MODEL, call.contents, call.config, reserved_tokens=call.reserved_tokens,
+            on_text=call.on_text, stage="email"
         )
-        full_response_text = response.text.strip()
-
-        # Parse the response to extract subject and body
-        subject_start_tag = "---SUBJECT_START---"
-        subject_end_tag = "---SUBJECT_END---"
-        body_start_tag = "---BODY_START---"
-        body_end_tag = "---BODY_END---"
-
-        subject_line = ""
-        email_body = ""
-
-        if subject_start_tag in full_response_text and subject_end_tag in full_response_text:
-            subject_start_index = full_response_text.find(subject_start_tag) + len(subject_start_tag)
-            subject_end_index = full_response_text.find(subject_end_tag)
-            subject_line = full_response_text[subject_start_index:subject_end_index].strip()
-        
-        if body_start_tag in full_response_text and body_end_tag in full_response_text:
-            body_start_index = full_response_text.find(body_start_tag) + len(body_start_tag)
-            body_end_index = full_response_text.find(body_end_tag)
-            email_body = full_response_text[body_start_index:body_end_index].strip()
-
-        # Fallback if parsing fails or tags are not found
-        if not subject_line and not email_body:
-            # If tags not found, treat the whole response as body and leave subject empty
-            print("Warning: Email parsing failed. Returning full response as body.")
-            email_body = full_response_text
-            subject_line = "Subject Parsing Failed" # Provide a default subject for clarity
-
-        return subject_line, email_body
-
-    except Exception as e:
-        error_msg = f"Error generating email: {e}"
-        print(error_msg) # Print error for debugging
-        return error_msg, error_msg # Return error message in both parts of the tuple
+        call.answered(text, last_chunk)
+    await _repair_email_async(call)
+    return call.result()
 
 # Example usage (for testing this module independently)
 if __name__ == "__main__":
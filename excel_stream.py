@@ -0,0 +1,84 @@
+from openpyxl import Workbook, load_workbook
+
+
+def iter_excel_rows(filename: str, columns: list[str], limit_rows: int = -1, row_range: tuple[int, int] | None = None):
+    """
+    Lazily yield (row_index, {column: value}) from the first sheet of a workbook.
+
+    Uses openpyxl's read-only mode, so only the current row is held in memory and the
+    first row is available as soon as the header has been parsed. `row_index` counts data
+    rows from 0, matching the index pandas would give the same row. If `row_range` is
+    (start, stop), only data rows start <= row_index < stop are yielded.
+
+    Raises:
+        ValueError: If any of `columns` is missing from the header row.
+    """
+    workbook = load_workbook(filename, read_only=True, data_only=True)
+    try:
+        rows = _sheet_rows(workbook)
+        header = next(rows, None) or ()
+        positions = {name: position for position, name in enumerate(header) if name is not None}
+        missing = [column for column in columns if column not in positions]
+        if missing:
+            raise ValueError(f"Columns not found in {filename}: {missing}")
+
+        start, stop = row_range if row_range is not None else (0, None)
+        for index, values in enumerate(rows):
+            if limit_rows != -1 and index >= limit_rows or stop is not None and index >= stop:
+                break
+            if index < start:
+                continue
+            yield index, {
+                column: values[positions[column]] if positions[column] < len(values) else None
+                for column in columns
+            }
+    finally:
+        workbook.close()
+
+
+def _sheet_rows(workbook):
+    # Every row of the first sheet as value tuples. Read-only mode otherwise stops at the size
+    # in the sheet's dimension tag, which some writers leave stale (e.g. "A1" on a full sheet).
+    sheet = workbook.worksheets[0]
+    sheet.reset_dimensions()
+    return sheet.iter_rows(values_only=True)
+
+
+def count_excel_rows(filename: str) -> int:
+    """Number of data rows (excluding the header) on the first sheet, as iter_excel_rows yields them."""
+    workbook = load_workbook(filename, read_only=True)
+    try:
+        return max(0, sum(1 for _ in _sheet_rows(workbook)) - 1)
+    finally:
+        workbook.close()
+
+
+class StreamingExcelWriter:
+    """
+    Append-only writer backed by an openpyxl write-only workbook.
+
+    Rows are serialized as they are appended instead of being collected in a DataFrame,
+    so memory does not grow with the sheet's cell contents.
+    """
+
+    def __init__(self, filename: str, columns: list[str]):
+        self.filename = filename
+        self.columns = columns
+        self.rows_written = 0
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(columns)
+
+    def append(self, row: dict) -> None:
+        self._sheet.append([row.get(column) for column in self.columns])
+        self.rows_written += 1
+
+    def close(self) -> None:
+        self._workbook.save(self.filename)
+        self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
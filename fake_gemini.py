@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from google.genai import errors
+from google.genai.types import (
+    Candidate, Content, GenerateContentResponse, GenerateContentResponseUsageMetadata, Part,
+)
+
+from gemini_client import set_client
+from prompt_budget import estimate_tokens
+
+# Streamed answers arrive in chunks of this many characters; the first one after this share
+# of the call's latency, the rest spread evenly over the remainder
+STREAM_CHUNK_CHARS = 40
+FIRST_CHUNK_LATENCY_SHARE = 0.3
+
+
+@dataclass
+class LatencyModel:
+    """
+    Per-call latency in seconds. `distribution` is "constant" (always `median`),
+    "uniform" (between `low` and `high`), "lognormal" (around `median` with log-space
+    spread `sigma`, the usual shape of LLM latencies) or "exponential" (mean `median`).
+    Samples are clipped to [low, high].
+    """
+    distribution: str = "lognormal"
+    median: float = 0.8
+    sigma: float = 0.5
+    low: float = 0.0
+    high: float = 60.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "constant":
+            value = self.median
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.low, self.high)
+        elif self.distribution == "lognormal":
+            value = self.median * rng.lognormvariate(0.0, self.sigma)
+        elif self.distribution == "exponential":
+            value = rng.expovariate(1.0 / self.median) if self.median > 0 else 0.0
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return min(self.high, max(self.low, value))
+
+
+def _config_value(config, name):
+    # Call sites pass GenerateContentConfig objects; batch lines carry plain dicts
+    if config is None:
+        return None
+    return config.get(name) if isinstance(config, dict) else getattr(config, name, None)
+
+
+def _schema_fields(config) -> list[str]:
+    schema = _config_value(config, "response_schema")
+    if schema is None:
+        return []
+    properties = schema.get("properties") if isinstance(schema, dict) else schema.properties
+    return list(properties or {})
+
+
+def _error(code: int) -> errors.APIError:
+    if code == 429:
+        return errors.ClientError(code, {"error": {
+            "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Fake quota exceeded",
+            "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}],
+        }})
+    return errors.ServerError(code, {"error": {"code": code, "status": "INTERNAL", "message": f"Fake {code} error"}})
+
+
+class _FakeModels:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def generate_content(self, *, model, contents, config=None):
+        response, latency, error = self._backend.respond(model, contents, config)
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return response
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        response, latency, error = self._backend.respond(model, contents, config, stream=True)
+
+        def stream():
+            # Like the SDK, nothing is sent (and no error raised) until iteration starts
+            time.sleep(latency * FIRST_CHUNK_LATENCY_SHARE)
+            if error is not None:
+                raise error
+            chunks = self._backend.stream_chunks(response)
+            for chunk in chunks:
+                self._backend.count_streamed(chunk)
+                yield chunk
+                time.sleep(latency * (1 - FIRST_CHUNK_LATENCY_SHARE) / len(chunks))
+
+        return stream()
+
+
+class _FakeAsyncModels:
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def generate_content(self, *, model, contents, config=None):
+        response, latency, error = self._backend.respond(model, contents, config)
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return response
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        response, latency, error = self._backend.respond(model, contents, config, stream=True)
+
+        async def stream():
+            await asyncio.sleep(latency * FIRST_CHUNK_LATENCY_SHARE)
+            if error is not None:
+                raise error
+            chunks = self._backend.stream_chunks(response)
+            for chunk in chunks:
+                self._backend.count_streamed(chunk)
+                yield chunk
+                await asyncio.sleep(latency * (1 - FIRST_CHUNK_LATENCY_SHARE) / len(chunks))
+
+        return stream()
+
+
+class _FakeAio:
+    def __init__(self, backend):
+        self.models = _FakeAsyncModels(backend)
+
+
+class FakeGeminiClient:
+    """
+    Offline stand-in for genai.Client with canned answers, for load and retry testing.
+
+    Answers follow the prompt/config the call sites send: TRUE/FALSE verdicts for screening
+    prompts (`true_ratio` of companies, stable per company), JSON with exactly the schema's
+    fields for structured-output calls, the ---SUBJECT_START--- ... ---BODY_END--- format for
+    plain email prompts, and a short note otherwise. Each call sleeps a latency drawn from
+    `latency` and fails with 429/500 at the given `error_rates`. generate_content_stream
+    returns the same answers in STREAM_CHUNK_CHARS chunks.
+
+    Every random draw is seeded from `seed`, the prompt and how often that prompt was seen,
+    so a run is reproducible no matter how concurrent calls interleave.
+    """
+
+    def __init__(self, latency: LatencyModel | None = None, error_rates: dict | None = None,
+                 true_ratio: float = 0.3, body_words: int = 120, seed: int = 0):
+        self.latency = latency or LatencyModel()
+        self.error_rates = dict(error_rates or {})
+        self.true_ratio = true_ratio
+        self.body_words = body_words
+        self.seed = seed
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+        self.calls = 0
+        self.errors = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, *parts) -> random.Random:
+        digest = hashlib.sha256("\x1f".join(str(part) for part in (self.seed, *parts)).encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _answer(self, prompt: str, config, rng: random.Random) -> str:
+        fields = _schema_fields(config)
+        if 'Start with "TRUE"' in prompt:
+            verdict = self._rng("verdict", prompt).random() < self.true_ratio
+            return (
+                "TRUE. The company has a partnership with an Israeli company (fake)." if verdict
+                else "FALSE. No business ties to Israel or haram activities were found (fake)."
+            )
+        if fields:
+            return json.dumps({field: self._canned_text(field, rng) for field in fields})
+        if "SUBJECT_START" in prompt:
+            return (
+                f"---SUBJECT_START---\n{self._canned_text('subject', rng)}\n---SUBJECT_END---\n"
+                f"---BODY_START---\n{self._canned_text('body', rng)}\n---BODY_END---"
+            )
+        return self._canned_text("linkedin_note", rng)
+
+    def _canned_text(self, field: str, rng: random.Random) -> str:
+        if field == "subject":
+            return f"Quick idea for your team #{rng.randint(1, 999)}"
+        words = max(5, self.body_words // 4 if field == "linkedin_note" else self.body_words)
+        return " ".join(rng.choice(("growth", "pipeline", "outreach", "partners", "results", "team")) for _ in range(words))
+
+    def respond(self, model: str, contents, config, stream: bool = False):
+        """
+        Return (response, latency_seconds, error_or_None) for one call. Output tokens of a
+        streamed answer are counted per chunk read (count_streamed), not up front.
+        """
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        # Keyed by digest: holding every prompt for the whole run would dominate the run's memory
+        seen_key = hashlib.sha256(f"{model}\x1f{prompt}".encode("utf-8")).digest()
+        with self._lock:
+            occurrence = self._seen.get(seen_key, 0)
+            self._seen[seen_key] = occurrence + 1
+            self.calls += 1
+        rng = self._rng(model, prompt, occurrence)
+        latency = self.latency.sample(rng)
+
+        draw = rng.random()
+        for code, rate in sorted(self.error_rates.items()):
+            if draw < rate:
+                with self._lock:
+                    self.errors[code] = self.errors.get(code, 0) + 1
+                # Rejected requests come back quickly
+                return None, min(latency, 0.05), _error(code)
+            draw -= rate
+
+        text = self._answer(prompt, config, rng)
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        with self._lock:
+            self.input_tokens += input_tokens
+            if not stream:
+                self.output_tokens += output_tokens
+        response = GenerateContentResponse(
+            candidates=[Candidate(content=Content(role="model", parts=[Part(text=text)]))],
+            usage_metadata=GenerateContentResponseUsageMetadata(
+                prompt_token_count=input_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=input_tokens + output_tokens,
+            ),
+        )
+        return response, latency, None
+
+    def stream_chunks(self, response) -> list:
+        """Split a response into streamed chunks; each reports the tokens generated so far, like the API."""
+        text = response.text or ""
+        prompt_tokens = response.usage_metadata.prompt_token_count
+        chunks = []
+        for start in range(0, max(len(text), 1), STREAM_CHUNK_CHARS):
+            output_tokens = estimate_tokens(text[:start + STREAM_CHUNK_CHARS])
+            chunks.append(GenerateContentResponse(
+                candidates=[Candidate(content=Content(role="model", parts=[Part(text=text[start:start + STREAM_CHUNK_CHARS])]))],
+                usage_metadata=GenerateContentResponseUsageMetadata(
+                    prompt_token_count=prompt_tokens,
+                    candidates_token_count=output_tokens,
+                    total_token_count=prompt_tokens + output_tokens,
+                ),
+            ))
+        return chunks
+
+    def count_streamed(self, chunk) -> None:
+        with self._lock:
+            self.output_tokens += estimate_tokens(chunk.text or "")
+
+
+def install_fake_client(client: FakeGeminiClient | None = None, **client_options) -> FakeGeminiClient:
+    """
+    Make a FakeGeminiClient the shared client (gemini_client.set_client), so every Gemini
+    call site in this process (search/screening, email, LinkedIn and combined outreach)
+    answers offline; no GEMINI_API_KEY is needed.
+
+    Returns:
+        FakeGeminiClient: The installed client, for its call/error/token counters.
+    """
+    client = client or FakeGeminiClient(**client_options)
+    set_client(client)
+    return client
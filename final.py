@@ -1,31 +1,132 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
 import pandas as pd
 # Assuming values_check.py contains analyze_company_support
-from values_check import analyze_company_support 
+from values_check import analyze_company_support, analyze_company_support_async
 # Assuming email_crafting.py now contains the modified generate_cold_email
-from email_crafting import generate_cold_email 
+from email_crafting import (
+    EMAIL_MODEL, build_cold_email_request, parse_cold_email_response
+)
 # Assuming linkeding_message_crafting.py contains generate_linkedin_connection_note
-from linkeding_message_crafting import generate_linkedin_connection_note 
+from linkeding_message_crafting import LINKEDIN_MODEL, build_linkedin_note_request
+from resilient_call import GeminiCallError
+from call_metrics import get_metrics_registry, tag_calls
+from structured_log import ensure_logging, get_logger, log_event
+from run_journal import RunJournal
+from excel_stream import StreamingExcelWriter
+from pipeline import order_stages
+from prompt_budget import estimate_tokens
+from batch_jobs import remove_batch_files, run_batch_job, write_batch_requests
+from row_engine import (
+    INPUT_COLUMNS, OUTPUT_COLUMNS, RowSettings, failed_row_result, iter_input_rows, log_row_summary, output_row,
+    prepare_posts, process_row, process_rows_async, run_row_async
+)
 
-def process_excel_filter_and_generate_emails(
-    input_filename='apollo_data.xlsx',
-    output_filename='apollo_filtered_emails_output.xlsx',
-    instructions_email='',
-    instructions_linkedin='',
-    limit_rows=-1    # limit row for testing, put -1 for full data
-):
-    # Read Excel file and limit rows for testing
-    # Specify all columns you intend to use to avoid issues if some are missing initially
-    df = pd.read_excel(input_filename, usecols=["company website", "posts"], engine='openpyxl')
-    
-    if limit_rows != -1:
-        df = df.head(limit_rows)
-
-    analysis_results = []
-    explanations = []
-    generated_email_subjects = [] # New list for subjects
-    generated_email_bodies = []   # Modified to store only the body
-    generated_linkedin_messages = []
-    
+logger = get_logger("final")
+
+def _read_input_rows(input_filename, limit_rows, row_range=None):
+    # The same rows and cell values as streaming mode reads (blank cells become "", limit_rows
+    # counts from the top of the sheet even with a row_range), indexed by position in the sheet
+    rows = list(iter_input_rows(input_filename, limit_rows, row_range))
+    return pd.DataFrame([row[1:] for row in rows], index=[row[0] for row in rows], columns=INPUT_COLUMNS)
+
+
+def summarize_stage_timings(row_results):
+    """
+    Aggregate the per-stage wall times recorded for each row.
+
+    Returns:
+        dict: stage name -> {"count", "total", "mean", "max"} in seconds.
+    """
+    summary = {}
+    for result in row_results:
+        for stage, seconds in result.get("stage_timings", {}).items():
+            entry = summary.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+    for entry in summary.values():
+        entry["mean"] = entry["total"] / entry["count"]
+    return summary
+
+
+def summarize_prompt_tokens(row_results):
+    """
+    Aggregate the locally estimated input tokens of each row's email and LinkedIn prompts.
+
+    Returns:
+        dict: generator name -> {"count", "mean", "max", "posts_dropped"}.
+    """
+    summary = {}
+    for result in row_results:
+        for stage, stats in (result.get("prompt_tokens") or {}).items():
+            if "input_tokens" not in stats:
+                continue
+            entry = summary.setdefault(stage, {"count": 0, "total": 0, "max": 0, "posts_dropped": 0})
+            entry["count"] += 1
+            entry["total"] += stats["input_tokens"]
+            entry["max"] = max(entry["max"], stats["input_tokens"])
+            entry["posts_dropped"] += stats.get("posts_dropped", 0)
+    for entry in summary.values():
+        entry["mean"] = entry["total"] / entry["count"]
+    return summary
+
+
+def summarize_repairs(row_results):
+    """
+    Count emails that came back with only a subject or only a body and were repaired by
+    re-asking for the missing part.
+
+    Returns:
+        dict: attempts, repaired, input_tokens, output_tokens.
+    """
+    summary = {"attempts": 0, "repaired": 0, "input_tokens": 0, "output_tokens": 0}
+    for result in row_results:
+        stats = (result.get("prompt_tokens") or {}).get("email") or {}
+        if not stats.get("repair_attempts"):
+            continue
+        summary["attempts"] += stats["repair_attempts"]
+        summary["repaired"] += bool(stats.get("repaired"))
+        summary["input_tokens"] += stats.get("repair_input_tokens", 0)
+        summary["output_tokens"] += stats.get("repair_output_tokens", 0)
+    return summary
+
+
+def summarize_speculation(row_results):
+    """
+    Count speculative email launches and the tokens spent on emails discarded
+    because the row was screened TRUE.
+
+    Returns:
+        dict: launched, wasted, cancelled, wasted_input_tokens, wasted_output_tokens.
+    """
+    summary = {"launched": 0, "wasted": 0, "cancelled": 0, "wasted_input_tokens": 0, "wasted_output_tokens": 0}
+    for result in row_results:
+        speculation = result.get("speculation")
+        if not speculation:
+            continue
+        summary["launched"] += speculation["launched"]
+        summary["wasted"] += speculation["wasted"]
+        summary["cancelled"] += speculation["cancelled"]
+        summary["wasted_input_tokens"] += speculation["input_tokens"]
+        summary["wasted_output_tokens"] += speculation["output_tokens"]
+    return summary
+
+
+def _log_stage_timings(row_results):
+    for stage, entry in summarize_stage_timings(row_results).items():
+        log_event(
+            logger, logging.INFO, "stage timings", stage=stage, n=entry["count"], mean=round(entry["mean"], 2),
+            max=round(entry["max"], 2), total=round(entry["total"], 2)
+        )
+
+
+def _write_output(df, row_results, output_filename):
     # Initialize new columns as empty strings
     df['email_subject'] = ''      # New column for subject line
     df['email_body'] = ''         # This will now hold only the body
@@ -33,67 +134,408 @@ def process_excel_filter_and_generate_emails(
     df['drafted'] = ''
     df['date_of_drafting'] = ''
 
+    # Add new columns to DataFrame
+    df['supports_israel_or_haram'] = [result["supports_israel_or_haram"] for result in row_results]
+    df['explanation'] = [result["explanation"] for result in row_results]
+    df['email_subject'] = [result["email_subject"] for result in row_results]  # Populate new subject column
+    df['generated_email'] = [result["generated_email"] for result in row_results]  # This now contains only the body, renamed for clarity in output
+    df['linkedin_message'] = [result["linkedin_message"] for result in row_results]
+
+    existing_columns = df.columns.tolist()
+    final_column_order = [col for col in OUTPUT_COLUMNS if col in existing_columns]
+    
+    df = df[final_column_order]
+
+    # Save to new Excel file
+    df.to_excel(output_filename, index=False)
+    log_event(logger, logging.INFO, "output saved", filename=output_filename)
+
+
+def _summary_fields(result):
+    # Only the small bookkeeping fields are kept per row in streaming mode
+    return {
+        key: result[key]
+        for key in ("stage_timings", "speculation", "error", "posts_tokens", "prompt_tokens", "skipped_stages")
+        if key in result
+    }
+
+
+def _process_streaming(input_filename, output_filename, limit_rows, settings, journal, on_row_done,
+                       async_mode, concurrency, row_range=None):
+    """
+    Read rows lazily and write each result as soon as it and every earlier row are done,
+    so memory stays flat regardless of sheet size. Returns the per-row bookkeeping fields.
+    """
+    summaries = []
+    with StreamingExcelWriter(output_filename, OUTPUT_COLUMNS) as writer:
+
+        def emit(index, company_website, posts, result):
+            writer.append(output_row(company_website, posts, result))
+            summaries.append(_summary_fields(result))
+
+        if not async_mode:
+            for index, company_website, posts in iter_input_rows(input_filename, limit_rows, row_range):
+                result = journal.completed_result(index, company_website)
+                if result is None:
+                    try:
+                        result = process_row(index, company_website, posts, settings)
+                    except GeminiCallError as e:
+                        result = failed_row_result(index, e)
+                    on_row_done(index, company_website, result)
+                emit(index, company_website, posts, result)
+        else:
+            asyncio.run(_process_streaming_async(
+                iter_input_rows(input_filename, limit_rows, row_range), settings, journal, on_row_done, concurrency, emit
+            ))
+
+    log_event(logger, logging.INFO, "output saved", filename=output_filename)
+    return summaries
+
+
+async def _process_streaming_async(rows, settings, journal, on_row_done, concurrency, emit):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, company_website, posts):
+        result = journal.completed_result(index, company_website)
+        if result is not None:
+            return result
+        result = await run_row_async(index, company_website, posts, settings, semaphore)
+        on_row_done(index, company_website, result)
+        return result
+
+    # A bounded window of row tasks: rows are started in order and written out in order,
+    # so only about `window` rows (and their posts) are held in memory at any time.
+    window = max(1, concurrency * 4)
+    in_flight = deque()
+    for index, company_website, posts in rows:
+        in_flight.append((index, company_website, posts, asyncio.create_task(run(index, company_website, posts))))
+        while len(in_flight) >= window or (in_flight and in_flight[0][3].done()):
+            head_index, head_website, head_posts, task = in_flight.popleft()
+            emit(head_index, head_website, head_posts, await task)
+    while in_flight:
+        head_index, head_website, head_posts, task = in_flight.popleft()
+        emit(head_index, head_website, head_posts, await task)
 
-    for index, row in df.iterrows():
-        company_website = str(row["company website"]).strip()
-        posts = str(row["posts"]).strip()
 
-        print(f"\nAnalyzing row {index + 1}: {company_website}")
+def process_excel_filter_and_generate_emails(
+    input_filename='apollo_data.xlsx',
+    output_filename='apollo_filtered_emails_output.xlsx',
+    instructions_email='',
+    instructions_linkedin='',
+    limit_rows=-1,    # limit row for testing, put -1 for full data (counted from the top of the sheet, also with row_range)
+    async_mode=False, # process many rows at once through the client.aio API
+    concurrency=10,   # max rows in flight when async_mode=True
+    speculative_email=False, # async_mode only: draft the email while screening runs, discard it if TRUE
+    response_cache=None,     # optional llm_cache.ResponseCache for email and LinkedIn responses
+    verdict_cache=None,      # optional verdict_cache.VerdictCache so repeated domains are screened once
+    journal_filename=None,   # completed-row journal, defaults to '<output_filename>.journal.jsonl'
+    resume=False,            # skip rows already in the journal and rebuild the workbook from it
+    streaming=False,         # read rows lazily and write results incrementally (flat memory on huge sheets)
+    clean_posts=True,        # strip LinkedIn page chrome and duplicate posts before prompting
+    input_token_budget=None, # per-prompt input-token budget; posts are trimmed to fit (None = no limit)
+    context_cache=None,      # optional context_cache.GeminiContextCache: email instructions sent once, not per row
+    batch_backend=None,      # batch_jobs.GeminiBatchBackend(get_client()): send all email/LinkedIn prompts as one batch job
+    combined_outreach=False, # FALSE rows get email + LinkedIn note from one structured-output call (not in batch mode)
+    stages=None,             # pipeline stages to run per row (e.g. ROW_STAGES: TRUE rows also skip the LinkedIn note)
+    row_range=None,          # (start, stop): only process these data rows (used by sharded_run for one shard)
+    stream_email=False,      # stream email answers and close the stream once the body is complete (not in batch mode)
+    metrics_filename=None,   # per-run JSON summary of every Gemini call (latency, tokens, cost by stage and row)
+    prometheus_filename=None # the same call metrics in Prometheus text format (e.g. for node_exporter's textfile collector)
+):
+    # One summary line per row at INFO; call structured_log.configure_logging() beforehand for
+    # DEBUG progress lines, JSON output, row sampling or full model outputs
+    ensure_logging()
+    settings = RowSettings(
+        instructions_email=instructions_email,
+        instructions_linkedin=instructions_linkedin,
+        speculative_email=speculative_email,
+        response_cache=response_cache,
+        verdict_cache=verdict_cache,
+        clean_posts=clean_posts,
+        input_token_budget=input_token_budget,
+        context_cache=context_cache,
+        combined_outreach=combined_outreach,
+        stages=order_stages(stages, set(INPUT_COLUMNS)) if stages is not None else None,
+        stream_email=stream_email,
+    )
+    journal = RunJournal(journal_filename or f"{output_filename}.journal.jsonl", resume=resume)
+    metrics = get_metrics_registry()
+    metrics.reset()
+
+    def on_row_done(index, company_website, result):
+        log_row_summary(index, company_website, result)
+        # Failed rows are not journaled so a resumed run retries them
+        if not result.get("error"):
+            journal.record(index, company_website, result)
+
+    try:
+        if batch_backend is not None:
+            row_results = _process_batch(
+                input_filename, output_filename, limit_rows, settings, journal, on_row_done,
+                async_mode, concurrency, batch_backend, row_range
+            )
+        else:
+            process = _process_streaming if streaming else _process_in_memory
+            row_results = process(
+                input_filename, output_filename, limit_rows, settings, journal, on_row_done, async_mode, concurrency,
+                row_range
+            )
+    finally:
+        journal.close()
+        if metrics_filename:
+            metrics.write_summary(metrics_filename, input_filename=input_filename, output_filename=output_filename)
+        if prometheus_filename:
+            metrics.write_prometheus(prometheus_filename)
+
+    _log_run_summary(row_results, settings)
+    return row_results
+
+
+def _read_rows_for_run(input_filename, limit_rows, journal, row_range=None):
+    # Returns the sheet, all rows, the journaled results and the rows still to process
+    df = _read_input_rows(input_filename, limit_rows, row_range)
+
+    rows = [(index, row["company website"], row["posts"]) for index, row in df.iterrows()]
+
+    results_by_index = {}
+    for index, company_website, _ in rows:
+        journaled = journal.completed_result(index, company_website)
+        if journaled is not None:
+            results_by_index[index] = journaled
+    pending_rows = [row for row in rows if row[0] not in results_by_index]
+    if results_by_index:
+        log_event(logger, logging.INFO, "resuming", done=len(results_by_index), pending=len(pending_rows))
+    return df, rows, results_by_index, pending_rows
+
+
+def _process_in_memory(input_filename, output_filename, limit_rows, settings, journal, on_row_done,
+                       async_mode, concurrency, row_range=None):
+    df, rows, results_by_index, pending_rows = _read_rows_for_run(input_filename, limit_rows, journal, row_range)
+
+    if async_mode:
+        new_results = asyncio.run(process_rows_async(pending_rows, settings, concurrency, on_row_done))
+        results_by_index.update((row[0], result) for row, result in zip(pending_rows, new_results))
+    else:
+        for index, company_website, posts in pending_rows:
+            try:
+                result = process_row(index, company_website, posts, settings)
+            except GeminiCallError as e:
+                result = failed_row_result(index, e)
+            on_row_done(index, company_website, result)
+            results_by_index[index] = result
+
+    row_results = [results_by_index[index] for index, _, _ in rows]
+    _write_output(df, row_results, output_filename)
+    return row_results
+
+
+def _screen_row(index, company_website, posts, settings):
+    posts, posts_tokens = prepare_posts(posts, settings)
+    started = time.perf_counter()
+    with tag_calls(row=index):
+        is_true, explanation = analyze_company_support(company_website, posts, settings.verdict_cache)
+    return posts, posts_tokens, is_true, explanation, time.perf_counter() - started
+
+
+async def _screen_rows_async(rows, settings, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
 
-        # Call analyze_company_support, returns (bool, explanation)
-        is_true, explanation = analyze_company_support(company_website, posts)
+    async def screen(index, company_website, posts):
+        posts, posts_tokens = prepare_posts(posts, settings)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                with tag_calls(row=index):
+                    is_true, explanation = await analyze_company_support_async(
+                        company_website, posts, settings.verdict_cache
+                    )
+            except GeminiCallError as e:
+                return e
+        return posts, posts_tokens, is_true, explanation, time.perf_counter() - started
 
-        analysis_results.append(is_true)
-        explanations.append(explanation)
+    return await asyncio.gather(*(screen(index, website, posts) for index, website, posts in rows))
 
-        email_subject = ""
-        email_body = ""
 
+def _screen_rows(rows, settings, async_mode, concurrency):
+    # Screening stays interactive: its verdict decides which rows get an email request in the batch
+    if async_mode:
+        return asyncio.run(_screen_rows_async(rows, settings, concurrency))
+    screened = []
+    for index, company_website, posts in rows:
+        try:
+            screened.append(_screen_row(index, company_website, posts, settings))
+        except GeminiCallError as e:
+            screened.append(e)
+    return screened
+
+
+def _batch_requests(rows, screened, settings):
+    # Yields (key, prompt, config, model) for every email/LinkedIn prompt not already in the response cache
+    for (index, company_website, _), screening in zip(rows, screened):
+        if isinstance(screening, GeminiCallError):
+            continue
+        posts, _, is_true, _, _ = screening
+        stages = [("linkedin", LINKEDIN_MODEL, build_linkedin_note_request, settings.instructions_linkedin)]
         if not is_true:
-            print(f"Company evaluated as FALSE - generating email...")
-            # Call the modified generate_cold_email which returns a tuple
-            email_subject, email_body = generate_cold_email(company_website, posts, instructions_email)
+            stages.insert(0, ("email", EMAIL_MODEL, build_cold_email_request, settings.instructions_email))
+        for stage, model, build_request, instructions in stages:
+            prompt, config = build_request(company_website, posts, instructions, settings.input_token_budget, {})
+            yield f"{index}:{stage}", prompt, config, model
+
+
+def _batch_job_name(job_filename, requests_filename):
+    # Re-attach to a job submitted by an earlier, interrupted run if it was built from identical requests
+    if not os.path.exists(job_filename):
+        return None
+    with open(job_filename, encoding="utf-8") as job_file:
+        saved = json.load(job_file)
+    return saved["job_name"] if saved.get("requests_sha256") == _file_sha256(requests_filename) else None
+
+
+def _file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _process_batch(input_filename, output_filename, limit_rows, settings, journal, on_row_done,
+                   async_mode, concurrency, batch_backend, row_range=None):
+    df, rows, results_by_index, pending_rows = _read_rows_for_run(input_filename, limit_rows, journal, row_range)
+    screened = _screen_rows(pending_rows, settings, async_mode, concurrency)
+
+    texts = {}
+    requests = []
+    prompt_stats = {}
+    for key, prompt, config, model in _batch_requests(pending_rows, screened, settings):
+        cache = settings.response_cache
+        cached = cache.get(cache.make_key(model, prompt, config)) if cache is not None else None
+        if cached is not None:
+            texts[key] = cached
         else:
-            print(f"Company evaluated as TRUE - skipping email generation.")
-            # Subject and body remain empty for skipped companies
+            requests.append((key, prompt, config, model))
+        prompt_stats[key] = {"input_tokens": estimate_tokens(prompt)}
 
-        generated_email_subjects.append(email_subject)
-        generated_email_bodies.append(email_body) # Store only the body here
+    # Email and LinkedIn share one model, so a single job carries every prompt
+    models = {model for _, _, _, model in requests}
+    if len(models) > 1:
+        raise ValueError(f"Batch mode needs one model for all prompts, got {sorted(models)}")
+    if requests:
+        requests_filename = f"{output_filename}.batch-requests.jsonl"
+        results_filename = f"{output_filename}.batch-results.jsonl"
+        job_filename = f"{output_filename}.batch-job.json"
+        write_batch_requests(requests_filename, ((key, prompt, config) for key, prompt, config, _ in requests))
 
-        # Generate LinkedIn connection note regardless of analysis result (or you can add logic if needed)
-        linkedin_message = generate_linkedin_connection_note(company_website, posts, instructions_linkedin, return_response=True)
-        generated_linkedin_messages.append(linkedin_message)
+        def remember_job(job_name):
+            with open(job_filename, "w", encoding="utf-8") as job_file:
+                json.dump({"job_name": job_name, "requests_sha256": _file_sha256(requests_filename)}, job_file)
 
-    # Add new columns to DataFrame
-    df['supports_israel_or_haram'] = analysis_results
-    df['explanation'] = explanations
-    df['email_subject'] = generated_email_subjects  # Populate new subject column
-    df['generated_email'] = generated_email_bodies  # This now contains only the body, renamed for clarity in output
-    df['linkedin_message'] = generated_linkedin_messages
-
-    # Reorder columns explicitly
-    desired_column_order = [
-        "company website",
-        "posts",
-        "supports_israel_or_haram",
-        "explanation",
-        "email_subject",        # New position for subject
-        "generated_email",      # This now holds the body
-        "email",                # Your manually updated email column
-        "linkedin_message",
-        "drafted",
-        "date_of_drafting"
-    ]
-    
-    existing_columns = df.columns.tolist()
-    final_column_order = [col for col in desired_column_order if col in existing_columns]
-    
-    df = df[final_column_order]
+        log_event(logger, logging.INFO, "batch job", prompts=len(requests), rows=len(pending_rows), cached=len(texts))
+        batch_texts = run_batch_job(
+            batch_backend, models.pop(), requests_filename, results_filename,
+            display_name=os.path.basename(output_filename),
+            job_name=_batch_job_name(job_filename, requests_filename) if journal.resuming else None,
+            on_submitted=remember_job,
+        )
+        for key, prompt, config, model in requests:
+            text = batch_texts.get(key)
+            if text is not None and settings.response_cache is not None:
+                settings.response_cache.set(settings.response_cache.make_key(model, prompt, config), model, text)
+        texts.update(batch_texts)
+        remove_batch_files(requests_filename, results_filename, job_filename)
+
+    for (index, company_website, _), screening in zip(pending_rows, screened):
+        if isinstance(screening, GeminiCallError):
+            result = failed_row_result(index, screening)
+        else:
+            result = _merge_batch_row(index, screening, texts, prompt_stats)
+        on_row_done(index, company_website, result)
+        results_by_index[index] = result
+
+    row_results = [results_by_index[index] for index, _, _ in rows]
+    _write_output(df, row_results, output_filename)
+    return row_results
+
+
+def _merge_batch_row(index, screening, texts, prompt_stats):
+    _, posts_tokens, is_true, explanation, screen_seconds = screening
+    stage_timings = {"screen": screen_seconds}
+    linkedin_message = texts.get(f"{index}:linkedin")
+    email_text = "" if is_true else texts.get(f"{index}:email")
+    if linkedin_message is None or email_text is None:
+        return failed_row_result(index, "batch request failed or missing from the job output", stage_timings)
+
+    email_subject, email_body = parse_cold_email_response(email_text) if not is_true else ("", "")
+    return {
+        "supports_israel_or_haram": is_true,
+        "explanation": explanation,
+        "email_subject": email_subject,
+        "generated_email": email_body,
+        "linkedin_message": linkedin_message,
+        "stage_timings": stage_timings,
+        "posts_tokens": posts_tokens,
+        "prompt_tokens": {
+            stage: prompt_stats[f"{index}:{stage}"]
+            for stage in ("email", "linkedin") if f"{index}:{stage}" in prompt_stats
+        },
+    }
 
-    # Save to new Excel file
-    df.to_excel(output_filename, index=False)
-    print(f"\nFiltered emails, explanations, and LinkedIn messages saved to {output_filename}")
 
+def _log_run_summary(row_results, settings):
+    _log_stage_timings(row_results)
+    calls = get_metrics_registry().summary()["totals"]
+    if calls["calls"]:
+        log_event(
+            logger, logging.INFO, "gemini calls", calls=calls["calls"], failed=calls["errors"],
+            input_tokens=calls["input_tokens"], output_tokens=calls["output_tokens"],
+            cost_usd=round(calls["cost_usd"], 4)
+        )
+    posts_tokens = [result["posts_tokens"] for result in row_results if result.get("posts_tokens")]
+    if posts_tokens:
+        saved = sum(entry["tokens_saved"] for entry in posts_tokens)
+        before = sum(entry["tokens_before"] for entry in posts_tokens) or 1
+        # Saved on every email and LinkedIn prompt
+        log_event(
+            logger, logging.INFO, "posts preprocessing", tokens_saved=saved,
+            per_row=round(saved / len(posts_tokens)), percent=round(100 * saved / before)
+        )
+    for stage, entry in summarize_prompt_tokens(row_results).items():
+        log_event(
+            logger, logging.INFO, "prompt tokens", stage=stage, n=entry["count"], mean=round(entry["mean"]),
+            max=entry["max"], posts_dropped=entry["posts_dropped"]
+        )
+    skipped_stages = {}
+    for result in row_results:
+        for stage in result.get("skipped_stages") or ():
+            skipped_stages[stage] = skipped_stages.get(stage, 0) + 1
+    if skipped_stages:
+        log_event(logger, logging.INFO, "stages skipped", **skipped_stages)
+    repairs = summarize_repairs(row_results)
+    if repairs["attempts"]:
+        log_event(logger, logging.INFO, "email repairs", **repairs)
+    failed_rows = sum(1 for result in row_results if result.get("error"))
+    if failed_rows:
+        log_event(
+            logger, logging.WARNING, "rows failed", rows=failed_rows,
+            hint="left blank; re-run them once the API recovers"
+        )
+    if settings.response_cache is not None:
+        log_event(
+            logger, logging.INFO, "response cache", hits=settings.response_cache.hits,
+            misses=settings.response_cache.misses
+        )
+    if settings.context_cache is not None and settings.context_cache.calls:
+        # These input tokens were billed at the cached rate
+        log_event(
+            logger, logging.INFO, "context cache", email_calls=settings.context_cache.calls,
+            cached_input_tokens=settings.context_cache.cached_input_tokens
+        )
+    if settings.verdict_cache is not None:
+        log_event(
+            logger, logging.INFO, "verdict cache", hits=settings.verdict_cache.hits,
+            misses=settings.verdict_cache.misses
+        )
+    speculation = summarize_speculation(row_results)
+    if speculation["launched"]:
+        log_event(logger, logging.INFO, "speculative emails", **speculation)
 
 
 
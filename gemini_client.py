@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import importlib.util
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from google import genai
+from google.genai.types import HttpOptions
+
+# Connection pool shared by every call site. Keep-alive connections (and their TLS sessions)
+# are reused across calls; the pool is sized for a few hundred rows in flight.
+MAX_CONNECTIONS = 200
+MAX_KEEPALIVE_CONNECTIONS = 100
+KEEPALIVE_EXPIRY_SECONDS = 120.0
+CONNECT_TIMEOUT_SECONDS = 10.0
+# How long a call waits for a free pooled connection; a leaked connection shows up as a
+# PoolTimeout error instead of a hang
+POOL_TIMEOUT_SECONDS = 120.0
+
+_client = None
+_client_lock = threading.Lock()
+# A client's async pool belongs to the event loop that first used it, so every loop
+# (each asyncio.run) gets its own client; they go away with their loop
+_loop_clients = weakref.WeakKeyDictionary()
+# set_client() replacement used everywhere, e.g. fake_gemini.FakeGeminiClient
+_installed_client = None
+
+# Responses opened inside the current closing_streamed_responses() block
+_streamed_responses = contextvars.ContextVar("gemini_streamed_responses", default=None)
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install "httpx[http2]")."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_client(api_key: str | None = None) -> genai.Client:
+    """
+    Build a genai.Client on one tuned httpx connection pool per transport (sync and async),
+    with HTTP/2 multiplexing when `h2` is installed.
+
+    Raises:
+        ValueError: If no api_key is given and GEMINI_API_KEY is not set.
+    """
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables.")
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+    )
+    http2 = http2_available()
+    # Passing explicit transports also keeps the SDK on httpx (not aiohttp) for async calls,
+    # so both directions use the pool configured here
+    return genai.Client(api_key=api_key, http_options=HttpOptions(
+        client_args={
+            "transport": httpx.HTTPTransport(limits=limits, http2=http2),
+            "event_hooks": {"request": [_bound_waits]},
+        },
+        async_client_args={
+            "transport": httpx.AsyncHTTPTransport(limits=limits, http2=http2),
+            "event_hooks": {"request": [_bound_waits_async], "response": [_track_streamed_response]},
+        },
+    ))
+
+
+def _bound_waits(request: httpx.Request) -> None:
+    # The SDK sends every request with its own timeout (None unless HttpOptions.timeout is set),
+    # which replaces the client's, so connect and pool waits are bounded here instead
+    timeouts = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        **timeouts,
+        "connect": timeouts.get("connect") or CONNECT_TIMEOUT_SECONDS,
+        "pool": timeouts.get("pool") or POOL_TIMEOUT_SECONDS,
+    }
+
+
+async def _bound_waits_async(request: httpx.Request) -> None:
+    _bound_waits(request)
+
+
+async def _track_streamed_response(response: httpx.Response) -> None:
+    responses = _streamed_responses.get()
+    if responses is not None:
+        responses.append(response)
+
+
+@asynccontextmanager
+async def closing_streamed_responses():
+    """
+    Close every async HTTP response opened inside the block when it exits. Closing an async
+    stream early (aclose() on client.aio.models.generate_content_stream) does not reach the
+    SDK's inner generator, so its httpx response would otherwise keep a pooled connection
+    until garbage collection.
+    """
+    responses = []
+    token = _streamed_responses.set(responses)
+    try:
+        yield
+    finally:
+        _streamed_responses.reset(token)
+        for response in responses:
+            await response.aclose()
+
+
+def get_client():
+    """
+    Return the Gemini client for the caller, creating it on first use: one shared client
+    for synchronous code and one per running event loop for async code. Importing the
+    generator modules does not need GEMINI_API_KEY; the first API call does.
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set when the client is first needed.
+    """
+    global _client
+    if _installed_client is not None:
+        return _installed_client
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _client_lock:
+        if loop is not None:
+            client = _loop_clients.get(loop)
+            if client is None:
+                client = _loop_clients[loop] = create_client()
+            return client
+        if _client is None:
+            _client = create_client()
+        return _client
+
+
+def set_client(client):
+    """
+    Use `client` for every caller and event loop (e.g. fake_gemini.FakeGeminiClient), or
+    go back to the lazily created clients with None. Returns the previously installed client.
+    """
+    global _installed_client
+    with _client_lock:
+        previous, _installed_client = _installed_client, client
+    return previous
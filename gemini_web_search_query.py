@@ -1,41 +1,68 @@
-import os
-from google import genai
+import logging
 from google.genai.types import Tool, GoogleSearch, GenerateContentConfig
+from gemini_client import get_client
+from prompt_budget import estimate_request_tokens
+from resilient_call import GeminiCallError, generate_content, generate_content_async
+from structured_log import configure_logging, get_logger, log_event, log_output
 
-# Load your Gemini API key from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
+logger = get_logger("search")
 
-# Initialize Gemini client
-client = genai.Client(api_key=GEMINI_API_KEY)
 
-def search_with_gemini(query: str, return_response=False):
-    print(f"\n--- Searching with Gemini: ---")
+SEARCH_MODEL = "gemini-2.5-flash-preview-05-20"
+# No max_output_tokens is set for search calls; reserve this much output when rate limiting
+SEARCH_OUTPUT_TOKEN_ALLOWANCE = 1000
+
 
+def _search_config() -> GenerateContentConfig:
     google_search_tool = Tool(google_search=GoogleSearch())
-    config = GenerateContentConfig(tools=[google_search_tool])
+    return GenerateContentConfig(tools=[google_search_tool])
+
+
+def search_with_gemini(query: str, return_response=False):
+    log_event(logger, logging.DEBUG, "searching with Gemini", model=SEARCH_MODEL, query_chars=len(query))
+
+    config = _search_config()
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-05-20",
-            contents=query,
-            config=config
+        response = generate_content(
+            get_client(), SEARCH_MODEL, query, config,
+            reserved_tokens=estimate_request_tokens(query, SEARCH_OUTPUT_TOKEN_ALLOWANCE), stage="screen"
+        )
+    except GeminiCallError as e:
+        log_event(
+            logger, logging.ERROR, "search failed", model=SEARCH_MODEL, error=str(e),
+            hint="check the API key and internet connectivity"
         )
-        print("\n--- Gemini's Response ---")
-        print(response.text)
-
         if return_response:
-            return response.text
+            raise
+        return None
 
-    except Exception as e:
-        print(f"\nAn error occurred: {e}")
-        print("Ensure your API key is correct and you have internet connectivity.")
-        if return_response:
-            return f"Error: {e}"
+    if return_response:
+        # The full grounded answer is only logged when outputs are requested
+        log_output(logger, "search response", response.text or "")
+        return response.text or ""
+    # Without return_response the answer is the whole point of the call, so always show it
+    log_event(logger, logging.INFO, "search response", output=response.text or "")
+
+
+async def search_with_gemini_async(query: str):
+    """
+    Async counterpart of search_with_gemini; always returns the response text.
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+    """
+    config = _search_config()
+
+    response = await generate_content_async(
+        get_client(), SEARCH_MODEL, query, config,
+        reserved_tokens=estimate_request_tokens(query, SEARCH_OUTPUT_TOKEN_ALLOWANCE), stage="screen"
+    )
+    return response.text or ""
 
 
 if __name__ == "__main__":
+    configure_logging()
     # Define instruction and query separately
     instruction = ""
     query = "does https://www.nexsysone.com/ supports israel? "
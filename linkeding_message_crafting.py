@@ -1,30 +1,19 @@
-import os
-from google import genai
+import logging
 from google.genai.types import GenerateContentConfig
+from gemini_client import get_client
+from llm_cache import ResponseCache
+from prompt_budget import build_budgeted_prompt, estimate_request_tokens
+from resilient_call import GeminiCallError, generate_content, generate_content_async
+from structured_log import get_logger, log_event
 
 
-# Initialize Gemini client (make sure GEMINI_API_KEY is set in your environment)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
-client = genai.Client(api_key=GEMINI_API_KEY)
+LINKEDIN_MODEL = "gemini-2.0-flash"
 
+logger = get_logger("linkedin")
 
-def generate_linkedin_connection_note(company_website: str, posts: str, instructions: str, return_response: bool = False) -> str:
-    """
-    Generate a personalized LinkedIn connection note message using Gemini AI without web search tool.
-
-    Args:
-        company_website (str): URL of the company website.
-        posts (str): LinkedIn posts or social media content for personalization.
-        instructions (str): Full detailed instructions for crafting the LinkedIn connection note.
-        return_response (bool): If True, returns the generated note text; else prints it.
-
-    Returns:
-        str: Generated LinkedIn connection note text if return_response=True, else None.
-    """
 
-    prompt = f"""
+def _build_linkedin_prompt(company_website: str, posts: str, instructions: str) -> str:
+    return f"""
 Company Website:
 {company_website}
 
@@ -37,28 +26,113 @@ Instructions:
 Please write a concise and polite LinkedIn connection note message for cold outreach based on the above.
 """
 
-    config = GenerateContentConfig(
+
+def _budgeted_linkedin_prompt(company_website: str, posts: str, instructions: str,
+                              input_token_budget: int | None, prompt_stats: dict | None) -> str:
+    prompt, stats = build_budgeted_prompt(
+        lambda fitted_posts: _build_linkedin_prompt(company_website, fitted_posts, instructions), posts, input_token_budget
+    )
+    if prompt_stats is not None:
+        prompt_stats.update(stats)
+    return prompt
+
+
+def _linkedin_config() -> GenerateContentConfig:
+    return GenerateContentConfig(
         max_output_tokens=500,
         temperature=0.7,
         tools=[]  # No search tool enabled
     )
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=config
+
+def build_linkedin_note_request(company_website: str, posts: str, instructions: str,
+                                input_token_budget: int | None = None, prompt_stats: dict | None = None):
+    """Return the (prompt, config) generate_linkedin_connection_note would send (e.g. for batch jobs)."""
+    return _budgeted_linkedin_prompt(company_website, posts, instructions, input_token_budget, prompt_stats), _linkedin_config()
+
+
+def generate_linkedin_connection_note(company_website: str, posts: str, instructions: str, return_response: bool = False,
+                                      cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                                      prompt_stats: dict | None = None) -> str:
+    """
+    Generate a personalized LinkedIn connection note message using Gemini AI without web search tool.
+
+    Args:
+        company_website (str): URL of the company website.
+        posts (str): LinkedIn posts or social media content for personalization.
+        instructions (str): Full detailed instructions for crafting the LinkedIn connection note.
+        return_response (bool): If True, returns the generated note text; else prints it.
+        cache (ResponseCache | None): Optional response cache; identical prompt, model and
+            config are answered from disk instead of calling the API.
+        input_token_budget (int | None): If set, posts are trimmed (oldest/reposted posts first) so the
+            locally estimated prompt size stays within this many tokens.
+        prompt_stats (dict | None): Optional dict that receives the estimated "input_tokens" of the
+            prompt and how many posts were dropped to fit the budget.
+
+    Returns:
+        str: Generated LinkedIn connection note text if return_response=True, else None.
+
+    Raises:
+        GeminiCallError: If return_response=True and the call fails permanently or transient
+            errors outlast the retries (with return_response=False the error is printed).
+    """
+
+    prompt = _budgeted_linkedin_prompt(company_website, posts, instructions, input_token_budget, prompt_stats)
+    config = _linkedin_config()
+
+    cache_key = cache.make_key(LINKEDIN_MODEL, prompt, config) if cache is not None else None
+    note = cache.get(cache_key) if cache is not None else None
+    if note is None:
+        try:
+            response = generate_content(
+                get_client(), LINKEDIN_MODEL, prompt, config,
+                reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="linkedin"
+            )
+        except GeminiCallError as e:
+            if return_response:
+                raise
+            log_event(logger, logging.WARNING, "linkedin note failed", error=str(e))
+            return None
+        note = (response.text or "").strip()
+        # An empty note is retried on the next run instead of being replayed from the cache
+        if cache is not None and note:
+            cache.set(cache_key, LINKEDIN_MODEL, note)
+
+    if return_response:
+        return note
+    else:
+        print(note)
+
+
+async def generate_linkedin_connection_note_async(company_website: str, posts: str, instructions: str,
+                                                  cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                                                  prompt_stats: dict | None = None) -> str:
+    """
+    Async counterpart of generate_linkedin_connection_note (always returns the note text).
+    `cache`, `input_token_budget` and `prompt_stats` work as in the sync version.
+
+    Returns:
+        str: Generated LinkedIn connection note text.
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+    """
+
+    prompt = _budgeted_linkedin_prompt(company_website, posts, instructions, input_token_budget, prompt_stats)
+    config = _linkedin_config()
+
+    cache_key = cache.make_key(LINKEDIN_MODEL, prompt, config) if cache is not None else None
+    note = cache.get(cache_key) if cache is not None else None
+    if note is None:
+        response = await generate_content_async(
+            get_client(), LINKEDIN_MODEL, prompt, config,
+            reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="linkedin"
         )
-        if return_response:
-            return response.text.strip()
-        else:
-            print(response.text.strip())
-    except Exception as e:
-        error_msg = f"Error generating LinkedIn connection note: {e}"
-        if return_response:
-            return error_msg
-        else:
-            print(error_msg)
+        note = (response.text or "").strip()
+        # An empty note is retried on the next run instead of being replayed from the cache
+        if cache is not None and note:
+            cache.set(cache_key, LINKEDIN_MODEL, note)
+    return note
 
 
 # Example usage:
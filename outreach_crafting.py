@@ -0,0 +1,181 @@
+import json
+import logging
+from google.genai.types import GenerateContentConfig, Schema, Type
+from gemini_client import get_client
+from email_crafting import EMAIL_MODEL, generate_cold_email, generate_cold_email_async
+from linkeding_message_crafting import generate_linkedin_connection_note, generate_linkedin_connection_note_async
+from llm_cache import ResponseCache
+from prompt_budget import build_budgeted_prompt, estimate_request_tokens
+from resilient_call import generate_content, generate_content_async
+from structured_log import get_logger, log_event
+
+logger = get_logger("outreach")
+
+
+# Email and LinkedIn note come from the same model, so one call can produce both
+OUTREACH_MODEL = EMAIL_MODEL
+
+OUTREACH_SCHEMA = Schema(
+    type=Type.OBJECT,
+    properties={
+        "subject": Schema(type=Type.STRING, description="Cold email subject line"),
+        "body": Schema(type=Type.STRING, description="Cold email body"),
+        "linkedin_note": Schema(type=Type.STRING, description="LinkedIn connection note"),
+    },
+    required=["subject", "body", "linkedin_note"],
+    property_ordering=["subject", "body", "linkedin_note"],
+)
+
+
+def _build_outreach_prompt(company_website: str, posts: str, instructions_email: str, instructions_linkedin: str) -> str:
+    return f"""
+Company Website:
+{company_website}
+
+LinkedIn Posts:
+{posts if posts.strip() else "No specific social media content provided."}
+
+Email Instructions:
+{instructions_email}
+
+LinkedIn Note Instructions:
+{instructions_linkedin}
+
+Based on the above, write a full cold email (subject line and body) following the email instructions,
+and a concise and polite LinkedIn connection note for cold outreach following the LinkedIn note instructions.
+Return "subject", "body" and "linkedin_note".
+"""
+
+
+def _outreach_config() -> GenerateContentConfig:
+    return GenerateContentConfig(
+        max_output_tokens=1500,  # email (1000) + LinkedIn note (500) budgets of the separate calls
+        temperature=0.7,
+        response_mime_type="application/json",
+        response_schema=OUTREACH_SCHEMA,
+        tools=[]  # No search tool enabled
+    )
+
+
+def _parse_outreach_response(text: str) -> dict | None:
+    # Schema-constrained output is valid JSON unless the response was cut off (e.g. max tokens)
+    try:
+        outreach = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(outreach, dict) or not all(isinstance(outreach.get(field), str) for field in OUTREACH_SCHEMA.required):
+        return None
+    return {field: outreach[field].strip() for field in OUTREACH_SCHEMA.required}
+
+
+def _budgeted_outreach_prompt(company_website, posts, instructions_email, instructions_linkedin,
+                              input_token_budget, prompt_stats) -> str:
+    prompt, stats = build_budgeted_prompt(
+        lambda fitted_posts: _build_outreach_prompt(company_website, fitted_posts, instructions_email, instructions_linkedin),
+        posts, input_token_budget
+    )
+    if prompt_stats is not None:
+        prompt_stats.update(stats)
+    return prompt
+
+
+def generate_outreach(company_website: str, posts: str, instructions_email: str, instructions_linkedin: str,
+                      cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                      prompt_stats: dict | None = None) -> dict:
+    """
+    Generate the cold email and the LinkedIn connection note in a single call with a JSON
+    response schema, instead of one generate_cold_email and one generate_linkedin_connection_note
+    call that each resend the website and posts.
+
+    If the answer does not parse (e.g. truncated JSON), the row falls back to the two separate
+    generators, so callers always get a complete result.
+
+    Args:
+        company_website (str): URL of the company website.
+        posts (str): LinkedIn posts or social media content for personalization.
+        instructions_email (str): Full detailed instructions for email crafting.
+        instructions_linkedin (str): Full detailed instructions for the LinkedIn connection note.
+        cache, input_token_budget, prompt_stats: As in generate_cold_email.
+
+    Returns:
+        dict: {"subject", "body", "linkedin_note", "fallback"}; "fallback" is True when the
+            separate generators had to be used.
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+    """
+    prompt = _budgeted_outreach_prompt(
+        company_website, posts, instructions_email, instructions_linkedin, input_token_budget, prompt_stats
+    )
+    config = _outreach_config()
+
+    cache_key = cache.make_key(OUTREACH_MODEL, prompt, config) if cache is not None else None
+    text = cache.get(cache_key) if cache is not None else None
+    if text is None:
+        response = generate_content(
+            get_client(), OUTREACH_MODEL, prompt, config,
+            reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="outreach"
+        )
+        text = (response.text or "").strip()
+    outreach = _parse_outreach_response(text)
+    if outreach is None:
+        log_event(logger, logging.WARNING, "combined outreach response did not parse, falling back to separate calls")
+        subject, body = generate_cold_email(
+            company_website, posts, instructions_email, cache=cache, input_token_budget=input_token_budget
+        )
+        note = generate_linkedin_connection_note(
+            company_website, posts, instructions_linkedin, return_response=True,
+            cache=cache, input_token_budget=input_token_budget
+        )
+        return {"subject": subject, "body": body, "linkedin_note": note, "fallback": True}
+    if cache is not None:
+        cache.set(cache_key, OUTREACH_MODEL, text)
+    return {**outreach, "fallback": False}
+
+
+async def generate_outreach_async(company_website: str, posts: str, instructions_email: str, instructions_linkedin: str,
+                                  cache: ResponseCache | None = None, input_token_budget: int | None = None,
+                                  prompt_stats: dict | None = None) -> dict:
+    """
+    Async counterpart of generate_outreach.
+
+    Returns:
+        dict: {"subject", "body", "linkedin_note", "fallback"}.
+
+    Raises:
+        GeminiCallError: If the call fails permanently or transient errors outlast the retries.
+    """
+    prompt = _budgeted_outreach_prompt(
+        company_website, posts, instructions_email, instructions_linkedin, input_token_budget, prompt_stats
+    )
+    config = _outreach_config()
+
+    cache_key = cache.make_key(OUTREACH_MODEL, prompt, config) if cache is not None else None
+    text = cache.get(cache_key) if cache is not None else None
+    if text is None:
+        response = await generate_content_async(
+            get_client(), OUTREACH_MODEL, prompt, config,
+            reserved_tokens=estimate_request_tokens(prompt, config.max_output_tokens), stage="outreach"
+        )
+        text = (response.text or "").strip()
+    outreach = _parse_outreach_response(text)
+    if outreach is None:
+        log_event(logger, logging.WARNING, "combined outreach response did not parse, falling back to separate calls")
+        email_subject, email_body = await generate_cold_email_async(
+            company_website, posts, instructions_email, cache=cache, input_token_budget=input_token_budget
+        )
+        note = await generate_linkedin_connection_note_async(
+            company_website, posts, instructions_linkedin, cache=cache, input_token_budget=input_token_budget
+        )
+        return {"subject": email_subject, "body": email_body, "linkedin_note": note, "fallback": True}
+    if cache is not None:
+        cache.set(cache_key, OUTREACH_MODEL, text)
+    return {**outreach, "fallback": False}
+
+
+def split_outreach(outreach: dict) -> tuple[tuple[str, str], str]:
+    """
+    Compatibility shim: turn a generate_outreach result into what the separate generators
+    return, ((subject_line, email_body), linkedin_note), for code written against them.
+    """
+    return (outreach["subject"], outreach["body"]), outreach["linkedin_note"]
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass
+class Stage:
+    """
+    One step of the per-row pipeline.
+
+    `run(row, settings, prompt_stats)` returns a dict with the stage's `outputs`; `run_async`
+    is its coroutine counterpart. `skip_if(row)` decides, once all `inputs` are available,
+    whether the row needs this stage at all; a skipped stage contributes `defaults` instead
+    of calling the API. Fields a skip predicate reads must be listed in `inputs`.
+    """
+    name: str
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+    run: Callable
+    run_async: Callable | None = None
+    skip_if: Callable[[dict], bool] | None = None
+    defaults: dict = field(default_factory=dict)
+
+
+def order_stages(stages: list[Stage], initial_fields: set[str]) -> list[Stage]:
+    """
+    Topologically order `stages` by their inputs and outputs.
+
+    Raises:
+        ValueError: If two stages produce the same field, or an input is never produced
+            (a missing stage or a cycle).
+    """
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers or output in initial_fields:
+                raise ValueError(f"Field {output!r} is produced by more than one stage")
+            producers[output] = stage.name
+
+    available = set(initial_fields)
+    ordered = []
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if set(stage.inputs) <= available]
+        if not ready:
+            missing = {stage.name: sorted(set(stage.inputs) - available) for stage in remaining}
+            raise ValueError(f"Stage inputs can never be satisfied: {missing}")
+        for stage in ready:
+            ordered.append(stage)
+            available.update(stage.outputs)
+            remaining.remove(stage)
+    return ordered
+
+
+def _skip(stage: Stage, row: dict, skipped: list) -> bool:
+    if stage.skip_if is None or not stage.skip_if(row):
+        return False
+    row.update({output: stage.defaults.get(output) for output in stage.outputs})
+    skipped.append(stage.name)
+    return True
+
+
+def run_stages(stages: list[Stage], row: dict, settings, stage_timings: dict, prompt_tokens: dict) -> list[str]:
+    """
+    Run the stages one after another on `row` (a dict of fields, updated in place).
+
+    Returns:
+        list[str]: Names of the stages skipped for this row.
+    """
+    skipped = []
+    for stage in stages:
+        if _skip(stage, row, skipped):
+            continue
+        started = time.perf_counter()
+        row.update(stage.run(row, settings, prompt_tokens.setdefault(stage.name, {})))
+        stage_timings[stage.name] = time.perf_counter() - started
+    return skipped
+
+
+async def run_stages_async(stages: list[Stage], row: dict, settings, stage_timings: dict, prompt_tokens: dict,
+                           pool: asyncio.Semaphore) -> list[str]:
+    """
+    Run each stage as soon as its inputs are available, so independent stages of a row
+    overlap. Every stage call holds a slot of `pool`, a semaphore shared by all rows, which
+    caps the number of API calls in flight for the whole run.
+
+    Returns:
+        list[str]: Names of the stages skipped for this row.
+
+    Raises:
+        Whatever a stage raises; the row's other in-flight stages are cancelled first.
+    """
+    skipped = []
+    pending = list(stages)
+    running = {}
+
+    async def call(stage):
+        async with pool:
+            started = time.perf_counter()
+            outputs = await stage.run_async(row, settings, prompt_tokens.setdefault(stage.name, {}))
+            stage_timings[stage.name] = time.perf_counter() - started
+        return outputs
+
+    try:
+        while pending or running:
+            # A skipped stage fills its outputs at once, which can make further stages ready
+            ready = [stage for stage in pending if all(name in row for name in stage.inputs)]
+            while ready:
+                for stage in ready:
+                    pending.remove(stage)
+                    if not _skip(stage, row, skipped):
+                        running[asyncio.create_task(call(stage))] = stage
+                ready = [stage for stage in pending if all(name in row for name in stage.inputs)]
+            if not running:
+                if pending:
+                    raise ValueError(f"Stages never became ready: {[stage.name for stage in pending]}")
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.pop(task)
+                row.update(task.result())
+    finally:
+        for task in running:
+            task.cancel()
+    return skipped
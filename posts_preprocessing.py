@@ -0,0 +1,118 @@
+import re
+
+from prompt_budget import estimate_tokens
+
+# Whole lines that are LinkedIn page chrome (navigation, buttons, image placeholders)
+BOILERPLATE_LINES = {
+    "skip to search", "skip to main content", "keyboard shortcuts", "close jump menu", "search",
+    "new feed updates notifications", "home", "my network", "jobs", "messaging", "notifications", "me",
+    "for business", "follow", "following", "message", "connect", "all activity", "posts", "comments",
+    "images", "reactions", "articles", "documents", "videos", "like", "comment", "repost", "send",
+    "…more", "...more", "show translation", "see translation", "activate to view larger image,",
+    "no alternative text description for this image", "show more", "show less", "about", "accessibility",
+    "help center", "privacy & terms", "ad choices", "advertising", "business services",
+    "get the linkedin app", "more", "compose message", "text, logo", "cms-image",
+    "graphical user interface, application", "starting a new position",
+}
+
+BOILERPLATE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"^\d+ notifications? total$",
+    r"^\d+ new notifications?$",
+    r"^try premium",
+    r"^loaded \d+ posts? posts$",
+    r"^view .+ graphic link$",
+    r"^[•·]\s*(1st|2nd|3rd\+?)",                      # connection degree badges
+    r"^[\d,.]+[km]?$",                                 # bare reaction counters
+    r"^[\d,.]+[km]? (comments?|reposts?|followers?)$",
+    r"^(like|celebrate|love|insightful|support|funny|curious)+$",  # reaction icon alt-texts
+    r"^linkedin corporation ©",
+    r"^you are on the messaging overlay",
+    r"status is online$",
+)]
+
+# "1mo •  1 month ago • Visible to anyone on or off LinkedIn" -> "1mo"
+POST_AGE_PATTERN = re.compile(r"^(\d+\s*(?:s|m|h|d|w|mo|yr))\s*•.*$", re.IGNORECASE)
+# Scraped names/headlines are often doubled: "Yalla PlusYalla Plus" -> "Yalla Plus"
+DOUBLED_TEXT_PATTERN = re.compile(r"^(.+?)\1$")
+FEED_POST_PATTERN = re.compile(r"^feed post number \d+$", re.IGNORECASE)
+
+
+def _clean_line(line: str) -> str:
+    line = line.strip().strip('"')
+    if not line:
+        return ""
+    lowered = line.lower()
+    if lowered in BOILERPLATE_LINES or any(pattern.search(lowered) for pattern in BOILERPLATE_PATTERNS):
+        return ""
+    age = POST_AGE_PATTERN.match(line)
+    if age:
+        return age.group(1)
+    doubled = DOUBLED_TEXT_PATTERN.match(line)
+    if doubled and len(doubled.group(1)) > 1:
+        return doubled.group(1).strip()
+    return line
+
+
+def _paragraph_key(paragraph: list[str]) -> str:
+    return " ".join(" ".join(paragraph).split()).lower()
+
+
+def clean_linkedin_posts(posts: str) -> tuple[str, dict]:
+    """
+    Strip LinkedIn page chrome from a scraped `posts` cell and collapse repeated content.
+
+    Lines are cleaned one by one, then grouped into paragraphs (blank-line separated, with
+    "Feed post number N" markers kept as post boundaries). A paragraph whose text already
+    appeared earlier in the cell - the same post pasted twice, a repost of an own post - is
+    dropped, as are consecutive duplicate lines such as a name repeated above each post.
+
+    Returns:
+        tuple[str, dict]: The cleaned text and {"tokens_before", "tokens_after", "tokens_saved"}.
+    """
+    paragraphs = []
+    current = []
+    for raw_line in posts.splitlines():
+        line = _clean_line(raw_line)
+        if FEED_POST_PATTERN.match(line):
+            if current:
+                paragraphs.append(current)
+            paragraphs.append([line])
+            current = []
+        elif not line:
+            # Only a genuinely blank source line ends a paragraph, not a dropped chrome line
+            if not raw_line.strip() and current:
+                paragraphs.append(current)
+                current = []
+        elif not current or current[-1] != line:
+            current.append(line)
+    if current:
+        paragraphs.append(current)
+
+    seen = set()
+    kept = []
+    for paragraph in paragraphs:
+        key = _paragraph_key(paragraph)
+        if FEED_POST_PATTERN.match(key):
+            kept.append(paragraph)
+            continue
+        # Short lines (names, ages) legitimately recur across posts; only dedupe real content
+        if len(key) >= 40 and key in seen:
+            continue
+        seen.add(key)
+        kept.append(paragraph)
+
+    # Drop "Feed post number N" markers left with nothing after them
+    kept = [
+        paragraph for position, paragraph in enumerate(kept)
+        if not FEED_POST_PATTERN.match(paragraph[0])
+        or (position + 1 < len(kept) and not FEED_POST_PATTERN.match(kept[position + 1][0]))
+    ]
+
+    cleaned = "\n\n".join("\n".join(paragraph) for paragraph in kept)
+    tokens_before = estimate_tokens(posts)
+    tokens_after = estimate_tokens(cleaned)
+    return cleaned, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
@@ -0,0 +1,124 @@
+import math
+import re
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+FEED_POST_MARKER = re.compile(r"^feed post number \d+\s*$", re.IGNORECASE | re.MULTILINE)
+REPOST_MARKER = re.compile(r"\breposted this\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local, network-free token estimate for Gemini prompts.
+
+    Latin words cost about one token per 4 characters, words in other scripts (Arabic posts
+    are common in our leads) about one per 2 characters, and each punctuation mark one token.
+    Close enough to budget prompts; use usage_metadata for exact billing numbers.
+    """
+    tokens = 0
+    for match in WORD_PATTERN.finditer(text):
+        word = match.group()
+        if word.isascii():
+            tokens += max(1, math.ceil(len(word) / 4))
+        else:
+            tokens += max(1, math.ceil(len(word) / 2))
+    return tokens
+
+
+def estimate_request_tokens(contents: str, max_output_tokens: int | None = None) -> int:
+    """Tokens to reserve with the rate limiter before a call: estimate_tokens() of the prompt plus the output allowance."""
+    return estimate_tokens(contents) + (max_output_tokens or 0)
+
+
+def split_posts(posts: str) -> tuple[str, list[str]]:
+    """Split a posts cell into its profile header and the feed post blocks, newest first."""
+    markers = list(FEED_POST_MARKER.finditer(posts))
+    if not markers:
+        return posts, []
+    header = posts[:markers[0].start()]
+    blocks = [
+        posts[marker.start():markers[position + 1].start() if position + 1 < len(markers) else len(posts)]
+        for position, marker in enumerate(markers)
+    ]
+    return header, blocks
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    # Keep whole paragraphs while they fit, then cut the last one at a word boundary
+    kept = []
+    used = 0
+    for paragraph in text.split("\n\n"):
+        cost = estimate_tokens(paragraph)
+        if used + cost <= budget:
+            kept.append(paragraph)
+            used += cost
+            continue
+        words = []
+        for word in paragraph.split():
+            cost = estimate_tokens(word)
+            if used + cost > budget:
+                break
+            words.append(word)
+            used += cost
+        if words:
+            kept.append(" ".join(words) + " …")
+        break
+    return "\n\n".join(kept)
+
+
+def fit_posts_to_budget(posts: str, budget_tokens: int) -> tuple[str, dict]:
+    """
+    Trim `posts` to at most `budget_tokens` estimated tokens.
+
+    Feed posts are dropped whole, reposts of other people's content before the prospect's
+    own posts, and the oldest (last in the feed) first within each group. If the header and
+    the newest post alone still exceed the budget, that text is cut at a paragraph/word boundary.
+
+    Returns:
+        tuple[str, dict]: The fitted posts and {"posts_tokens", "fitted_posts_tokens", "posts_dropped"}.
+    """
+    original_tokens = estimate_tokens(posts)
+    stats = {"posts_tokens": original_tokens, "fitted_posts_tokens": original_tokens, "posts_dropped": 0}
+    if original_tokens <= budget_tokens:
+        return posts, stats
+
+    header, blocks = split_posts(posts)
+    costs = [estimate_tokens(block) for block in blocks]
+    total = estimate_tokens(header) + sum(costs)
+    # Drop order: reposts oldest-first, then own posts oldest-first; never the newest post
+    drop_order = sorted(
+        range(1, len(blocks)),
+        key=lambda position: (REPOST_MARKER.search(blocks[position]) is None, -position),
+    )
+    dropped = set()
+    for position in drop_order:
+        if total <= budget_tokens:
+            break
+        dropped.add(position)
+        total -= costs[position]
+
+    fitted = header + "".join(block for position, block in enumerate(blocks) if position not in dropped)
+    if total > budget_tokens:
+        fitted = _truncate_to_tokens(fitted, max(0, budget_tokens))
+
+    stats["fitted_posts_tokens"] = estimate_tokens(fitted)
+    stats["posts_dropped"] = len(dropped)
+    return fitted, stats
+
+
+def build_budgeted_prompt(build_prompt, posts: str, input_token_budget: int | None) -> tuple[str, dict]:
+    """
+    Build a prompt with `build_prompt(posts)`, fitting the posts into whatever is left of
+    `input_token_budget` after the fixed part of the prompt (instructions, website, format).
+
+    Returns:
+        tuple[str, dict]: The prompt and its stats, including the estimated "input_tokens".
+    """
+    if input_token_budget is None:
+        prompt = build_prompt(posts)
+        return prompt, {"input_tokens": estimate_tokens(prompt), "posts_dropped": 0}
+
+    fixed_tokens = estimate_tokens(build_prompt(""))
+    fitted_posts, stats = fit_posts_to_budget(posts, input_token_budget - fixed_tokens)
+    prompt = build_prompt(fitted_posts)
+    stats["input_tokens"] = estimate_tokens(prompt)
+    return prompt, stats
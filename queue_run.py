@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import time
+
+from excel_stream import StreamingExcelWriter
+from pipeline import order_stages
+from rate_limiter import set_rate_limit_share
+from resilient_call import GeminiCallError
+from row_engine import (
+    INPUT_COLUMNS, OUTPUT_COLUMNS, RowSettings, failed_row_result, iter_input_rows, log_row_summary, output_row,
+    process_row, run_row_async
+)
+from structured_log import ensure_logging, get_logger, log_event
+from work_queue import DEFAULT_LEASE_SECONDS, DEFAULT_QUEUE_PATH, WorkQueue, default_worker_id
+
+logger = get_logger("queue_run")
+
+
+def enqueue_campaign(input_filename='apollo_data.xlsx', queue_path=DEFAULT_QUEUE_PATH, campaign=None, limit_rows=-1):
+    """
+    Load the input sheet's rows into the shared queue. Safe to run again: rows already queued
+    (and their results) are kept. Returns the campaign name.
+    """
+    ensure_logging()
+    campaign = campaign or os.path.basename(input_filename)
+    queue = WorkQueue(queue_path)
+    try:
+        added = queue.enqueue(campaign, iter_input_rows(input_filename, limit_rows))
+        log_event(logger, logging.INFO, "rows queued", campaign=campaign, added=added, **queue.counts(campaign))
+    finally:
+        queue.close()
+    return campaign
+
+
+def run_queue_worker(
+    campaign,
+    instructions_email='',
+    instructions_linkedin='',
+    queue_path=DEFAULT_QUEUE_PATH,
+    worker_id=None,          # defaults to host:pid:random
+    async_mode=False,
+    concurrency=10,          # rows processed at once when async_mode=True; a new row is claimed as each finishes
+    lease_seconds=DEFAULT_LEASE_SECONDS,  # renewed every lease_seconds / 3 while a row is processed
+    poll_seconds=15,         # idle wait while other workers still hold leases
+    rate_limit_share=1.0,    # fraction of the model quotas for this process (e.g. 1/3 for 3 workers on one project)
+    **settings_options       # RowSettings fields: response_cache, verdict_cache, stages, combined_outreach, ...
+):
+    """
+    Claim rows from the queue, process them with the same per-row functions as final.py
+    and store each result, until no rows are pending and no other worker holds a lease.
+    Rows of crashed workers are picked up again once their lease expires.
+
+    Returns:
+        int: Number of rows this worker completed.
+    """
+    ensure_logging()
+    worker = worker_id or default_worker_id()
+    if rate_limit_share != 1.0:
+        set_rate_limit_share(rate_limit_share)
+    if settings_options.get("stages") is not None:
+        settings_options["stages"] = order_stages(settings_options["stages"], set(INPUT_COLUMNS))
+    settings = RowSettings(
+        instructions_email=instructions_email, instructions_linkedin=instructions_linkedin, **settings_options
+    )
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    completed = 0
+
+    def record(index, company_website, result):
+        nonlocal completed
+        heartbeat.release(index)
+        log_row_summary(index, company_website, result)
+        if result.get("error"):
+            queue.fail(campaign, index, worker, result["error"])
+        elif queue.complete(campaign, index, worker, result):
+            completed += 1
+        else:
+            log_event(logger, logging.WARNING, "lease taken over, result discarded", row=index + 1, worker=worker)
+
+    def claim(limit):
+        # Rows to process, [] to wait for other workers' leases, or None once the campaign is drained
+        rows = queue.claim(campaign, worker, limit)
+        if not rows and queue.counts(campaign)["leased"] == 0:
+            return None
+        heartbeat.add(index for index, _, _ in rows)
+        return rows
+
+    async def drain_async():
+        # One event loop for the whole worker: the shared client's async connections belong to it.
+        # Rows are claimed as slots free up, so one slow row does not hold back the others.
+        semaphore = asyncio.Semaphore(concurrency)
+        running = set()
+
+        async def run(index, company_website, posts):
+            try:
+                result = await run_row_async(index, company_website, posts, settings, semaphore)
+            except GeminiCallError as e:
+                result = failed_row_result(index, e)
+            record(index, company_website, result)
+
+        while True:
+            rows = claim(concurrency - len(running)) if len(running) < concurrency else []
+            if rows is None:
+                break
+            running.update(asyncio.create_task(run(*row)) for row in rows)
+            if not running:
+                # Other workers still hold rows; wait in case one of them dies and its lease expires
+                await asyncio.sleep(poll_seconds)
+                continue
+            # With free slots, look for new rows again after poll_seconds even if nothing finished
+            done, running = await asyncio.wait(
+                running, timeout=poll_seconds if len(running) < concurrency else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                task.result()
+
+    log_event(logger, logging.INFO, "worker started", worker=worker, campaign=campaign)
+    try:
+        with queue.heartbeat(campaign, worker, []) as heartbeat:
+            if async_mode:
+                asyncio.run(drain_async())
+            else:
+                while (rows := claim(1)) is not None:
+                    if not rows:
+                        time.sleep(poll_seconds)
+                        continue
+                    index, company_website, posts = rows[0]
+                    try:
+                        result = process_row(index, company_website, posts, settings)
+                    except GeminiCallError as e:
+                        result = failed_row_result(index, e)
+                    record(index, company_website, result)
+    finally:
+        queue.close()
+    log_event(logger, logging.INFO, "worker finished", worker=worker, completed=completed)
+    return completed
+
+
+def export_campaign(campaign, output_filename='apollo_filtered_emails_output.xlsx', queue_path=DEFAULT_QUEUE_PATH):
+    """
+    Write every queued row to `output_filename` in the original row order. Rows without a
+    result (still pending, leased or failed) are written with blank generated columns.
+
+    Returns:
+        dict: Row counts per queue status.
+    """
+    ensure_logging()
+    queue = WorkQueue(queue_path)
+    try:
+        with StreamingExcelWriter(output_filename, OUTPUT_COLUMNS) as writer:
+            for _, company_website, posts, result, _ in queue.iter_results(campaign):
+                writer.append(output_row(company_website, posts, result or {}))
+        counts = queue.counts(campaign)
+    finally:
+        queue.close()
+    log_event(logger, logging.INFO, "campaign exported", campaign=campaign, filename=output_filename, **counts)
+    return counts
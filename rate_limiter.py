@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import time
+
+# Default per-model quotas (requests per minute, tokens per minute).
+# Override with configure_rate_limit() or GEMINI_RPM_<MODEL> / GEMINI_TPM_<MODEL> env vars,
+# e.g. GEMINI_RPM_GEMINI_2_0_FLASH=15 for the free tier.
+DEFAULT_RATE_LIMITS = {
+    "gemini-2.0-flash": {"rpm": 2000, "tpm": 4_000_000},
+    "gemini-2.5-flash-preview-05-20": {"rpm": 1000, "tpm": 1_000_000},
+}
+FALLBACK_RATE_LIMIT = {"rpm": 60, "tpm": 250_000}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity-per-minute.
+
+    reserve() always deducts immediately (the balance may go negative) and returns how
+    long the caller must wait before its share is actually available. Callers therefore
+    queue up in arrival order without polling.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def charge(self, amount: float) -> float:
+        # A single request larger than the bucket could never be satisfied; it is capped at capacity
+        return min(amount, self.capacity)
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.balance -= self.charge(amount)
+        return 0.0 if self.balance >= 0 else -self.balance / self.rate
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.balance = min(self.capacity, self.balance + amount)
+
+
+class RateLimiter:
+    """Process-wide limiter holding one requests bucket and one tokens bucket per model."""
+
+    def __init__(self, limits: dict | None = None):
+        self._limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        self._share = 1.0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(self, model: str, rpm: float, tpm: float) -> None:
+        with self._lock:
+            self._limits[model] = {"rpm": rpm, "tpm": tpm}
+            self._buckets.pop(model, None)
+
+    def set_share(self, share: float) -> None:
+        """Use only `share` (0-1] of every model's quota, e.g. 1/N for one of N worker processes."""
+        with self._lock:
+            self._share = share
+            self._buckets.clear()
+
+    def _limits_for(self, model: str) -> dict:
+        env_key = model.upper().replace("-", "_").replace(".", "_")
+        limits = self._limits.get(model, FALLBACK_RATE_LIMIT)
+        return {
+            "rpm": float(os.getenv(f"GEMINI_RPM_{env_key}", limits["rpm"])) * self._share,
+            "tpm": float(os.getenv(f"GEMINI_TPM_{env_key}", limits["tpm"])) * self._share,
+        }
+
+    def _reserve(self, model: str, tokens: int) -> tuple[float, float]:
+        # Returns (seconds to wait, tokens actually deducted)
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                limits = self._limits_for(model)
+                buckets = self._buckets[model] = (TokenBucket(limits["rpm"]), TokenBucket(limits["tpm"]))
+            requests_bucket, tokens_bucket = buckets
+            now = time.monotonic()
+            wait = max(requests_bucket.reserve(1, now), tokens_bucket.reserve(tokens, now))
+            return wait, tokens_bucket.charge(tokens)
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """
+        Block until one request of `tokens` tokens fits within the model's quota. Returns the
+        tokens actually deducted (capped at the bucket size), to pass on to settle().
+        """
+        wait, charged = self._reserve(model, tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return charged
+
+    async def acquire_async(self, model: str, tokens: int) -> float:
+        """Async variant of acquire(); yields to the event loop instead of blocking."""
+        wait, charged = self._reserve(model, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return charged
+
+    def settle(self, model: str, charged_tokens: float, actual_tokens: int | None) -> None:
+        """
+        Correct the tokens bucket once the real usage is known. `charged_tokens` is what
+        acquire() returned; over-estimates are refunded (never more than was deducted) so
+        the next callers can run right at quota.
+        """
+        if actual_tokens is None:
+            return
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                return
+            now = time.monotonic()
+            difference = charged_tokens - buckets[1].charge(actual_tokens)
+            if difference > 0:
+                buckets[1].refund(difference, now)
+            elif difference < 0:
+                buckets[1].reserve(-difference, now)
+
+
+def actual_request_tokens(response) -> int | None:
+    metadata = getattr(response, "usage_metadata", None)
+    total = getattr(metadata, "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter shared by every Gemini call site."""
+    return _rate_limiter
+
+
+def configure_rate_limit(model: str, rpm: float, tpm: float) -> None:
+    _rate_limiter.configure(model, rpm, tpm)
+
+
+def set_rate_limit_share(share: float) -> None:
+    _rate_limiter.set_share(share)
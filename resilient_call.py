@@ -0,0 +1,396 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+from google.genai import errors
+
+from call_metrics import record_call
+from gemini_client import closing_streamed_responses
+from prompt_budget import estimate_tokens
+from rate_limiter import get_rate_limiter, actual_request_tokens
+from structured_log import get_logger, log_event
+
+logger = get_logger("resilient_call")
+
+# HTTP status codes worth retrying: rate limiting, request timeout and server-side failures
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+MAX_ATTEMPTS = 5
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 60.0
+
+
+class GeminiCallError(Exception):
+    """Raised when a Gemini call fails permanently or keeps failing after all retries."""
+
+    def __init__(self, message: str, model: str, attempts: int, transient: bool):
+        super().__init__(message)
+        self.model = model
+        self.attempts = attempts
+        self.transient = transient
+
+
+class CircuitOpenError(GeminiCallError):
+    """Raised when a model's circuit breaker has stayed open for longer than allowed."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Classify an exception from generate_content as transient (retry) or permanent (give up)."""
+    if isinstance(error, errors.APIError):
+        return error.code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+
+def _server_retry_delay(error: BaseException) -> float | None:
+    # 429 responses may carry a google.rpc.RetryInfo detail such as {"retryDelay": "30s"}
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict):
+        return None
+    for detail in details.get("error", {}).get("details", []) or []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                return None
+    return None
+
+
+def backoff_delay(attempt: int, error: BaseException | None = None) -> float:
+    """Exponential backoff with full jitter; honours a server-provided retry delay when present."""
+    delay = random.uniform(0, min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** attempt))
+    server_delay = _server_retry_delay(error) if error is not None else None
+    return max(delay, server_delay) if server_delay is not None else delay
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker. After `failure_threshold` consecutive transient failures it opens and
+    callers wait out `reset_timeout` seconds instead of hammering a failing API; then a single
+    probe call is let through (half-open). Success closes it, failure re-opens it with a longer
+    timeout. Probes keep being let through for as long as the API stays down; a call that has
+    itself waited on the breaker for more than `max_open_seconds` gets CircuitOpenError.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_reset_timeout: float = 300.0,
+                 max_open_seconds: float = 900.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.max_open_seconds = max_open_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def wait_time(self, model: str, waited: float = 0.0) -> float:
+        """
+        Return 0 if a call may proceed now, else how long to wait before asking again.
+        `waited` is how long this call has already waited on the breaker.
+
+        Raises:
+            CircuitOpenError: If waiting again would take this call past `max_open_seconds`.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            wait = 0.0
+            if self.state == "open":
+                wait = self.opened_at + self.reset_timeout - time.monotonic()
+                if wait <= 0:
+                    self.state = "half_open"
+            if self.state == "half_open":
+                if not self.probe_in_flight:
+                    self.probe_in_flight = True
+                    return 0.0
+                wait = min(1.0, self.reset_timeout)
+            if waited + wait > self.max_open_seconds:
+                raise CircuitOpenError(
+                    f"Circuit for {model} still open after waiting {waited:.0f}s; giving up on this call.",
+                    model=model, attempts=0, transient=True,
+                )
+            return wait
+
+    def record_success(self, model: str | None = None) -> None:
+        with self._lock:
+            if self.state != "closed":
+                log_event(logger, logging.INFO, "circuit breaker closed", model=model)
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self.probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Give up a half-open probe slot without a verdict (e.g. the call was cancelled)."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, model: str) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            now = time.monotonic()
+            if self.state == "half_open":
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            elif self.consecutive_failures < self.failure_threshold or self.state == "open":
+                return
+            self.state = "open"
+            self.opened_at = now
+            self.probe_in_flight = False
+            log_event(
+                logger, logging.WARNING, "circuit breaker open", model=model, pause_seconds=round(self.reset_timeout)
+            )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker()
+        return breaker
+
+
+def _wait_for_breaker(breaker: CircuitBreaker, model: str) -> None:
+    waited = 0.0
+    while (wait := breaker.wait_time(model, waited)) > 0:
+        time.sleep(wait)
+        waited += wait
+
+
+async def _wait_for_breaker_async(breaker: CircuitBreaker, model: str) -> None:
+    waited = 0.0
+    while (wait := breaker.wait_time(model, waited)) > 0:
+        await asyncio.sleep(wait)
+        waited += wait
+
+
+def _give_up(model: str, attempt: int, error: BaseException) -> GeminiCallError:
+    transient = is_transient_error(error)
+    reason = "after retries" if transient else "permanent error"
+    return GeminiCallError(f"Gemini call to {model} failed ({reason}): {error}", model, attempt + 1, transient)
+
+
+class _PartialStreamError(Exception):
+    """A stream failed after part of its answer was passed on; such a call is not retried."""
+
+    def __init__(self, error: BaseException):
+        super().__init__(str(error))
+        self.error = error
+
+
+def _failure_delay(breaker: CircuitBreaker, model: str, attempt: int, error: BaseException) -> float:
+    # Tells the breaker about a failed attempt and returns the backoff before the next one,
+    # or raises GeminiCallError if the call should not (or can no longer) be retried
+    partial = isinstance(error, _PartialStreamError)
+    cause = error.error if partial else error
+    if is_transient_error(cause):
+        breaker.record_failure(model)
+    else:
+        breaker.record_success(model)  # the API answered; it is the request that is bad
+    if partial or not is_transient_error(cause) or attempt == MAX_ATTEMPTS - 1:
+        raise _give_up(model, attempt, cause) from cause
+    return backoff_delay(attempt, cause)
+
+
+def _call_with_retries(model: str, reserved_tokens: int, attempt_call):
+    """
+    The retry loop shared by the synchronous calls: waits for the model's circuit breaker and
+    rate limit before each attempt, then runs `attempt_call()`, which returns (result, actual
+    tokens used or None). Transient failures are retried with backoff. Returns (result, attempts).
+    """
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker(model)
+    for attempt in range(MAX_ATTEMPTS):
+        _wait_for_breaker(breaker, model)
+        charged_tokens = limiter.acquire(model, reserved_tokens)
+        try:
+            result, actual_tokens = attempt_call()
+        except Exception as e:
+            time.sleep(_failure_delay(breaker, model, attempt, e))
+            continue
+        breaker.record_success(model)
+        limiter.settle(model, charged_tokens, actual_tokens)
+        return result, attempt + 1
+
+
+async def _call_with_retries_async(model: str, reserved_tokens: int, attempt_call):
+    """Async _call_with_retries(); `attempt_call()` returns an awaitable."""
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker(model)
+    for attempt in range(MAX_ATTEMPTS):
+        await _wait_for_breaker_async(breaker, model)
+        charged_tokens = await limiter.acquire_async(model, reserved_tokens)
+        try:
+            result, actual_tokens = await attempt_call()
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            await asyncio.sleep(_failure_delay(breaker, model, attempt, e))
+            continue
+        breaker.record_success(model)
+        limiter.settle(model, charged_tokens, actual_tokens)
+        return result, attempt + 1
+
+
+def generate_content(client, model: str, contents, config, reserved_tokens: int, stage: str | None = None):
+    """
+    Call client.models.generate_content through the shared rate limiter, retrying transient
+    failures with jittered exponential backoff behind the model's circuit breaker. The call
+    (wall time, tokens, estimated cost) is recorded in call_metrics under `stage` and the
+    current row tag.
+
+    Raises:
+        GeminiCallError: on a permanent error, or once MAX_ATTEMPTS transient failures are exhausted.
+    """
+    def attempt_call():
+        request_started = time.perf_counter()
+        response = client.models.generate_content(model=model, contents=contents, config=config)
+        return (response, time.perf_counter() - request_started), actual_request_tokens(response)
+
+    started = time.perf_counter()
+    try:
+        (response, request_seconds), attempts = _call_with_retries(model, reserved_tokens, attempt_call)
+    except GeminiCallError as e:
+        record_call(model, stage, time.perf_counter() - started, None, None, e.attempts, error=e)
+        raise
+    # Without streaming the first token arrives with the whole response
+    record_call(model, stage, time.perf_counter() - started, request_seconds, response, attempts)
+    return response
+
+
+async def generate_content_async(client, model: str, contents, config, reserved_tokens: int,
+                                 stage: str | None = None):
+    """Async variant of generate_content() built on client.aio."""
+    async def attempt_call():
+        request_started = time.perf_counter()
+        response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+        return (response, time.perf_counter() - request_started), actual_request_tokens(response)
+
+    started = time.perf_counter()
+    try:
+        (response, request_seconds), attempts = await _call_with_retries_async(model, reserved_tokens, attempt_call)
+    except GeminiCallError as e:
+        record_call(model, stage, time.perf_counter() - started, None, None, e.attempts, error=e)
+        raise
+    record_call(model, stage, time.perf_counter() - started, request_seconds, response, attempts)
+    return response
+
+
+class _StreamReader:
+    """Collects one streamed attempt: the text so far, the last chunk and time to first token."""
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.started = time.perf_counter()
+        self.first_token_seconds = None
+        self.text = ""
+        self.last_chunk = None
+
+    def add(self, chunk) -> bool:
+        """Take one chunk; True once on_text asks for the stream to be closed."""
+        self.last_chunk = chunk
+        if not chunk.text:
+            return False
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+        self.text += chunk.text
+        return bool(self.on_text(self.text))
+
+    def output_tokens(self) -> int:
+        # Usage is reported on the chunks; a stream stopped early may not have counted its last text yet
+        metadata = getattr(self.last_chunk, "usage_metadata", None)
+        reported = getattr(metadata, "candidates_token_count", None) or 0
+        return max(reported, estimate_tokens(self.text))
+
+    def total_tokens(self) -> int | None:
+        metadata = getattr(self.last_chunk, "usage_metadata", None)
+        prompt_tokens = getattr(metadata, "prompt_token_count", None)
+        return prompt_tokens + self.output_tokens() if isinstance(prompt_tokens, int) else None
+
+
+def _record_stream(model: str, stage: str | None, started: float, reader: _StreamReader, attempts: int):
+    record_call(
+        model, stage, time.perf_counter() - started, reader.first_token_seconds, reader.last_chunk, attempts,
+        output_tokens=reader.output_tokens()
+    )
+    return reader.text, reader.last_chunk
+
+
+def generate_content_stream(client, model: str, contents, config, reserved_tokens: int, on_text,
+                            stage: str | None = None):
+    """
+    Streaming counterpart of generate_content(). After each chunk, `on_text(text_so_far)` is
+    called; when it returns True the stream is closed right away, so no further output is read
+    or generated. Transient failures are retried only until the first text arrives: after that
+    the caller has already seen part of the answer, so the error is raised instead.
+
+    Returns:
+        tuple: (text, last chunk); the chunk carries the usage_metadata reported so far.
+
+    Raises:
+        GeminiCallError: on a permanent error, a failure mid-stream, or once MAX_ATTEMPTS
+            transient failures are exhausted.
+    """
+    def attempt_call():
+        reader = _StreamReader(on_text)
+        try:
+            stream = client.models.generate_content_stream(model=model, contents=contents, config=config)
+            try:
+                for chunk in stream:
+                    if reader.add(chunk):
+                        break
+            finally:
+                stream.close()
+        except Exception as e:
+            if reader.text:
+                # Part of the answer already reached on_text; a retry would hand it a second one
+                raise _PartialStreamError(e) from e
+            raise
+        return reader, reader.total_tokens()
+
+    started = time.perf_counter()
+    try:
+        reader, attempts = _call_with_retries(model, reserved_tokens, attempt_call)
+    except GeminiCallError as e:
+        record_call(model, stage, time.perf_counter() - started, None, None, e.attempts, error=e)
+        raise
+    return _record_stream(model, stage, started, reader, attempts)
+
+
+async def generate_content_stream_async(client, model: str, contents, config, reserved_tokens: int, on_text,
+                                        stage: str | None = None):
+    """Async variant of generate_content_stream() built on client.aio; `on_text` is a plain function."""
+    async def attempt_call():
+        reader = _StreamReader(on_text)
+        try:
+            async with closing_streamed_responses():
+                stream = await client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+                try:
+                    async for chunk in stream:
+                        if reader.add(chunk):
+                            break
+                finally:
+                    await stream.aclose()
+        except Exception as e:
+            if reader.text:
+                # Part of the answer already reached on_text; a retry would hand it a second one
+                raise _PartialStreamError(e) from e
+            raise
+        return reader, reader.total_tokens()
+
+    started = time.perf_counter()
+    try:
+        reader, attempts = await _call_with_retries_async(model, reserved_tokens, attempt_call)
+    except GeminiCallError as e:
+        record_call(model, stage, time.perf_counter() - started, None, None, e.attempts, error=e)
+        raise
+    return _record_stream(model, stage, started, reader, attempts)
@@ -0,0 +1,494 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from call_metrics import tag_calls
+from email_crafting import (
+    generate_cold_email, generate_cold_email_async, generate_cold_email_stream, generate_cold_email_stream_async
+)
+from excel_stream import iter_excel_rows
+from linkeding_message_crafting import generate_linkedin_connection_note, generate_linkedin_connection_note_async
+from llm_cache import ResponseCache
+from outreach_crafting import generate_outreach, generate_outreach_async, split_outreach
+from pipeline import Stage, run_stages, run_stages_async
+from posts_preprocessing import clean_linkedin_posts
+from resilient_call import GeminiCallError
+from structured_log import get_logger, log_event
+from values_check import analyze_company_support, analyze_company_support_async
+from verdict_cache import VerdictCache
+
+# Per-row processing shared by final.py (whole-sheet runs) and queue_run.py (queue workers)
+logger = get_logger("rows")
+
+INPUT_COLUMNS = ["company website", "posts"]
+
+# Reorder columns explicitly
+OUTPUT_COLUMNS = [
+    "company website",
+    "posts",
+    "supports_israel_or_haram",
+    "explanation",
+    "email_subject",        # New position for subject
+    "generated_email",      # This now holds the body
+    "email",                # Your manually updated email column
+    "linkedin_message",
+    "drafted",
+    "date_of_drafting"
+]
+
+
+@dataclass
+class RowSettings:
+    """Per-run options shared by every row."""
+    instructions_email: str = ''
+    instructions_linkedin: str = ''
+    speculative_email: bool = False
+    response_cache: ResponseCache | None = None
+    verdict_cache: VerdictCache | None = None
+    clean_posts: bool = True
+    input_token_budget: int | None = None
+    context_cache: object | None = None
+    combined_outreach: bool = False
+    stages: list | None = None
+    stream_email: bool = False
+
+    def generator_options(self, prompt_stats):
+        """Keyword arguments shared by the email and LinkedIn generators."""
+        return {
+            "cache": self.response_cache,
+            "input_token_budget": self.input_token_budget,
+            "prompt_stats": prompt_stats,
+        }
+
+    def email_options(self, prompt_stats):
+        """generator_options plus the instruction-prefix context cache, which only the email generator uses."""
+        return {**self.generator_options(prompt_stats), "context_cache": self.context_cache}
+
+    def email_generator(self):
+        """generate_cold_email, or its streaming variant that stops reading once the body is complete."""
+        return generate_cold_email_stream if self.stream_email else generate_cold_email
+
+    def email_generator_async(self):
+        return generate_cold_email_stream_async if self.stream_email else generate_cold_email_async
+
+
+def failed_row_result(index, error, stage_timings=None):
+    # Generated cells stay blank for failed rows so no error text lands in the workbook;
+    # the error is logged once, in the row's summary line
+    return {
+        "supports_israel_or_haram": None,
+        "explanation": "",
+        "email_subject": "",
+        "generated_email": "",
+        "linkedin_message": "",
+        "stage_timings": stage_timings or {},
+        "error": str(error),
+    }
+
+
+def prepare_posts(posts, settings):
+    # Strip LinkedIn page chrome once per row, before any prompt is built
+    if not settings.clean_posts:
+        return posts, None
+    return clean_linkedin_posts(posts)
+
+
+def process_row(index, company_website, posts, settings):
+    # Every Gemini call made for this row is recorded in call_metrics under its index
+    with tag_calls(row=index):
+        if settings.stages is not None:
+            return _process_row_staged(index, company_website, posts, settings)
+        return _process_row_sequential(index, company_website, posts, settings)
+
+
+def _process_row_sequential(index, company_website, posts, settings):
+    log_event(logger, logging.DEBUG, "row started", sample=True, row=index + 1, website=company_website)
+    posts, posts_tokens = prepare_posts(posts, settings)
+    stage_timings = {}
+    prompt_tokens = {}
+    row_started = time.perf_counter()
+
+    # Call analyze_company_support, returns (bool, explanation)
+    started = time.perf_counter()
+    is_true, explanation = analyze_company_support(company_website, posts, settings.verdict_cache)
+    stage_timings["screen"] = time.perf_counter() - started
+
+    email_subject = ""
+    email_body = ""
+    linkedin_message = None
+
+    if not is_true and settings.combined_outreach:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="FALSE", next="outreach")
+        started = time.perf_counter()
+        outreach = generate_outreach(
+            company_website, posts, settings.instructions_email, settings.instructions_linkedin,
+            **settings.generator_options(prompt_tokens.setdefault("outreach", {}))
+        )
+        (email_subject, email_body), linkedin_message = split_outreach(outreach)
+        stage_timings["outreach"] = time.perf_counter() - started
+    elif not is_true:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="FALSE", next="email")
+        # Call the modified generate_cold_email which returns a tuple
+        started = time.perf_counter()
+        email_subject, email_body = settings.email_generator()(
+            company_website, posts, settings.instructions_email,
+            **settings.email_options(prompt_tokens.setdefault("email", {}))
+        )
+        stage_timings["email"] = time.perf_counter() - started
+    else:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="TRUE", next="skip email")
+        # Subject and body remain empty for skipped companies
+
+    # Generate LinkedIn connection note regardless of analysis result (or you can add logic if needed)
+    if linkedin_message is None:
+        started = time.perf_counter()
+        linkedin_message = generate_linkedin_connection_note(
+            company_website, posts, settings.instructions_linkedin, return_response=True,
+            **settings.generator_options(prompt_tokens.setdefault("linkedin", {}))
+        )
+        stage_timings["linkedin"] = time.perf_counter() - started
+    stage_timings["row"] = time.perf_counter() - row_started
+
+    return {
+        "supports_israel_or_haram": is_true,
+        "explanation": explanation,
+        "email_subject": email_subject,
+        "generated_email": email_body,
+        "linkedin_message": linkedin_message,
+        "stage_timings": stage_timings,
+        "posts_tokens": posts_tokens,
+        "prompt_tokens": prompt_tokens,
+    }
+
+
+async def _timed_stage(stage, coroutine, stage_timings):
+    started = time.perf_counter()
+    try:
+        return await coroutine
+    finally:
+        stage_timings[stage] = time.perf_counter() - started
+
+
+async def _screen_then_email(index, company_website, posts, settings, stage_timings, prompt_tokens, speculation=None):
+    speculative_task = None
+    email_usage = {}
+    # A cached verdict arrives at once, so there is nothing to overlap the email with
+    if speculation is not None and (settings.verdict_cache is None or settings.verdict_cache.peek(company_website) is None):
+        # Start the email while screening is still running; most rows come back FALSE
+        speculative_started = time.perf_counter()
+        speculative_task = asyncio.create_task(
+            settings.email_generator_async()(
+                company_website, posts, settings.instructions_email, usage=email_usage,
+                **settings.email_options(prompt_tokens.setdefault("email", {}))
+            )
+        )
+        speculation["launched"] = True
+
+    try:
+        is_true, explanation = await _timed_stage(
+            "screen", analyze_company_support_async(company_website, posts, settings.verdict_cache), stage_timings
+        )
+    except BaseException:
+        if speculative_task is not None:
+            speculative_task.cancel()
+            speculative_task.add_done_callback(_retrieve_result)
+        raise
+
+    email_subject = ""
+    email_body = ""
+
+    if not is_true:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="FALSE", next="email")
+        if speculative_task is not None:
+            email_subject, email_body = await speculative_task
+            stage_timings["email"] = time.perf_counter() - speculative_started
+        else:
+            email_subject, email_body = await _timed_stage(
+                "email",
+                settings.email_generator_async()(
+                    company_website, posts, settings.instructions_email,
+                    **settings.email_options(prompt_tokens.setdefault("email", {}))
+                ),
+                stage_timings,
+            )
+    else:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="TRUE", next="skip email")
+        if speculative_task is not None:
+            _discard_speculative_email(speculative_task, email_usage, speculation)
+            prompt_tokens.pop("email", None)
+
+    return is_true, explanation, email_subject, email_body
+
+
+def _retrieve_result(task):
+    # A discarded task's failure is of no interest, but asyncio logs one that is never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+def _discard_speculative_email(task, email_usage, speculation):
+    speculation["wasted"] = True
+    task.add_done_callback(_retrieve_result)
+    if task.done():
+        # The email finished before the verdict: its reported tokens were spent for nothing
+        speculation["input_tokens"] = email_usage.get("input_tokens", 0)
+        speculation["output_tokens"] = email_usage.get("output_tokens", 0)
+    else:
+        # Still in flight: cancel it; the prompt may already be billed, so count the estimate
+        task.cancel()
+        speculation["cancelled"] = True
+        speculation["input_tokens"] = email_usage.get("estimated_input_tokens", 0)
+        speculation["output_tokens"] = 0
+
+
+async def _screen_then_outreach(index, company_website, posts, settings, stage_timings, prompt_tokens):
+    is_true, explanation = await _timed_stage(
+        "screen", analyze_company_support_async(company_website, posts, settings.verdict_cache), stage_timings
+    )
+    if is_true:
+        log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="TRUE", next="skip email")
+        linkedin_message = await _timed_stage(
+            "linkedin",
+            generate_linkedin_connection_note_async(
+                company_website, posts, settings.instructions_linkedin,
+                **settings.generator_options(prompt_tokens.setdefault("linkedin", {}))
+            ),
+            stage_timings,
+        )
+        return is_true, explanation, "", "", linkedin_message
+
+    log_event(logger, logging.DEBUG, "screened", sample=True, row=index + 1, verdict="FALSE", next="outreach")
+    outreach = await _timed_stage(
+        "outreach",
+        generate_outreach_async(
+            company_website, posts, settings.instructions_email, settings.instructions_linkedin,
+            **settings.generator_options(prompt_tokens.setdefault("outreach", {}))
+        ),
+        stage_timings,
+    )
+    (email_subject, email_body), linkedin_message = split_outreach(outreach)
+    return is_true, explanation, email_subject, email_body, linkedin_message
+
+
+async def _process_row_async(index, company_website, posts, settings):
+    log_event(logger, logging.DEBUG, "row started", sample=True, row=index + 1, website=company_website)
+    posts, posts_tokens = prepare_posts(posts, settings)
+    stage_timings = {}
+    prompt_tokens = {}
+    speculation = {"launched": False, "wasted": False, "cancelled": False, "input_tokens": 0, "output_tokens": 0} if settings.speculative_email else None
+    row_started = time.perf_counter()
+
+    if settings.combined_outreach:
+        # One call writes both the email and the note, so it has to wait for the verdict
+        try:
+            is_true, explanation, email_subject, email_body, linkedin_message = await _screen_then_outreach(
+                index, company_website, posts, settings, stage_timings, prompt_tokens
+            )
+        except GeminiCallError as e:
+            return failed_row_result(index, e, stage_timings)
+        stage_timings["row"] = time.perf_counter() - row_started
+        return {
+            "supports_israel_or_haram": is_true,
+            "explanation": explanation,
+            "email_subject": email_subject,
+            "generated_email": email_body,
+            "linkedin_message": linkedin_message,
+            "stage_timings": stage_timings,
+            "posts_tokens": posts_tokens,
+            "prompt_tokens": prompt_tokens,
+        }
+
+    # The LinkedIn note does not depend on the screening verdict, so it runs alongside
+    # the screen -> email chain and the row takes as long as the longest chain.
+    screen_chain = asyncio.create_task(
+        _screen_then_email(index, company_website, posts, settings, stage_timings, prompt_tokens, speculation)
+    )
+    linkedin_task = asyncio.create_task(_timed_stage(
+        "linkedin",
+        generate_linkedin_connection_note_async(
+            company_website, posts, settings.instructions_linkedin,
+            **settings.generator_options(prompt_tokens.setdefault("linkedin", {}))
+        ),
+        stage_timings,
+    ))
+    try:
+        (is_true, explanation, email_subject, email_body), linkedin_message = await asyncio.gather(
+            screen_chain, linkedin_task
+        )
+    except GeminiCallError as e:
+        screen_chain.cancel()
+        linkedin_task.cancel()
+        return failed_row_result(index, e, stage_timings)
+    stage_timings["row"] = time.perf_counter() - row_started
+
+    result = {
+        "supports_israel_or_haram": is_true,
+        "explanation": explanation,
+        "email_subject": email_subject,
+        "generated_email": email_body,
+        "linkedin_message": linkedin_message,
+        "stage_timings": stage_timings,
+        "posts_tokens": posts_tokens,
+        "prompt_tokens": prompt_tokens,
+    }
+    if speculation is not None:
+        result["speculation"] = speculation
+    return result
+
+
+def _screen_stage(row, settings, prompt_stats):
+    is_true, explanation = analyze_company_support(row["company website"], row["posts"], settings.verdict_cache)
+    return {"supports_israel_or_haram": is_true, "explanation": explanation}
+
+
+async def _screen_stage_async(row, settings, prompt_stats):
+    is_true, explanation = await analyze_company_support_async(row["company website"], row["posts"], settings.verdict_cache)
+    return {"supports_israel_or_haram": is_true, "explanation": explanation}
+
+
+def _email_stage(row, settings, prompt_stats):
+    email_subject, email_body = settings.email_generator()(
+        row["company website"], row["posts"], settings.instructions_email, **settings.email_options(prompt_stats)
+    )
+    return {"email_subject": email_subject, "generated_email": email_body}
+
+
+async def _email_stage_async(row, settings, prompt_stats):
+    email_subject, email_body = await settings.email_generator_async()(
+        row["company website"], row["posts"], settings.instructions_email, **settings.email_options(prompt_stats)
+    )
+    return {"email_subject": email_subject, "generated_email": email_body}
+
+
+def _linkedin_stage(row, settings, prompt_stats):
+    return {"linkedin_message": generate_linkedin_connection_note(
+        row["company website"], row["posts"], settings.instructions_linkedin, return_response=True,
+        **settings.generator_options(prompt_stats)
+    )}
+
+
+async def _linkedin_stage_async(row, settings, prompt_stats):
+    return {"linkedin_message": await generate_linkedin_connection_note_async(
+        row["company website"], row["posts"], settings.instructions_linkedin, **settings.generator_options(prompt_stats)
+    )}
+
+
+def _row_excluded(row):
+    # Rows screened TRUE get no outreach at all
+    return row["supports_israel_or_haram"] is True
+
+
+# Screen every row; only rows screened FALSE get an email and a LinkedIn note
+ROW_STAGES = [
+    Stage(
+        "screen", ("company website", "posts"), ("supports_israel_or_haram", "explanation"),
+        _screen_stage, _screen_stage_async,
+    ),
+    Stage(
+        "email", ("company website", "posts", "supports_israel_or_haram"), ("email_subject", "generated_email"),
+        _email_stage, _email_stage_async, skip_if=_row_excluded, defaults={"email_subject": "", "generated_email": ""},
+    ),
+    Stage(
+        "linkedin", ("company website", "posts", "supports_israel_or_haram"), ("linkedin_message",),
+        _linkedin_stage, _linkedin_stage_async, skip_if=_row_excluded, defaults={"linkedin_message": ""},
+    ),
+]
+
+
+def _staged_row_result(row, stage_timings, posts_tokens, prompt_tokens, skipped):
+    return {
+        "supports_israel_or_haram": row.get("supports_israel_or_haram"),
+        "explanation": row.get("explanation", ""),
+        "email_subject": row.get("email_subject", ""),
+        "generated_email": row.get("generated_email", ""),
+        "linkedin_message": row.get("linkedin_message", ""),
+        "stage_timings": stage_timings,
+        "posts_tokens": posts_tokens,
+        # Skipped stages leave an empty stats dict behind; drop it
+        "prompt_tokens": {stage: stats for stage, stats in prompt_tokens.items() if stats},
+        "skipped_stages": skipped,
+    }
+
+
+def _process_row_staged(index, company_website, posts, settings):
+    log_event(logger, logging.DEBUG, "row started", sample=True, row=index + 1, website=company_website)
+    posts, posts_tokens = prepare_posts(posts, settings)
+    row = {"company website": company_website, "posts": posts}
+    stage_timings = {}
+    prompt_tokens = {}
+    row_started = time.perf_counter()
+    skipped = run_stages(settings.stages, row, settings, stage_timings, prompt_tokens)
+    stage_timings["row"] = time.perf_counter() - row_started
+    return _staged_row_result(row, stage_timings, posts_tokens, prompt_tokens, skipped)
+
+
+async def _process_row_staged_async(index, company_website, posts, settings, pool):
+    log_event(logger, logging.DEBUG, "row started", sample=True, row=index + 1, website=company_website)
+    posts, posts_tokens = prepare_posts(posts, settings)
+    row = {"company website": company_website, "posts": posts}
+    stage_timings = {}
+    prompt_tokens = {}
+    row_started = time.perf_counter()
+    try:
+        skipped = await run_stages_async(settings.stages, row, settings, stage_timings, prompt_tokens, pool)
+    except GeminiCallError as e:
+        return failed_row_result(index, e, stage_timings)
+    stage_timings["row"] = time.perf_counter() - row_started
+    return _staged_row_result(row, stage_timings, posts_tokens, prompt_tokens, skipped)
+
+
+def log_row_summary(index, company_website, result):
+    # One compact line per row; the generated texts themselves go to the workbook, not the log
+    if result.get("error"):
+        log_event(logger, logging.WARNING, "row failed", row=index + 1, website=company_website, error=result["error"])
+        return
+    fields = {
+        "row": index + 1,
+        "website": company_website,
+        "verdict": "TRUE" if result.get("supports_israel_or_haram") else "FALSE",
+        "email": bool(result.get("generated_email")),
+        "linkedin": bool(result.get("linkedin_message")),
+    }
+    if "row" in (result.get("stage_timings") or {}):
+        fields["seconds"] = round(result["stage_timings"]["row"], 2)
+    if result.get("skipped_stages"):
+        fields["skipped"] = ",".join(result["skipped_stages"])
+    log_event(logger, logging.INFO, "row done", sample=True, **fields)
+
+
+async def run_row_async(index, company_website, posts, settings, semaphore):
+    # Each row runs in its own task, so the tag (inherited by the row's subtasks) stays with this row
+    with tag_calls(row=index):
+        if settings.stages is not None:
+            # Staged rows are not capped as a whole: each stage call takes a slot of the shared pool
+            return await _process_row_staged_async(index, company_website, posts, settings, semaphore)
+        async with semaphore:
+            return await _process_row_async(index, company_website, posts, settings)
+
+
+async def process_rows_async(rows, settings, concurrency, on_row_done=None):
+    # A semaphore caps the number of rows in flight; gather keeps results in input order
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, company_website, posts):
+        result = await run_row_async(index, company_website, posts, settings, semaphore)
+        if on_row_done is not None:
+            on_row_done(index, company_website, result)
+        return result
+
+    return await asyncio.gather(*(run(index, website, posts) for index, website, posts in rows))
+
+
+def output_row(company_website, posts, result):
+    row = {"company website": company_website, "posts": posts}
+    row.update((column, result.get(column)) for column in OUTPUT_COLUMNS if column in result)
+    return row
+
+
+def iter_input_rows(input_filename, limit_rows, row_range=None):
+    for index, values in iter_excel_rows(input_filename, INPUT_COLUMNS, limit_rows, row_range):
+        company_website, posts = (
+            "" if values[column] is None else str(values[column]).strip() for column in INPUT_COLUMNS
+        )
+        yield index, company_website, posts
@@ -0,0 +1,65 @@
+import json
+import os
+
+
+class RunJournal:
+    """
+    Append-only JSON Lines journal of completed rows.
+
+    Each finished row is written as one line and fsync'ed before the next row is recorded,
+    so a crash, Ctrl-C or quota wall loses at most the rows that were still in flight.
+    On resume only each row's website and the position of its line are kept in memory;
+    completed_result() reads the result back from the file when the row comes up.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resuming = resume
+        self._completed = self._load() if resume else {}
+        # Without resume the previous run's journal is discarded
+        self._file = open(path, "ab" if resume else "wb")
+        if resume and self._file.tell() > 0:
+            # Terminate a possibly torn last line so new entries start on their own line
+            self._file.write(b"\n")
+        self._reader = None
+
+    def _load(self) -> dict:
+        # row -> (company website, byte offset of the row's latest line)
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, "rb") as journal_file:
+            offset = 0
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; that row is simply redone
+                    entry = None
+                if entry is not None:
+                    completed[entry["row"]] = (entry["company website"], offset)
+                offset += len(line)
+        return completed
+
+    def completed_result(self, index: int, company_website: str):
+        """Return the journaled result for a row, or None if it must be (re)processed."""
+        completed = self._completed.get(index)
+        if completed is None or completed[0] != company_website:
+            return None
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(completed[1])
+        return json.loads(self._reader.readline())["result"]
+
+    def record(self, index: int, company_website: str, result: dict) -> None:
+        entry = {"row": index, "company website": company_website, "result": result}
+        offset = self._file.tell()
+        self._file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._completed[index] = (company_website, offset)
+
+    def close(self) -> None:
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
@@ -0,0 +1,149 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+from call_metrics import CallRecord, get_metrics_registry
+from excel_stream import StreamingExcelWriter, count_excel_rows, iter_excel_rows
+from final import process_excel_filter_and_generate_emails
+from row_engine import OUTPUT_COLUMNS
+from llm_cache import ResponseCache
+from rate_limiter import set_rate_limit_share
+from structured_log import ensure_logging, get_logger, log_event
+from verdict_cache import VerdictCache
+
+logger = get_logger("sharded_run")
+
+
+def shard_ranges(total_rows: int, shards: int) -> list[tuple[int, int]]:
+    """Split rows 0..total_rows into at most `shards` contiguous (start, stop) ranges of near-equal size."""
+    shards = max(1, min(shards, total_rows))
+    size, extra = divmod(total_rows, shards)
+    ranges = []
+    start = 0
+    for shard in range(shards):
+        stop = start + size + (1 if shard < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def shard_output_filename(output_filename: str, shard: int, shards: int) -> str:
+    base, _ = os.path.splitext(output_filename)
+    return f"{base}.shard{shard + 1}of{shards}.xlsx"
+
+
+def shard_filename(filename: str, shard: int, shards: int) -> str:
+    """`filename` with the shard inserted before its extension, e.g. run.jsonl -> run.shard1of4.jsonl."""
+    base, extension = os.path.splitext(filename)
+    return f"{base}.shard{shard + 1}of{shards}{extension}"
+
+
+def _shard_options(options: dict, shard: int, shards: int) -> dict:
+    # Per-run files named in the options would otherwise be written by every shard under one name
+    shard_options = dict(options)
+    for name in ("journal_filename", "metrics_filename"):
+        if shard_options.get(name):
+            shard_options[name] = shard_filename(shard_options[name], shard, shards)
+    # Several shard files would repeat the same Prometheus series; only the merged file is written
+    shard_options["prometheus_filename"] = None
+    return shard_options
+
+
+def _run_shard(input_filename, shard_output, row_range, shards, options, response_cache_path, verdict_cache_path):
+    # Runs in a worker process: its own clients, its own limiter holding 1/shards of each quota
+    set_rate_limit_share(1 / shards)
+    response_cache = ResponseCache(response_cache_path) if response_cache_path else None
+    verdict_cache = VerdictCache(verdict_cache_path) if verdict_cache_path else None
+    try:
+        row_results = process_excel_filter_and_generate_emails(
+            input_filename, shard_output, row_range=row_range,
+            response_cache=response_cache, verdict_cache=verdict_cache, **options
+        )
+    finally:
+        if response_cache is not None:
+            response_cache.close()
+        if verdict_cache is not None:
+            verdict_cache.close()
+    return {
+        "rows": len(row_results),
+        "failed": sum(1 for result in row_results if result.get("error")),
+        # The worker's call records, merged into the parent's metrics
+        "calls": [asdict(call) for call in get_metrics_registry().calls],
+    }
+
+
+def merge_shard_outputs(shard_outputs: list[str], output_filename: str) -> int:
+    """Concatenate shard workbooks, in the order given, into one output workbook. Returns rows written."""
+    with StreamingExcelWriter(output_filename, OUTPUT_COLUMNS) as writer:
+        for shard_output in shard_outputs:
+            for _, row in iter_excel_rows(shard_output, OUTPUT_COLUMNS):
+                writer.append(row)
+        return writer.rows_written
+
+
+def process_excel_sharded(
+    input_filename='apollo_data.xlsx',
+    output_filename='apollo_filtered_emails_output.xlsx',
+    shards=4,                 # worker processes, each handling one contiguous range of rows
+    limit_rows=-1,            # limit row for testing, put -1 for full data
+    response_cache_path=None, # opened separately in each worker (SQLite WAL allows concurrent writers)
+    verdict_cache_path=None,
+    metrics_filename=None,    # call metrics of all shards merged; each shard also writes its own, suffixed .shardNofM
+    prometheus_filename=None, # the merged call metrics in Prometheus text format
+    **options                 # any other process_excel_filter_and_generate_emails option; must be picklable
+):
+    """
+    Split the input sheet into `shards` row ranges and process them in a process pool,
+    so prompt building, preprocessing and Excel serialization use several cores. Each
+    worker gets 1/shards of every model's rate limit. Shard outputs are merged into
+    `output_filename` in the original row order and then deleted; per-shard journals
+    (journal_filename suffixed .shardNofM, if given) are kept, so resume=True with the same
+    number of shards picks every shard up where it stopped. The workers' call metrics are
+    merged the same way into `metrics_filename` and `prometheus_filename`.
+
+    Returns:
+        list[dict]: Per-shard {"rows", "failed"} counts, in shard order.
+    """
+    ensure_logging()
+    total_rows = count_excel_rows(input_filename)
+    if limit_rows != -1:
+        total_rows = min(total_rows, limit_rows)
+    ranges = shard_ranges(total_rows, shards)
+    shard_outputs = [shard_output_filename(output_filename, shard, len(ranges)) for shard in range(len(ranges))]
+    log_event(logger, logging.INFO, "sharded run started", rows=total_rows, shards=len(ranges))
+
+    # spawn: workers start clean instead of inheriting the parent's HTTP clients and locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                _run_shard, input_filename, shard_output, row_range, len(ranges),
+                _shard_options(dict(options, metrics_filename=metrics_filename), shard, len(ranges)),
+                response_cache_path, verdict_cache_path
+            )
+            for shard, (shard_output, row_range) in enumerate(zip(shard_outputs, ranges))
+        ]
+        shard_summaries = [future.result() for future in futures]
+
+    rows_written = merge_shard_outputs(shard_outputs, output_filename)
+    for shard_output in shard_outputs:
+        os.remove(shard_output)
+    metrics = get_metrics_registry()
+    metrics.reset()
+    for summary in shard_summaries:
+        for call in summary.pop("calls"):
+            metrics.record(CallRecord(**call))
+    if metrics_filename:
+        metrics.write_summary(
+            metrics_filename, input_filename=input_filename, output_filename=output_filename, shards=len(ranges)
+        )
+    if prometheus_filename:
+        metrics.write_prometheus(prometheus_filename)
+    failed = sum(summary["failed"] for summary in shard_summaries)
+    log_event(
+        logger, logging.INFO, "shards merged", rows=rows_written, shards=len(ranges), failed=failed,
+        filename=output_filename
+    )
+    return shard_summaries
@@ -0,0 +1,120 @@
+import json
+import logging
+import sys
+import zlib
+
+# Every module logs under this namespace, so one configure_logging() call controls them all
+LOGGER_NAME = "outreach"
+
+_settings = {"log_outputs": False}
+_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one module, e.g. get_logger("final") -> "outreach.final"."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, message: str, sample: bool = False, **fields) -> None:
+    """
+    Log `message` with structured key/value `fields`. Records with sample=True below
+    WARNING are subject to the configured sample rate (kept or dropped per row, so a
+    sampled row keeps all of its lines).
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields, "sample": sample})
+
+
+def log_output(logger: logging.Logger, label: str, text: str, error: bool = False, **fields) -> None:
+    """
+    Log a full model output: at ERROR when it is the reason something failed, otherwise
+    only if configure_logging(log_outputs=True) asked for outputs.
+    """
+    if error:
+        log_event(logger, logging.ERROR, label, output=text, **fields)
+    elif _settings["log_outputs"]:
+        log_event(logger, logging.INFO, label, output=text, **fields)
+
+
+class SampleFilter(logging.Filter):
+    """Keep `rate` of the sampled records (DEBUG/INFO with sample=True); everything else passes."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        # Deterministic per row: the same rows are kept on every run and across processes
+        key = getattr(record, "fields", {}).get("row", record.getMessage())
+        return zlib.crc32(str(key).encode("utf-8")) % 10_000 < self.rate * 10_000
+
+
+def _field_value(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return json.dumps(text, ensure_ascii=False) if not text or any(c in text for c in ' ="\n\t') else text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`2025-06-01 12:00:00 INFO  final: row done row=3 verdict=FALSE seconds=1.2` (logfmt-style fields)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (
+            f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<5} "
+            f"{record.name.removeprefix(LOGGER_NAME + '.')}: {record.getMessage()}"
+        )
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={_field_value(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg and the record's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **(getattr(record, "fields", None) or {}),
+        }
+        if record.exc_info:
+            document["exc"] = self.formatException(record.exc_info)
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+
+def configure_logging(level="INFO", json_format: bool = False, sample_rate: float = 1.0, log_outputs: bool = False,
+                      filename: str | None = None) -> None:
+    """
+    Set up the "outreach" loggers. Calling it again replaces the previous configuration.
+
+    Args:
+        level (str | int): Minimum level; "DEBUG" adds the per-stage progress lines of each row.
+        json_format (bool): JSON lines instead of key=value text.
+        sample_rate (float): Fraction of rows whose per-row lines are kept (warnings and errors always are).
+        log_outputs (bool): Also log full model outputs (search answers, notes) at INFO.
+        filename (str | None): Append to this file instead of writing to stderr.
+    """
+    global _handler
+    logger = logging.getLogger(LOGGER_NAME)
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.close()
+    _handler = logging.FileHandler(filename, encoding="utf-8") if filename else logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter() if json_format else KeyValueFormatter())
+    _handler.addFilter(SampleFilter(sample_rate))
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    _settings["log_outputs"] = log_outputs
+
+
+def ensure_logging() -> None:
+    """Install the default configuration unless the application configured logging already."""
+    if _handler is None and not logging.getLogger(LOGGER_NAME).handlers:
+        configure_logging()
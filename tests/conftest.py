@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import gemini_client
+import resilient_call
+from fake_gemini import FakeGeminiClient, LatencyModel
+
+# The modules live at the repository root, not in an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def gemini_chunk(text: str, final: bool = False) -> dict:
+    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+    if final:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+        chunk["usageMetadata"] = {"promptTokenCount": 50, "candidatesTokenCount": 20, "totalTokenCount": 70}
+    return chunk
+
+
+class LocalGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Keep-alive stand-in for the Gemini REST API. generateContent answers with
+    `server.answer`; streamGenerateContent sends `server.stream_parts` as SSE chunks, then
+    `server.trailing_part` after `server.trailing_delay` seconds.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if ":streamGenerateContent" not in self.path:
+            body = json.dumps(gemini_chunk(self.server.answer, final=True)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for part in self.server.stream_parts:
+                self._write_event(gemini_chunk(part))
+            time.sleep(self.server.trailing_delay)
+            self._write_event(gemini_chunk(self.server.trailing_part, final=True))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_event(self, chunk: dict) -> None:
+        data = f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_gemini_server(monkeypatch):
+    """A LocalGeminiHandler server; GOOGLE_GEMINI_BASE_URL and GEMINI_API_KEY point clients at it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalGeminiHandler)
+    server.daemon_threads = True
+    server.answer = "FALSE. No ties found."
+    server.stream_parts = []
+    server.trailing_part = ""
+    server.trailing_delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GOOGLE_GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def local_gemini_client(local_gemini_server, monkeypatch):
+    """A client for local_gemini_server installed for every caller; calls are tried once."""
+    monkeypatch.setattr(resilient_call, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+    previous = gemini_client.set_client(gemini_client.create_client(api_key="test-key"))
+    yield local_gemini_server
+    gemini_client.set_client(previous)
+
+
+@pytest.fixture
+def fake_client():
+    """A zero-latency FakeGeminiClient installed for every caller, removed afterwards."""
+    client = FakeGeminiClient(latency=LatencyModel(distribution="constant", median=0.0))
+    previous = gemini_client.set_client(client)
+    yield client
+    gemini_client.set_client(previous)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from google.genai.types import GenerateContentConfig
+
+from batch_jobs import BatchJobError, LocalBatchBackend, read_batch_results, run_batch_job, write_batch_requests
+
+MODEL = "gemini-2.0-flash"
+
+
+class StateBackend:
+    """Reports the scripted job states in order and records what was asked of it."""
+
+    def __init__(self, *states):
+        self.states = list(states)
+        self.submitted = 0
+
+    def submit(self, model, requests_path, display_name):
+        self.submitted += 1
+        return "batches/scripted"
+
+    def state(self, job_name):
+        return self.states.pop(0)
+
+    def download_results(self, job_name, results_path):
+        with open(results_path, "w", encoding="utf-8") as results_file:
+            results_file.write(json.dumps({"key": "0:email", "response": {"candidates": [
+                {"content": {"parts": [{"text": "thinking...", "thought": True}, {"text": " Hello "}]}}
+            ]}}) + "\n")
+
+
+def test_local_batch_round_trip(fake_client, tmp_path):
+    requests_path, results_path = str(tmp_path / "requests.jsonl"), str(tmp_path / "results.jsonl")
+    config = GenerateContentConfig(temperature=0.7, max_output_tokens=200, tools=[])
+    count = write_batch_requests(requests_path, [("0:linkedin", "Write a note", config), ("1:linkedin", "Another", config)])
+    submitted = []
+
+    results = run_batch_job(
+        LocalBatchBackend(fake_client, polls_until_done=2), MODEL, requests_path, results_path, "test",
+        poll_seconds=0, on_submitted=submitted.append,
+    )
+
+    assert count == 2
+    with open(requests_path, encoding="utf-8") as requests_file:
+        first = json.loads(requests_file.readline())
+    assert first["request"]["generation_config"] == {"temperature": 0.7, "max_output_tokens": 200}
+    assert submitted == ["batches/local-1"]
+    assert set(results) == {"0:linkedin", "1:linkedin"}
+    assert all(results.values())
+
+
+def test_failed_requests_map_to_none(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(
+        json.dumps({"key": "0:email", "error": {"message": "blocked"}}) + "\n\n"
+        + json.dumps({"key": "1:email", "response": {"candidates": []}}) + "\n",
+        encoding="utf-8",
+    )
+    assert read_batch_results(str(path)) == {"0:email": None, "1:email": ""}
+
+
+def test_attaching_to_a_job_skips_submission_and_drops_thoughts(tmp_path):
+    backend = StateBackend("JOB_STATE_PENDING", "JOB_STATE_SUCCEEDED")
+    results = run_batch_job(
+        backend, MODEL, "unused", str(tmp_path / "results.jsonl"), "test", job_name="batches/earlier", poll_seconds=0
+    )
+    assert backend.submitted == 0
+    assert results == {"0:email": "Hello"}
+
+
+def test_failed_job_raises(tmp_path):
+    with pytest.raises(BatchJobError) as raised:
+        run_batch_job(StateBackend("JOB_STATE_EXPIRED"), MODEL, "unused", str(tmp_path / "r.jsonl"), "test", poll_seconds=0)
+    assert raised.value.state == "JOB_STATE_EXPIRED"
+
+
+def test_job_that_never_finishes_times_out(tmp_path):
+    backend = StateBackend(*["JOB_STATE_RUNNING"] * 5)
+    with pytest.raises(BatchJobError, match="still JOB_STATE_RUNNING"):
+        run_batch_job(backend, MODEL, "unused", str(tmp_path / "r.jsonl"), "test", poll_seconds=0.01, timeout_seconds=0.02)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from call_metrics import estimate_cost, get_metrics_registry, record_call, tag_calls
+
+MODEL = "gemini-2.0-flash"
+
+
+@pytest.fixture
+def registry():
+    metrics = get_metrics_registry()
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+
+def _response(input_tokens, output_tokens, cached_tokens=0):
+    return SimpleNamespace(usage_metadata=SimpleNamespace(
+        prompt_token_count=input_tokens, candidates_token_count=output_tokens, thoughts_token_count=None,
+        cached_content_token_count=cached_tokens,
+    ))
+
+
+def test_cost_bills_cached_input_at_a_discount():
+    assert estimate_cost(MODEL, 1_000_000, 0) == pytest.approx(0.10)
+    assert estimate_cost(MODEL, 1_000_000, 1_000_000, cached_tokens=1_000_000) == pytest.approx(0.025 + 0.40)
+    assert estimate_cost("unknown-model", 10, 10) is None
+
+
+def test_calls_carry_the_row_tag_also_inside_tasks(registry):
+    async def call_in_task():
+        record_call(MODEL, "email", 0.1, 0.05, _response(10, 5), attempts=1)
+
+    async def run():
+        with tag_calls(row=3):
+            await asyncio.create_task(call_in_task())
+
+    with tag_calls(row=1):
+        record_call(MODEL, "screening", 0.2, None, _response(20, 2), attempts=2)
+    asyncio.run(run())
+    record_call(MODEL, "email", 0.3, None, None, attempts=3, error=RuntimeError("quota"))
+
+    assert [(call.row, call.status) for call in registry.calls] == [(1, "ok"), (3, "ok"), (None, "error")]
+
+
+def test_summary_totals_and_breakdowns(registry):
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        with tag_calls(row=0):
+            record_call(MODEL, "email", seconds, seconds / 2, _response(100, 50), attempts=1)
+    record_call(MODEL, "screening", 1.0, None, None, attempts=3, error=RuntimeError("quota"))
+
+    summary = registry.summary()
+
+    assert summary["totals"]["calls"] == 5
+    assert summary["totals"]["errors"] == 1
+    assert summary["totals"]["input_tokens"] == 400
+    email = summary["by_model_stage"][f"{MODEL}/email"]
+    assert email["wall_p50"] == 0.3 and email["wall_max"] == 0.4
+    assert email["ttft_mean"] == pytest.approx(0.125)
+    assert summary["by_model_stage"][f"{MODEL}/screening"]["ttft_p50"] is None
+    assert summary["by_row"]["0"]["calls"] == 4 and summary["by_row"]["-"]["errors"] == 1
+
+
+def test_prometheus_histograms_are_cumulative_and_labels_escaped(registry, tmp_path):
+    record_call(MODEL, 'odd "stage"', 0.2, None, _response(10, 5), attempts=2)
+    record_call(MODEL, 'odd "stage"', 3.0, None, _response(10, 5), attempts=1)
+    path = str(tmp_path / "gemini.prom")
+
+    registry.write_prometheus(path)
+
+    with open(path, encoding="utf-8") as metrics_file:
+        text = metrics_file.read()
+    labels = f'model="{MODEL}",stage="odd \\"stage\\""'
+    assert f'gemini_call_duration_seconds_bucket{{{labels},le="0.25"}} 1' in text
+    assert f'gemini_call_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"gemini_call_retries_total{{{labels}}} 1" in text
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_summary_file_includes_run_info_and_calls(registry, tmp_path):
+    record_call(MODEL, "email", 0.1, None, _response(10, 5), attempts=1)
+    path = tmp_path / "metrics.json"
+
+    registry.write_summary(str(path), include_calls=True, input_filename="in.xlsx")
+
+    document = json.loads(path.read_text(encoding="utf-8"))
+    assert document["input_filename"] == "in.xlsx"
+    assert document["calls"][0]["stage"] == "email"
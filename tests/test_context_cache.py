@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai.types import GenerateContentConfig
+
+import context_cache
+from context_cache import GeminiContextCache, LocalContextCache, _ContextCacheBase
+from email_crafting import generate_cold_email_async
+
+MODEL = "gemini-2.0-flash"
+INSTRUCTIONS = "Write a short, friendly cold email. " * 20
+
+
+class StubCaches:
+    """client.caches stand-in: create() blocks for `delay` seconds, like the API call."""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.created = []
+        self.deleted = []
+        self.threads = set()
+
+    def create(self, model, config):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.created.append(config.system_instruction)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+def _gemini_cache(**caches_options):
+    return GeminiContextCache(SimpleNamespace(caches=StubCaches(**caches_options)))
+
+
+def _config():
+    return GenerateContentConfig(max_output_tokens=100, tools=[])
+
+
+def test_base_class_needs_a_cache_name_implementation():
+    with pytest.raises(TypeError):
+        _ContextCacheBase()
+
+
+def test_registered_block_is_sent_by_reference():
+    cache = LocalContextCache()
+    contents, config = cache.prepare(MODEL, INSTRUCTIONS, "Row prompt", _config())
+    cache.prepare(MODEL, INSTRUCTIONS, "Another row", _config())
+
+    assert contents == "Row prompt"
+    assert config.cached_content.startswith("cachedContents/local-")
+    assert config.tools is None
+    assert cache.resolve(config.cached_content) == INSTRUCTIONS
+    assert (cache.registrations, cache.calls) == (1, 2)
+    assert cache.cached_input_tokens > 0
+
+
+def test_failed_registration_is_remembered_and_sent_inline():
+    cache = _gemini_cache(error=RuntimeError("content too small to cache"))
+    for _ in range(3):
+        contents, config = cache.prepare(MODEL, INSTRUCTIONS, "Row prompt", _config())
+    assert contents == f"{INSTRUCTIONS}\n\nRow prompt"
+    assert config.cached_content is None
+    assert cache.calls == 0
+    assert len(cache.client.caches.threads) == 1
+
+
+def test_block_is_registered_again_before_its_ttl_runs_out(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(context_cache.time, "monotonic", lambda: now[0])
+    cache = _gemini_cache()
+    cache.prepare(MODEL, INSTRUCTIONS, "Row prompt", _config())
+    now[0] = 3000.0
+    cache.prepare(MODEL, INSTRUCTIONS, "Row prompt", _config())
+    now[0] = 3400.0
+    _, config = cache.prepare(MODEL, INSTRUCTIONS, "Row prompt", _config())
+
+    assert len(cache.client.caches.created) == 2
+    assert config.cached_content == "cachedContents/2"
+    cache.delete_all()
+    assert cache.client.caches.deleted == ["cachedContents/2"]
+
+
+def test_async_rows_register_once_without_blocking_the_event_loop():
+    cache = _gemini_cache(delay=0.3)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        tick_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(
+            cache.prepare_async(MODEL, INSTRUCTIONS, f"Row {index}", _config()) for index in range(20)
+        ))
+        tick_task.cancel()
+        return results
+
+    results = asyncio.run(run())
+
+    assert [contents for contents, _ in results] == [f"Row {index}" for index in range(20)]
+    assert len(cache.client.caches.created) == 1
+    assert threading.get_ident() not in cache.client.caches.threads
+    assert cache.calls == 20
+    # The loop kept running while the registration call blocked its worker thread
+    assert len(ticks) >= 5
+
+
+def test_async_emails_use_the_context_cache(fake_client):
+    cache = LocalContextCache()
+
+    async def run():
+        return await asyncio.gather(*(
+            generate_cold_email_async(f"https://company{index}.com", "", INSTRUCTIONS, context_cache=cache)
+            for index in range(5)
+        ))
+
+    emails = asyncio.run(run())
+
+    assert all(subject and body for subject, body in emails)
+    assert (cache.registrations, cache.calls) == (1, 5)
@@ -0,0 +1,133 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai.types import FinishReason
+
+import gemini_client
+import resilient_call
+from email_crafting import (
+    REPAIR_MAX_OUTPUT_TOKENS, generate_cold_email, generate_cold_email_async, generate_cold_email_stream, generate_cold_email_stream_async,
+)
+from llm_cache import ResponseCache
+
+
+class ScriptedEmailClient:
+    """
+    Answers each call, plain or streamed, with the next scripted text, or (text, finish reason);
+    streams send it in one chunk.
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+        self.configs = []
+        self.models = self
+        self.aio = SimpleNamespace(models=SimpleNamespace(
+            generate_content=self._generate_async, generate_content_stream=self._stream_async
+        ))
+
+    def generate_content(self, *, model, contents, config=None):
+        self.prompts.append(contents)
+        self.configs.append(config)
+        answer = self.answers.pop(0)
+        text, finish_reason = answer if isinstance(answer, tuple) else (answer, FinishReason.STOP)
+        return SimpleNamespace(
+            text=text, usage_metadata=None, candidates=[SimpleNamespace(finish_reason=finish_reason)]
+        )
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        response = self.generate_content(model=model, contents=contents, config=config)
+        return (chunk for chunk in [response])
+
+    async def _generate_async(self, *, model, contents, config=None):
+        return self.generate_content(model=model, contents=contents, config=config)
+
+    async def _stream_async(self, *, model, contents, config=None):
+        chunks = self.generate_content_stream(model=model, contents=contents, config=config)
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        return stream()
+
+
+def _sync(generate):
+    return generate
+
+
+def _async(generate):
+    return lambda *args, **kwargs: asyncio.run(generate(*args, **kwargs))
+
+
+GENERATORS = [
+    pytest.param(_sync(generate_cold_email), id="sync"),
+    pytest.param(_async(generate_cold_email_async), id="async"),
+    pytest.param(_sync(generate_cold_email_stream), id="stream"),
+    pytest.param(_async(generate_cold_email_stream_async), id="stream_async"),
+]
+
+
+@pytest.fixture
+def scripted_client(monkeypatch):
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+
+    installed = []
+
+    def install(*answers):
+        client = ScriptedEmailClient(*answers)
+        installed.append(gemini_client.set_client(client))
+        return client
+
+    yield install
+    for previous in reversed(installed):
+        gemini_client.set_client(previous)
+
+
+@pytest.mark.parametrize("generate", GENERATORS)
+def test_generators_repair_a_missing_body_and_cache_the_whole_email(generate, scripted_client, tmp_path):
+    client = scripted_client('{"subject": "Quick question", "body": ', '{"body": "Hello there"}')
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    prompt_stats = {}
+    try:
+        first = generate("https://example.com", "posts", "instructions", cache=cache, prompt_stats=prompt_stats)
+        second = generate("https://example.com", "posts", "instructions", cache=cache)
+    finally:
+        cache.close()
+
+    assert first == second == ("Quick question", "Hello there")
+    assert len(client.prompts) == 2
+    assert prompt_stats["repaired_part"] == "body"
+    assert prompt_stats["repaired"] is True
+
+
+@pytest.mark.parametrize("generate", GENERATORS)
+def test_generators_keep_the_subject_when_the_repair_has_no_body(generate, scripted_client):
+    client = scripted_client('{"subject": "Quick question"', '{}')
+    assert generate("https://example.com", "posts", "instructions") == ("Quick question", "")
+    assert len(client.prompts) == 2
+
+
+def test_body_repair_sends_a_compact_prompt(scripted_client):
+    client = scripted_client('{"subject": "Quick question"', '{"body": "Hello there"}')
+    posts = "\n\n".join(f"Post {i}: " + "shipping faster every week " * 20 for i in range(40))
+    instructions = "Mention our onboarding service. " * 200
+
+    generate_cold_email("https://example.com", posts, instructions)
+
+    repair_prompt = client.prompts[1]
+    assert "Quick question" in repair_prompt and "https://example.com" in repair_prompt
+    assert "onboarding service" not in repair_prompt
+    assert len(repair_prompt) < len(client.prompts[0]) / 10
+    assert client.configs[1].max_output_tokens == REPAIR_MAX_OUTPUT_TOKENS["body"]
+
+
+@pytest.mark.parametrize("generate", GENERATORS)
+def test_no_repair_after_hitting_the_output_limit(generate, scripted_client):
+    client = scripted_client(('{"subject": "Quick question", "body": "Hello the', FinishReason.MAX_TOKENS))
+    prompt_stats = {}
+
+    assert generate("https://example.com", "posts", "instructions", prompt_stats=prompt_stats) == ("Quick question", "")
+    assert len(client.prompts) == 1
+    assert "repair_attempts" not in prompt_stats
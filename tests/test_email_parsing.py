@@ -0,0 +1,49 @@
+import json
+import logging
+
+from email_crafting import _email_stream_watcher, _parse_email_parts, _parse_email_response
+
+
+def test_structured_answer():
+    answer = json.dumps({"subject": " Quick idea ", "body": "Hi Dana,\n\nShort note."})
+    assert _parse_email_parts(answer) == {"subject": "Quick idea", "body": "Hi Dana,\n\nShort note."}
+
+
+def test_truncated_answer_keeps_only_complete_fields():
+    assert _parse_email_parts('{"subject": "Quick idea", "body": "Hi Dana, we') == {"subject": "Quick idea"}
+
+
+def test_salvaged_field_with_raw_control_character():
+    assert _parse_email_parts('{"subject": "Hi\nthere", "body": "Dear') == {"subject": "Hi\nthere"}
+
+
+def test_salvaged_field_that_does_not_decode_is_missing():
+    assert _parse_email_parts('{"subject": "Bad \\q escape", "body": "Hi') == {}
+
+
+def test_delimited_answer_from_older_cache_entries():
+    answer = "---SUBJECT_START---\nQuick idea\n---SUBJECT_END---\n---BODY_START---\nHi Dana\n---BODY_END---"
+    assert _parse_email_parts(answer) == {"subject": "Quick idea", "body": "Hi Dana"}
+
+
+def test_unparseable_answer_becomes_the_body():
+    assert _parse_email_response("just some text") == ("Subject Parsing Failed", "just some text")
+
+
+def test_unparseable_answer_is_logged_as_an_error_with_the_output(caplog):
+    with caplog.at_level(logging.INFO, logger="outreach.email"):
+        _parse_email_response("just some text")
+    [record] = [record for record in caplog.records if record.name == "outreach.email"]
+    assert record.levelno == logging.ERROR
+    assert record.fields["output"] == "just some text"
+
+
+def test_stream_watcher_reports_subject_once_and_stops_after_body():
+    subjects = []
+    on_text, _ = _email_stream_watcher(subjects.append)
+
+    assert not on_text('{"subject": "Quick')
+    assert not on_text('{"subject": "Quick idea", "body": "Hi')
+    assert on_text('{"subject": "Quick idea", "body": "Hi Dana"')
+    assert on_text('{"subject": "Quick idea", "body": "Hi Dana"}')
+    assert subjects == ["Quick idea"]
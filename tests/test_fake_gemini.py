@@ -0,0 +1,92 @@
+import asyncio
+import json
+import random
+
+import pytest
+from google.genai import errors
+from google.genai.types import GenerateContentConfig
+
+import gemini_client
+from email_crafting import EMAIL_SCHEMA
+from fake_gemini import FakeGeminiClient, LatencyModel, install_fake_client
+
+MODEL = "gemini-2.0-flash"
+INSTANT = LatencyModel(distribution="constant", median=0.0)
+SCREENING_PROMPT = 'Does {company} have ties? Start with "TRUE" or "FALSE".'
+
+
+def _client(**options):
+    return FakeGeminiClient(latency=INSTANT, **options)
+
+
+def test_answers_are_reproducible_for_the_same_seed():
+    prompts = ["Write a note for https://a.com", "Write a note for https://b.com"]
+    first, second = _client(seed=7), _client(seed=7)
+    assert [first.models.generate_content(model=MODEL, contents=p).text for p in prompts] == [
+        second.models.generate_content(model=MODEL, contents=p).text for p in prompts
+    ]
+
+
+@pytest.mark.parametrize("true_ratio, verdict", [(0.0, "FALSE"), (1.0, "TRUE")])
+def test_screening_prompts_get_verdicts(true_ratio, verdict):
+    client = _client(true_ratio=true_ratio)
+    for company in ("a.com", "b.com", "c.com"):
+        answer = client.models.generate_content(model=MODEL, contents=SCREENING_PROMPT.format(company=company)).text
+        assert answer.startswith(verdict)
+
+
+@pytest.mark.parametrize("config", [
+    GenerateContentConfig(response_mime_type="application/json", response_schema=EMAIL_SCHEMA),
+    {"response_mime_type": "application/json", "response_schema": {"properties": {"subject": {}, "body": {}}}},
+], ids=["config", "batch-dict"])
+def test_structured_calls_get_exactly_the_schema_fields(config):
+    response = _client().models.generate_content(model=MODEL, contents="Write an email", config=config)
+    assert set(json.loads(response.text)) == {"subject", "body"}
+    assert response.usage_metadata.candidates_token_count > 0
+
+
+def test_error_rates_raise_api_errors_and_are_counted():
+    client = _client(error_rates={429: 1.0})
+    with pytest.raises(errors.ClientError) as raised:
+        client.models.generate_content(model=MODEL, contents="Write a note")
+    assert raised.value.code == 429
+    assert client.errors == {429: 1}
+
+
+def test_stream_chunks_add_up_and_only_read_chunks_are_counted():
+    client = _client(body_words=200)
+    full = "".join(chunk.text for chunk in client.models.generate_content_stream(model=MODEL, contents="Write a note"))
+    counted_full = client.output_tokens
+
+    stream = client.models.generate_content_stream(model=MODEL, contents="Write another note")
+    next(stream)
+    stream.close()
+
+    assert len(full) > 40
+    assert 0 < client.output_tokens - counted_full < counted_full
+
+
+def test_async_models_answer_like_the_sync_ones():
+    async def run():
+        return await _client().aio.models.generate_content(model=MODEL, contents="Write a note")
+
+    assert asyncio.run(run()).text == _client().models.generate_content(model=MODEL, contents="Write a note").text
+
+
+def test_latency_is_clipped_and_unknown_distributions_rejected():
+    rng = random.Random(0)
+    assert all(
+        0.5 <= LatencyModel(distribution="lognormal", median=1.0, sigma=3.0, low=0.5, high=2.0).sample(rng) <= 2.0
+        for _ in range(100)
+    )
+    with pytest.raises(ValueError):
+        LatencyModel(distribution="pareto").sample(rng)
+
+
+def test_install_fake_client_makes_it_the_shared_client():
+    previous = gemini_client.set_client(None)
+    try:
+        client = install_fake_client(latency=INSTANT)
+        assert gemini_client.get_client() is client
+    finally:
+        gemini_client.set_client(previous)
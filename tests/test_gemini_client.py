@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+
+import gemini_client
+import resilient_call
+from values_check import analyze_company_support_async
+
+
+@pytest.fixture
+def default_client(local_gemini_server, monkeypatch):
+    # The lazily created clients, not an installed one
+    monkeypatch.setattr(gemini_client, "_client", None)
+    monkeypatch.setattr(resilient_call, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+    return local_gemini_server
+
+
+def test_shared_client_works_across_event_loops(default_client):
+    for _ in range(2):
+        assert asyncio.run(analyze_company_support_async("https://example.com", "")) == (False, "FALSE. No ties found.")
+
+
+def test_sync_calls_share_one_client(default_client):
+    assert gemini_client.get_client() is gemini_client.get_client()
+
+
+def test_missing_api_key_is_reported_on_first_use(default_client, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY")
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        gemini_client.get_client()
+
+
+def test_each_event_loop_gets_its_own_client(default_client):
+    async def client_twice():
+        return gemini_client.get_client(), gemini_client.get_client()
+
+    first_a, first_b = asyncio.run(client_twice())
+    second, _ = asyncio.run(client_twice())
+    assert first_a is first_b
+    assert second is not first_a
+    assert gemini_client.get_client() not in (first_a, second)
+
+
+def test_installed_client_is_used_everywhere_until_removed(default_client):
+    installed = object()
+    previous = gemini_client.set_client(installed)
+    try:
+        assert gemini_client.get_client() is installed
+        assert asyncio.run(asyncio.to_thread(gemini_client.get_client)) is installed
+    finally:
+        assert gemini_client.set_client(previous) is installed
+    assert gemini_client.get_client() is not installed
+
+
+def test_requests_get_bounded_connect_and_pool_waits():
+    request = httpx.Request("POST", "https://example.com")
+    request.extensions["timeout"] = {"connect": None, "read": None, "write": None, "pool": 5.0}
+
+    gemini_client._bound_waits(request)
+
+    assert request.extensions["timeout"] == {
+        "connect": gemini_client.CONNECT_TIMEOUT_SECONDS, "read": None, "write": None, "pool": 5.0,
+    }
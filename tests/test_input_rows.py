@@ -0,0 +1,37 @@
+from openpyxl import Workbook
+
+from excel_stream import iter_excel_rows
+from final import process_excel_filter_and_generate_emails
+from row_engine import INPUT_COLUMNS
+
+
+def _write_input(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(INPUT_COLUMNS)
+    for i in range(8):
+        # Every other row has no posts
+        sheet.append([f" https://site{i}.com ", f"Post {i}" if i % 2 else None])
+    workbook.save(path)
+
+
+def _input_side(output_filename):
+    return [
+        (row["company website"], row["posts"] or "")
+        for _, row in iter_excel_rows(output_filename, INPUT_COLUMNS)
+    ]
+
+
+def test_streaming_and_in_memory_modes_read_the_same_rows(fake_client, tmp_path):
+    input_filename = str(tmp_path / "input.xlsx")
+    _write_input(input_filename)
+    outputs = {}
+    for streaming in (False, True):
+        outputs[streaming] = str(tmp_path / f"output-{streaming}.xlsx")
+        process_excel_filter_and_generate_emails(
+            input_filename, outputs[streaming], limit_rows=5, row_range=(2, 8), streaming=streaming
+        )
+
+    # limit_rows counts from the top of the sheet: rows 2, 3 and 4; blank posts stay blank
+    expected = [("https://site2.com", ""), ("https://site3.com", "Post 3"), ("https://site4.com", "")]
+    assert _input_side(outputs[False]) == _input_side(outputs[True]) == expected
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import llm_cache
+from email_crafting import generate_cold_email
+from linkeding_message_crafting import generate_linkedin_connection_note
+from llm_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    response_cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=3600, max_entries=10)
+    yield response_cache
+    response_cache.close()
+
+
+def _entries(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.set("key", "model", "answer")
+    clock.now += 3599
+    assert cache.get("key") == "answer"
+    clock.now += 2
+    assert cache.get("key") is None
+    assert _entries(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_purge_expired_removes_only_old_entries(cache, clock):
+    cache.set("old", "model", "answer")
+    clock.now += 3000
+    cache.set("new", "model", "answer")
+    clock.now += 1000
+    assert cache.purge_expired() == 1
+    assert cache.get("new") == "answer"
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for index in range(10):
+        cache.set(f"key{index}", "model", "answer")
+        clock.now += llm_cache.ACCESS_REFRESH_SECONDS + 1
+    # A hit makes key0 the most recently used entry
+    assert cache.get("key0") == "answer"
+    clock.now += 1
+    cache.set("key10", "model", "answer")
+
+    # Trimmed to 90% of max_entries: the two oldest untouched entries go
+    assert _entries(cache) == 9
+    assert cache.get("key0") == "answer"
+    assert cache.get("key1") is None and cache.get("key2") is None
+    assert cache.get("key3") == "answer"
+
+
+def test_unparsed_email_answers_are_not_cached(local_gemini_client, cache):
+    local_gemini_client.answer = "Sorry, I cannot help with that."
+    assert generate_cold_email("https://example.com", "", "Write a short email.", cache=cache) == (
+        "Subject Parsing Failed", "Sorry, I cannot help with that."
+    )
+    assert _entries(cache) == 0
+
+    local_gemini_client.answer = json.dumps({"subject": "Quick idea", "body": "Hi there."})
+    assert generate_cold_email("https://example.com", "", "Write a short email.", cache=cache) == ("Quick idea", "Hi there.")
+    assert _entries(cache) == 1
+
+
+def test_empty_linkedin_notes_are_not_cached(local_gemini_client, cache):
+    local_gemini_client.answer = ""
+    assert generate_linkedin_connection_note("https://example.com", "", "Be brief.", return_response=True, cache=cache) == ""
+    assert _entries(cache) == 0
+
+    local_gemini_client.answer = "Hi, would love to connect."
+    generate_linkedin_connection_note("https://example.com", "", "Be brief.", return_response=True, cache=cache)
+    local_gemini_client.answer = "A different note."
+    assert generate_linkedin_connection_note(
+        "https://example.com", "", "Be brief.", return_response=True, cache=cache
+    ) == "Hi, would love to connect."
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import gemini_client
+import resilient_call
+from llm_cache import ResponseCache
+from outreach_crafting import generate_outreach, generate_outreach_async, split_outreach
+
+OUTREACH = {"subject": "Quick question", "body": "Hello there", "linkedin_note": "Would love to connect"}
+
+
+class ScriptedClient:
+    """Answers each generate_content call, sync or async, with the next scripted text."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.models = self
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_async))
+
+    def generate_content(self, *, model, contents, config=None):
+        self.calls += 1
+        return SimpleNamespace(text=self.answers.pop(0), usage_metadata=None)
+
+    async def _generate_async(self, *, model, contents, config=None):
+        return self.generate_content(model=model, contents=contents, config=config)
+
+
+@pytest.fixture
+def scripted_client(monkeypatch):
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+    installed = []
+
+    def install(*answers):
+        client = ScriptedClient(*answers)
+        installed.append(gemini_client.set_client(client))
+        return client
+
+    yield install
+    for previous in reversed(installed):
+        gemini_client.set_client(previous)
+
+
+GENERATORS = [
+    pytest.param(generate_outreach, id="sync"),
+    pytest.param(lambda *args, **kwargs: asyncio.run(generate_outreach_async(*args, **kwargs)), id="async"),
+]
+
+
+@pytest.mark.parametrize("generate", GENERATORS)
+def test_one_call_produces_email_and_note_and_is_cached(generate, scripted_client, tmp_path):
+    client = scripted_client(json.dumps(OUTREACH))
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        first = generate("https://example.com", "posts", "email instructions", "note instructions", cache=cache)
+        second = generate("https://example.com", "posts", "email instructions", "note instructions", cache=cache)
+    finally:
+        cache.close()
+
+    assert first == second == {**OUTREACH, "fallback": False}
+    assert client.calls == 1
+
+
+@pytest.mark.parametrize("generate", GENERATORS)
+def test_truncated_answer_falls_back_to_separate_calls(generate, scripted_client):
+    client = scripted_client(
+        '{"subject": "Quick question", "body": "Hel',
+        '{"subject": "Separate subject", "body": "Separate body"}',
+        "Separate note",
+    )
+
+    outreach = generate("https://example.com", "posts", "email instructions", "note instructions")
+
+    assert outreach == {
+        "subject": "Separate subject", "body": "Separate body", "linkedin_note": "Separate note", "fallback": True
+    }
+    assert client.calls == 3
+
+
+def test_split_outreach_matches_the_separate_generators():
+    assert split_outreach({**OUTREACH, "fallback": False}) == (("Quick question", "Hello there"), "Would love to connect")
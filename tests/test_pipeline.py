@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from pipeline import Stage, order_stages, run_stages, run_stages_async
+
+
+def _stage(name, inputs, outputs, skip_if=None, defaults=None, calls=None):
+    def run(row, settings, prompt_stats):
+        if calls is not None:
+            calls.append(name)
+        return {output: f"{name}:{output}" for output in outputs}
+
+    async def run_async(row, settings, prompt_stats):
+        return run(row, settings, prompt_stats)
+
+    return Stage(name, tuple(inputs), tuple(outputs), run, run_async, skip_if, defaults or {})
+
+
+def test_stages_are_ordered_by_their_inputs():
+    email = _stage("email", ["verdict"], ["subject"])
+    screen = _stage("screen", ["website"], ["verdict"])
+    note = _stage("note", ["website"], ["note"])
+    assert [stage.name for stage in order_stages([email, screen, note], {"website"})] == ["screen", "note", "email"]
+
+
+def test_missing_input_or_cycle_is_rejected():
+    with pytest.raises(ValueError, match="never be satisfied"):
+        order_stages([_stage("a", ["b_out"], ["a_out"]), _stage("b", ["a_out"], ["b_out"])], {"website"})
+
+
+def test_field_produced_twice_is_rejected():
+    with pytest.raises(ValueError, match="more than one stage"):
+        order_stages([_stage("a", [], ["x"]), _stage("b", [], ["x"])], set())
+
+
+def test_skipped_stage_fills_its_defaults_without_running():
+    calls = []
+    stages = order_stages([
+        _stage("screen", ["website"], ["verdict"], calls=calls),
+        _stage("email", ["verdict"], ["subject"], skip_if=lambda row: True, defaults={"subject": ""}, calls=calls),
+    ], {"website"})
+    row = {"website": "https://a.com"}
+
+    assert run_stages(stages, row, None, {}, {}) == ["email"]
+    assert calls == ["screen"]
+    assert row == {"website": "https://a.com", "verdict": "screen:verdict", "subject": ""}
+
+
+def test_async_run_matches_the_sync_run():
+    stages = order_stages([
+        _stage("screen", ["website"], ["verdict"]),
+        _stage("email", ["verdict"], ["subject"], skip_if=lambda row: row["verdict"] == "skip"),
+        _stage("note", ["website"], ["note"]),
+    ], {"website"})
+    sync_row, async_row = {"website": "https://a.com"}, {"website": "https://a.com"}
+
+    run_stages(stages, sync_row, None, {}, {})
+    skipped = asyncio.run(run_stages_async(stages, async_row, None, {}, {}, asyncio.Semaphore(2)))
+    assert skipped == []
+    assert async_row == sync_row
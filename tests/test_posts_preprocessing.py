@@ -0,0 +1,35 @@
+from posts_preprocessing import clean_linkedin_posts
+
+POST = "We just shipped our new onboarding flow and cut setup time in half for every customer."
+
+
+def test_page_chrome_is_removed_and_post_text_kept():
+    posts = "\n".join([
+        "0 notifications total", "Skip to main content", "Home", "My Network",
+        "Yalla PlusYalla Plus", "1,234 followers", "1mo •  1 month ago • Visible to anyone on or off LinkedIn",
+        POST, "Like", "Comment", "Repost", "Send", "12", "3 comments",
+    ])
+
+    cleaned, stats = clean_linkedin_posts(posts)
+
+    assert cleaned == f"Yalla Plus\n1mo\n{POST}"
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+
+
+def test_repeated_post_is_dropped_but_short_recurring_lines_stay():
+    posts = f"Feed post number 1\nYalla Plus\n1w\n\n{POST}\n\nFeed post number 2\nYalla Plus\n1w\n\n{POST}"
+
+    cleaned, _ = clean_linkedin_posts(posts)
+
+    assert cleaned.count(POST) == 1
+    assert cleaned.count("Yalla Plus") == 2
+
+
+def test_feed_marker_without_content_is_dropped():
+    cleaned, _ = clean_linkedin_posts(f"Feed post number 1\n{POST}\n\nFeed post number 2\nLike\nComment")
+    assert cleaned == f"Feed post number 1\n\n{POST}"
+
+
+def test_consecutive_duplicate_lines_collapse():
+    cleaned, _ = clean_linkedin_posts("Hiring now\nHiring now\nJoin us")
+    assert cleaned == "Hiring now\nJoin us"
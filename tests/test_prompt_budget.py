@@ -0,0 +1,77 @@
+from fake_gemini import FakeGeminiClient, LatencyModel
+from prompt_budget import (
+    build_budgeted_prompt, estimate_request_tokens, estimate_tokens, fit_posts_to_budget, split_posts
+)
+
+
+def _feed(*posts):
+    return "Dana Doe\nCEO at Example\n" + "".join(
+        f"Feed post number {number}\n{text}\n\n" for number, text in enumerate(posts, start=1)
+    )
+
+
+def test_non_latin_words_cost_more_tokens_per_character():
+    assert estimate_tokens("partnership") == 3
+    assert estimate_tokens("الاستثمارية") == 6
+    assert estimate_tokens("Hi, there!") == 5
+
+
+def test_request_estimate_is_the_prompt_estimate_plus_the_output_allowance():
+    prompt = "Write a short cold email for https://example.com, please."
+    assert estimate_request_tokens(prompt) == estimate_tokens(prompt)
+    assert estimate_request_tokens(prompt, 1000) == estimate_tokens(prompt) + 1000
+
+
+def test_fake_client_bills_with_the_same_estimator():
+    client = FakeGeminiClient(latency=LatencyModel(distribution="constant", median=0.0))
+    prompt = "Write a LinkedIn note for https://example.com."
+    response = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
+    assert response.usage_metadata.prompt_token_count == estimate_tokens(prompt)
+    assert response.usage_metadata.candidates_token_count == estimate_tokens(response.text)
+
+
+def test_split_posts_separates_header_and_feed_posts():
+    header, blocks = split_posts(_feed("First post.", "Second post."))
+    assert header == "Dana Doe\nCEO at Example\n"
+    assert [block.splitlines()[1] for block in blocks] == ["First post.", "Second post."]
+
+
+def test_posts_within_budget_are_untouched():
+    posts = _feed("Short post.")
+    assert fit_posts_to_budget(posts, 1000) == (posts, {
+        "posts_tokens": estimate_tokens(posts), "fitted_posts_tokens": estimate_tokens(posts), "posts_dropped": 0
+    })
+
+
+def test_reposts_are_dropped_before_own_posts_and_oldest_first():
+    own = "We closed our seed round and are hiring engineers across the region this year."
+    repost = "Dana Doe reposted this\n" + own
+    posts = _feed(own, repost, own, repost)
+    # Room for everything except about two posts
+    budget = estimate_tokens(posts) - 2 * estimate_tokens(f"Feed post number 4\n{repost}\n\n") + 5
+
+    fitted, stats = fit_posts_to_budget(posts, budget)
+
+    assert stats["posts_dropped"] == 2
+    assert "reposted this" not in fitted
+    assert fitted.count(own) == 2
+    assert stats["fitted_posts_tokens"] <= budget
+
+
+def test_newest_post_is_cut_at_a_word_boundary_when_nothing_else_fits():
+    posts = _feed(" ".join(["growth"] * 200))
+    fitted, stats = fit_posts_to_budget(posts, 40)
+    assert fitted.endswith("growth …")
+    assert stats["fitted_posts_tokens"] <= 41
+
+
+def test_budgeted_prompt_stays_within_the_budget():
+    posts = _feed(*(f"Post {number} about our new warehouse and delivery fleet." for number in range(30)))
+
+    def build(fitted_posts):
+        return f"Company Website:\nhttps://example.com\n\nLinkedIn Posts:\n{fitted_posts}\n\nWrite a short email."
+
+    prompt, stats = build_budgeted_prompt(build, posts, 120)
+    assert stats["input_tokens"] == estimate_tokens(prompt) <= 120
+    assert stats["posts_dropped"] > 0
+    assert build_budgeted_prompt(build, posts, None)[1]["posts_dropped"] == 0
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter
+
+MODEL = "test-model"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def limiter():
+    # 60 requests and 6000 tokens per minute: one request and 100 tokens refill per second
+    return RateLimiter({MODEL: {"rpm": 60, "tpm": 6000}})
+
+
+def _token_balance(limiter):
+    return limiter._buckets[MODEL][1].balance
+
+
+def test_requests_within_quota_do_not_wait(limiter, clock):
+    for _ in range(3):
+        assert limiter.acquire(MODEL, 1000) == 1000
+    assert clock.sleeps == []
+    assert _token_balance(limiter) == 3000
+
+
+def test_caller_over_quota_waits_for_the_refill(limiter, clock):
+    limiter.acquire(MODEL, 6000)
+    limiter.acquire(MODEL, 500)
+    assert clock.sleeps == [pytest.approx(5.0)]
+
+
+def test_async_callers_queue_in_arrival_order(limiter, clock, monkeypatch):
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire_async(MODEL, 3000)
+
+    asyncio.run(run())
+    assert waits == [pytest.approx(30.0)]
+    assert limiter._reserve(MODEL, 3000)[0] == pytest.approx(60.0)
+
+
+def test_settle_refunds_over_estimates_and_charges_under_estimates(limiter, clock):
+    charged = limiter.acquire(MODEL, 1000)
+    limiter.settle(MODEL, charged, 400)
+    assert _token_balance(limiter) == 5600
+
+    charged = limiter.acquire(MODEL, 1000)
+    limiter.settle(MODEL, charged, 1500)
+    assert _token_balance(limiter) == 4100
+
+
+def test_oversized_request_refunds_at_most_what_it_was_charged(limiter, clock):
+    limiter.acquire(MODEL, 4000)
+    # Larger than the whole bucket: only its capacity is deducted
+    assert limiter.acquire(MODEL, 50_000) == 6000
+    assert _token_balance(limiter) == -4000
+
+    clock.now += 1.0
+    limiter.settle(MODEL, 6000, 100)
+    # 100 tokens refilled plus the 5900 over-estimate, not the 49,900 the caller asked for
+    assert _token_balance(limiter) == -4000 + 100 + 5900
+
+
+def test_share_scales_every_quota(limiter, clock):
+    limiter.set_share(0.5)
+    assert limiter.acquire(MODEL, 50_000) == 3000
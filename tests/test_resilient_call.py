@@ -0,0 +1,249 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from google.genai import errors
+
+import resilient_call
+from resilient_call import (
+    CircuitBreaker, CircuitOpenError, GeminiCallError, backoff_delay, generate_content, is_transient_error,
+)
+
+MODEL = "gemini-2.0-flash"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(resilient_call.time, "monotonic", fake_clock)
+    return fake_clock
+
+
+def _api_error(code, details=None):
+    return errors.APIError(code, {"error": {"code": code, "message": "test", "status": "TEST", "details": details or []}})
+
+
+def test_breaker_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure(MODEL)
+    assert breaker.wait_time(MODEL) == 0
+
+    breaker.record_failure(MODEL)
+    assert breaker.state == "open"
+    assert breaker.wait_time(MODEL) == pytest.approx(30)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure(MODEL)
+    breaker.record_success(MODEL)
+    breaker.record_failure(MODEL)
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through_and_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure(MODEL)
+    clock.now += 31
+
+    assert breaker.wait_time(MODEL) == 0
+    assert breaker.state == "half_open"
+    # A second caller waits for the probe's verdict
+    assert breaker.wait_time(MODEL) > 0
+
+    breaker.record_success(MODEL)
+    assert breaker.state == "closed"
+    assert breaker.wait_time(MODEL) == 0
+
+
+def test_failed_probe_reopens_with_a_longer_capped_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, max_reset_timeout=50)
+    breaker.record_failure(MODEL)
+    for expected in (60, 50):
+        clock.now += breaker.reset_timeout + 1
+        assert breaker.wait_time(MODEL) == 0
+        breaker.record_failure(MODEL)
+        assert breaker.state == "open"
+        assert breaker.reset_timeout == min(expected, 50)
+
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure(MODEL)
+    clock.now += 31
+    assert breaker.wait_time(MODEL) == 0
+    breaker.release_probe()
+    assert breaker.wait_time(MODEL) == 0
+
+
+def test_call_gives_up_after_waiting_max_open_seconds(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, max_open_seconds=100)
+    breaker.record_failure(MODEL)
+    assert breaker.wait_time(MODEL, waited=60) == pytest.approx(30)
+    with pytest.raises(CircuitOpenError):
+        breaker.wait_time(MODEL, waited=80)
+
+
+def test_breaker_still_recovers_after_max_open_seconds(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, max_reset_timeout=30, max_open_seconds=100)
+    breaker.record_failure(MODEL)
+    # The API stays down well past max_open_seconds; every probe fails
+    for _ in range(5):
+        clock.now += 31
+        assert breaker.wait_time(MODEL) == 0
+        breaker.record_failure(MODEL)
+    clock.now += 31
+
+    # A fresh call still gets a probe through, and its success closes the breaker
+    assert breaker.wait_time(MODEL) == 0
+    breaker.record_success(MODEL)
+    assert breaker.state == "closed"
+    assert breaker.wait_time(MODEL) == 0
+
+
+@pytest.mark.parametrize("error", [
+    _api_error(429), _api_error(500), _api_error(503), _api_error(408),
+    httpx.ReadTimeout("timed out"), httpx.ConnectError("refused"), httpx.PoolTimeout("pool"),
+    asyncio.TimeoutError(), ConnectionResetError(),
+])
+def test_transient_errors(error):
+    assert is_transient_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    _api_error(400), _api_error(403), _api_error(404), ValueError("bad"), RuntimeError("Event loop is closed"),
+])
+def test_permanent_errors(error):
+    assert not is_transient_error(error)
+
+
+def test_backoff_honours_server_retry_delay():
+    error = _api_error(429, [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "42s"}])
+    assert backoff_delay(0, error) == 42
+    assert 0 <= backoff_delay(3) <= resilient_call.BASE_DELAY_SECONDS * 2 ** 3
+
+
+class ScriptedClient:
+    """Raises or returns the scripted outcomes in order, one per generate_content call."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.models = self
+
+    def generate_content(self, *, model, contents, config=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+    monkeypatch.setattr(resilient_call, "backoff_delay", lambda attempt, error=None: 0.0)
+
+
+def test_transient_failure_is_retried(fresh_breakers):
+    response = SimpleNamespace(text="ok", usage_metadata=None)
+    client = ScriptedClient(_api_error(503), response)
+    assert generate_content(client, MODEL, "prompt", None, reserved_tokens=10) is response
+    assert client.calls == 2
+
+
+def test_permanent_failure_is_not_retried(fresh_breakers):
+    client = ScriptedClient(_api_error(400))
+    with pytest.raises(GeminiCallError) as raised:
+        generate_content(client, MODEL, "prompt", None, reserved_tokens=10)
+    assert client.calls == 1
+    assert not raised.value.transient
+
+
+def test_retries_stop_after_max_attempts(fresh_breakers, monkeypatch):
+    monkeypatch.setattr(resilient_call, "MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(resilient_call, "get_circuit_breaker", lambda model: CircuitBreaker(failure_threshold=10))
+    client = ScriptedClient(*[_api_error(500)] * 3)
+    with pytest.raises(GeminiCallError) as raised:
+        generate_content(client, MODEL, "prompt", None, reserved_tokens=10)
+    assert client.calls == 3
+    assert raised.value.attempts == 3
+    assert raised.value.transient
+
+
+def _chunk(text):
+    return SimpleNamespace(text=text, usage_metadata=None)
+
+
+class ScriptedStreamClient:
+    """generate_content_stream yields the scripted chunks of each call in order; an exception in the script is raised."""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+        self.closed = 0
+        self.models = self
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content_stream=self._stream_async))
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        self.calls += 1
+        script = self.scripts.pop(0)
+
+        def stream():
+            try:
+                for item in script:
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+            finally:
+                self.closed += 1
+
+        return stream()
+
+    async def _stream_async(self, *, model, contents, config=None):
+        chunks = self.generate_content_stream(model=model, contents=contents, config=config)
+
+        async def stream():
+            try:
+                for chunk in chunks:
+                    yield chunk
+            finally:
+                chunks.close()
+
+        return stream()
+
+
+def test_stream_failing_before_any_text_is_retried(fresh_breakers):
+    client = ScriptedStreamClient([_api_error(503)], [_chunk("Hello"), _chunk(" there")])
+    text, last_chunk = resilient_call.generate_content_stream(
+        client, MODEL, "prompt", None, reserved_tokens=10, on_text=lambda text: False
+    )
+    assert (text, last_chunk.text) == ("Hello there", " there")
+    assert client.calls == 2
+
+
+def test_stream_failing_after_text_is_not_retried(fresh_breakers):
+    client = ScriptedStreamClient([_chunk("Hello"), _api_error(503)], [_chunk("Hello there")])
+    with pytest.raises(GeminiCallError) as raised:
+        resilient_call.generate_content_stream(client, MODEL, "prompt", None, reserved_tokens=10, on_text=lambda text: False)
+    assert client.calls == 1
+    assert raised.value.transient
+
+
+def test_async_stream_stops_once_on_text_says_so(fresh_breakers):
+    client = ScriptedStreamClient([_chunk("one "), _chunk("two "), _chunk("three")])
+    text, _ = asyncio.run(resilient_call.generate_content_stream_async(
+        client, MODEL, "prompt", None, reserved_tokens=10, on_text=lambda text: "two" in text
+    ))
+    assert text == "one two "
+    assert client.closed == 1
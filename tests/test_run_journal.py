@@ -0,0 +1,71 @@
+from run_journal import RunJournal
+
+
+def test_resume_returns_journaled_rows(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = RunJournal(path)
+    journal.record(0, "https://a.com", {"verdict": "FALSE"})
+    journal.record(2, "https://c.com", {"verdict": "TRUE"})
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_result(0, "https://a.com") == {"verdict": "FALSE"}
+    assert resumed.completed_result(1, "https://b.com") is None
+    assert resumed.completed_result(2, "https://c.com") == {"verdict": "TRUE"}
+    resumed.close()
+
+
+def test_row_whose_website_changed_is_redone(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = RunJournal(path)
+    journal.record(0, "https://a.com", {"verdict": "FALSE"})
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_result(0, "https://other.com") is None
+    resumed.close()
+
+
+def test_torn_last_line_is_skipped_and_new_entries_start_on_their_own_line(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = RunJournal(path)
+    journal.record(0, "https://a.com", {"verdict": "FALSE"})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"row": 1, "company website": "https://b.co')
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_result(1, "https://b.com") is None
+    resumed.record(1, "https://b.com", {"verdict": "TRUE"})
+    resumed.close()
+
+    again = RunJournal(path, resume=True)
+    assert again.completed_result(0, "https://a.com") == {"verdict": "FALSE"}
+    assert again.completed_result(1, "https://b.com") == {"verdict": "TRUE"}
+    again.close()
+
+
+def test_without_resume_the_previous_journal_is_discarded(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = RunJournal(path)
+    journal.record(0, "https://a.com", {"verdict": "FALSE"})
+    journal.close()
+
+    RunJournal(path).close()
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_result(0, "https://a.com") is None
+    resumed.close()
+
+
+def test_latest_entry_wins_and_rows_recorded_after_resume_are_readable(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = RunJournal(path)
+    journal.record(0, "https://a.com", {"verdict": "FALSE"})
+    journal.record(0, "https://a.com", {"verdict": "TRUE"})
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    resumed.record(1, "https://b.com", {"verdict": "FALSE", "note": "ünïcode"})
+    assert resumed.completed_result(0, "https://a.com") == {"verdict": "TRUE"}
+    assert resumed.completed_result(1, "https://b.com") == {"verdict": "FALSE", "note": "ünïcode"}
+    resumed.close()
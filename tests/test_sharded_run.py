@@ -0,0 +1,75 @@
+import json
+import re
+import zipfile
+
+from openpyxl import Workbook
+
+from excel_stream import count_excel_rows, iter_excel_rows
+from row_engine import INPUT_COLUMNS
+from sharded_run import _shard_options, process_excel_sharded, shard_filename, shard_ranges
+
+
+def _write_input(path, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(INPUT_COLUMNS)
+    for website, posts in rows:
+        sheet.append([website, posts])
+    workbook.save(path)
+
+
+def _stale_dimension_copy(source, target):
+    # Rewrite the sheet's dimension tag to "A1", as some writers leave it
+    with zipfile.ZipFile(source) as original, zipfile.ZipFile(target, "w") as copy:
+        for item in original.infolist():
+            data = original.read(item.filename)
+            if item.filename.startswith("xl/worksheets/"):
+                data = re.sub(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1"/>', data)
+            copy.writestr(item, data)
+
+
+def test_rows_are_counted_and_read_despite_a_stale_dimension_tag(tmp_path):
+    _write_input(tmp_path / "input.xlsx", [(f"https://site{i}.com", "") for i in range(5)])
+    _stale_dimension_copy(tmp_path / "input.xlsx", tmp_path / "stale.xlsx")
+
+    assert count_excel_rows(str(tmp_path / "stale.xlsx")) == 5
+    assert [index for index, _ in iter_excel_rows(str(tmp_path / "stale.xlsx"), INPUT_COLUMNS)] == [0, 1, 2, 3, 4]
+
+
+def test_shard_ranges_cover_every_row_once():
+    assert shard_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert shard_ranges(2, 4) == [(0, 1), (1, 2)]
+
+
+def test_per_run_files_get_a_shard_suffix():
+    options = {"journal_filename": "run.journal.jsonl", "metrics_filename": "metrics.json",
+               "prometheus_filename": "gemini.prom", "limit_rows": 5}
+
+    assert shard_filename("metrics.json", 1, 4) == "metrics.shard2of4.json"
+    assert _shard_options(options, 0, 2) == {
+        "journal_filename": "run.journal.shard1of2.jsonl", "metrics_filename": "metrics.shard1of2.json",
+        "prometheus_filename": None, "limit_rows": 5,
+    }
+
+
+def test_sharded_run_merges_outputs_and_metrics(local_gemini_server, tmp_path):
+    input_filename = str(tmp_path / "input.xlsx")
+    _write_input(input_filename, [(f"https://site{i}.com", "") for i in range(4)])
+    output_filename = str(tmp_path / "output.xlsx")
+    metrics_filename = str(tmp_path / "metrics.json")
+
+    summaries = process_excel_sharded(
+        input_filename, output_filename, shards=2, journal_filename=str(tmp_path / "run.jsonl"),
+        metrics_filename=metrics_filename, prometheus_filename=str(tmp_path / "gemini.prom"),
+    )
+
+    assert [summary["rows"] for summary in summaries] == [2, 2]
+    assert [index for index, _ in iter_excel_rows(output_filename, INPUT_COLUMNS)] == [0, 1, 2, 3]
+    assert (tmp_path / "run.shard1of2.jsonl").exists() and (tmp_path / "run.shard2of2.jsonl").exists()
+    shard_calls = [
+        json.loads((tmp_path / f"metrics.shard{shard}of2.json").read_text())["totals"]["calls"] for shard in (1, 2)
+    ]
+    merged = json.loads((tmp_path / "metrics.json").read_text())
+    assert merged["totals"]["calls"] == sum(shard_calls) > 0
+    assert merged["shards"] == 2
+    assert "gemini_calls_total" in (tmp_path / "gemini.prom").read_text()
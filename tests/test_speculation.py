@@ -0,0 +1,65 @@
+import asyncio
+import gc
+
+import pytest
+
+import row_engine
+from fake_gemini import LatencyModel
+from row_engine import RowSettings, _process_row_async
+from resilient_call import GeminiCallError
+from verdict_cache import VerdictCache
+
+
+@pytest.fixture
+def verdict_cache(tmp_path):
+    cache = VerdictCache(str(tmp_path / "verdicts.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def _run_row(website, settings):
+    return asyncio.run(_process_row_async(0, website, "", settings))
+
+
+def test_no_speculative_email_for_cached_true_verdict(fake_client, verdict_cache):
+    verdict_cache.set("cached.com", True, "TRUE. Cached verdict.")
+    result = _run_row("https://www.cached.com/", RowSettings(speculative_email=True, verdict_cache=verdict_cache))
+
+    assert result["supports_israel_or_haram"] is True
+    assert result["generated_email"] == ""
+    assert not result["speculation"]["launched"]
+    assert not result["speculation"]["wasted"]
+    assert verdict_cache.hits == 1
+
+
+def test_speculative_email_on_verdict_cache_miss(fake_client, verdict_cache):
+    result = _run_row("https://www.uncached.com/", RowSettings(speculative_email=True, verdict_cache=verdict_cache))
+
+    assert result["speculation"]["launched"]
+    assert verdict_cache.misses == 1
+
+
+def test_failed_speculative_email_for_true_verdict_is_retrieved(fake_client, monkeypatch):
+    # Screening takes a moment and says TRUE, so the speculative email fails first and is discarded
+    fake_client.latency = LatencyModel(distribution="constant", median=0.05)
+    fake_client.true_ratio = 1.0
+
+    async def failing_email(*args, **kwargs):
+        raise GeminiCallError("quota exhausted")
+
+    monkeypatch.setattr(row_engine, "generate_cold_email_async", failing_email)
+    unhandled = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        result = await _process_row_async(0, "https://failing.com", "", RowSettings(speculative_email=True))
+        # Let the discarded task's callbacks run, then drop it
+        await asyncio.sleep(0)
+        gc.collect()
+        return result
+
+    result = asyncio.run(run())
+
+    assert result["supports_israel_or_haram"] is True
+    assert result["speculation"]["wasted"]
+    assert unhandled == []
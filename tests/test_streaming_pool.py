@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+import gemini_client
+import resilient_call
+from email_crafting import generate_cold_email_stream_async
+
+TRAILING_DELAY_SECONDS = 0.3
+
+
+@pytest.fixture
+def small_pool(local_gemini_server, monkeypatch):
+    # An answer that goes on after the email body is complete, so every call is stopped early
+    local_gemini_server.stream_parts = ['{"subject": "Quick idea", ', '"body": "Hi there, short note."']
+    local_gemini_server.trailing_part = "}"
+    local_gemini_server.trailing_delay = TRAILING_DELAY_SECONDS
+    monkeypatch.setattr(gemini_client, "MAX_CONNECTIONS", 3)
+    monkeypatch.setattr(gemini_client, "MAX_KEEPALIVE_CONNECTIONS", 3)
+    monkeypatch.setattr(gemini_client, "POOL_TIMEOUT_SECONDS", 2.0)
+    # A pool timeout must fail the call, not be retried for minutes
+    monkeypatch.setattr(resilient_call, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(resilient_call, "_breakers", {})
+    previous = gemini_client.set_client(gemini_client.create_client(api_key="test-key"))
+    yield
+    gemini_client.set_client(previous)
+
+
+def test_async_email_streams_stopped_early_return_their_connections(small_pool):
+    async def run():
+        results = []
+        for _ in range(6):
+            # Two at a time, as final.py runs rows; 12 calls need the pool of 3 four times over
+            results.extend(await asyncio.gather(*(
+                generate_cold_email_stream_async("https://example.com", "", "Write a short email.")
+                for _ in range(2)
+            )))
+        return results
+
+    started = time.perf_counter()
+    results = asyncio.run(asyncio.wait_for(run(), timeout=30))
+    assert results == [("Quick idea", "Hi there, short note.")] * 12
+    # Stopped at the body, before the trailing chunk
+    assert time.perf_counter() - started < 12 * TRAILING_DELAY_SECONDS
@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+
+import queue_run
+from work_queue import WorkQueue
+
+CAMPAIGN = "test-campaign"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=60)
+    yield work_queue
+    work_queue.close()
+
+
+def _lease_expires(queue, row_index):
+    return queue._conn.execute(
+        "SELECT lease_expires FROM queue_rows WHERE campaign = ? AND row_index = ?", (CAMPAIGN, row_index)
+    ).fetchone()[0]
+
+
+def _rows(count):
+    return [(index, f"https://company{index}.com", f"posts {index}") for index in range(count)]
+
+
+def _expire_leases(queue):
+    queue._conn.execute("UPDATE queue_rows SET lease_expires = 0 WHERE status = 'leased'")
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue(CAMPAIGN, _rows(3)) == 3
+    assert queue.enqueue(CAMPAIGN, _rows(4)) == 1
+    assert queue.counts(CAMPAIGN) == {"pending": 4, "leased": 0, "done": 0, "failed": 0}
+
+
+def test_claims_are_lowest_index_first_and_exclusive(queue):
+    queue.enqueue(CAMPAIGN, _rows(5))
+    assert [row[0] for row in queue.claim(CAMPAIGN, "worker-1", limit=2)] == [0, 1]
+    assert [row[0] for row in queue.claim(CAMPAIGN, "worker-2", limit=10)] == [2, 3, 4]
+    assert queue.claim(CAMPAIGN, "worker-3") == []
+    assert queue.counts(CAMPAIGN)["leased"] == 5
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_cannot_complete(queue):
+    queue.enqueue(CAMPAIGN, _rows(1))
+    queue.claim(CAMPAIGN, "worker-1")
+    _expire_leases(queue)
+
+    assert queue.claim(CAMPAIGN, "worker-2") == _rows(1)
+    assert not queue.complete(CAMPAIGN, 0, "worker-1", {"verdict": "FALSE"})
+    assert queue.complete(CAMPAIGN, 0, "worker-2", {"verdict": "TRUE"})
+    assert [result for _, _, _, result, _ in queue.iter_results(CAMPAIGN)] == [{"verdict": "TRUE"}]
+
+
+def test_row_whose_lease_keeps_expiring_is_parked_as_failed(queue):
+    queue.enqueue(CAMPAIGN, _rows(1))
+    for attempt in range(queue.max_attempts):
+        assert queue.claim(CAMPAIGN, f"worker-{attempt}") == _rows(1)
+        _expire_leases(queue)
+
+    assert queue.claim(CAMPAIGN, "worker-last") == []
+    assert queue.counts(CAMPAIGN)["failed"] == 1
+
+
+def test_failed_row_is_retried_until_attempts_run_out(queue):
+    queue.enqueue(CAMPAIGN, _rows(1))
+    for attempt in range(queue.max_attempts):
+        assert queue.claim(CAMPAIGN, "worker-1") == _rows(1)
+        queue.fail(CAMPAIGN, 0, "worker-1", "boom")
+    assert queue.counts(CAMPAIGN) == {"pending": 0, "leased": 0, "done": 0, "failed": 1}
+    assert [error for *_, error in queue.iter_results(CAMPAIGN)] == ["boom"]
+
+
+def test_heartbeat_renews_only_unreleased_rows(queue):
+    queue.enqueue(CAMPAIGN, [(0, "https://a.com", ""), (1, "https://b.com", "")])
+    queue.claim(CAMPAIGN, "worker-1", limit=2)
+    claimed = {row: _lease_expires(queue, row) for row in (0, 1)}
+
+    with queue.heartbeat(CAMPAIGN, "worker-1", [0, 1], interval=0.05) as heartbeat:
+        heartbeat.release(1)
+        time.sleep(0.3)
+
+    assert _lease_expires(queue, 0) > claimed[0]
+    assert _lease_expires(queue, 1) == claimed[1]
+
+
+def test_heartbeat_keeps_rows_from_being_reclaimed(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.3)
+    try:
+        queue.enqueue(CAMPAIGN, [(0, "https://a.com", "")])
+        assert queue.claim(CAMPAIGN, "worker-1") == [(0, "https://a.com", "")]
+        with queue.heartbeat(CAMPAIGN, "worker-1", [0], interval=0.05):
+            time.sleep(0.6)
+            assert queue.claim(CAMPAIGN, "worker-2") == []
+        assert queue.complete(CAMPAIGN, 0, "worker-1", {"verdict": "FALSE"})
+    finally:
+        queue.close()
+
+
+def test_async_worker_drains_every_row_in_one_event_loop(tmp_path, monkeypatch, fake_client):
+    queue_path = str(tmp_path / "queue.sqlite3")
+    queue = WorkQueue(queue_path)
+    queue.enqueue(CAMPAIGN, [(index, f"https://company{index}.com", "") for index in range(7)])
+    queue.close()
+
+    loops = []
+    run_row = queue_run.run_row_async
+
+    async def recording_run_row(*args, **kwargs):
+        loops.append(asyncio.get_running_loop())
+        return await run_row(*args, **kwargs)
+
+    monkeypatch.setattr(queue_run, "run_row_async", recording_run_row)
+    completed = queue_run.run_queue_worker(CAMPAIGN, queue_path=queue_path, async_mode=True, concurrency=3)
+
+    assert completed == 7
+    assert len(loops) == 7
+    assert all(loop is loops[0] for loop in loops)
+
+
+def test_async_worker_claims_a_new_row_while_a_slow_row_runs(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "queue.sqlite3")
+    queue = WorkQueue(queue_path)
+    queue.enqueue(CAMPAIGN, _rows(4))
+    queue.close()
+    started, finished = [], []
+
+    async def fake_run_row(index, company_website, posts, settings, semaphore):
+        started.append(index)
+        if index == 0:
+            # The slow row: waits (up to 5s) until rows 2 and 3 went through the slot row 1 freed
+            for _ in range(500):
+                if 3 in finished:
+                    break
+                await asyncio.sleep(0.01)
+        finished.append(index)
+        return {"supports_israel_or_haram": False}
+
+    monkeypatch.setattr(queue_run, "run_row_async", fake_run_row)
+    completed = queue_run.run_queue_worker(
+        CAMPAIGN, queue_path=queue_path, async_mode=True, concurrency=2, poll_seconds=0.05
+    )
+
+    assert completed == 4
+    assert finished == [1, 2, 3, 0]
+
+
+def _claim_until_drained(queue_path, worker):
+    queue = WorkQueue(queue_path, lease_seconds=60)
+    claimed = []
+    try:
+        while rows := queue.claim(CAMPAIGN, worker, 2):
+            for index, _, _ in rows:
+                claimed.append(index)
+                assert queue.complete(CAMPAIGN, index, worker, {"worker": worker})
+    finally:
+        queue.close()
+    return claimed
+
+
+def test_processes_sharing_the_rollback_journal_claim_each_row_once(tmp_path):
+    queue_path = str(tmp_path / "queue.sqlite3")
+    queue = WorkQueue(queue_path)
+    queue.enqueue(CAMPAIGN, _rows(200))
+    assert queue._conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    try:
+        with multiprocessing.get_context("spawn").Pool(4) as pool:
+            claims = pool.starmap(_claim_until_drained, [(queue_path, f"worker-{n}") for n in range(4)])
+
+        assert sorted(index for claimed in claims for index in claimed) == list(range(200))
+        assert queue.counts(CAMPAIGN) == {"pending": 0, "leased": 0, "done": 200, "failed": 0}
+        # No WAL or shared-memory files, which hosts on a network filesystem could not share
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["queue.sqlite3"]
+    finally:
+        queue.close()
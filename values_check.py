@@ -1,8 +1,14 @@
+import logging
 import pandas as pd
-from gemini_web_search_query import search_with_gemini
+from gemini_web_search_query import search_with_gemini, search_with_gemini_async
+from resilient_call import GeminiCallError
+from structured_log import ensure_logging, get_logger, log_event
+from verdict_cache import VerdictCache
 
-def analyze_company_support(company_website_url: str, prospect_social_content: str):
-    instructions = f"""
+logger = get_logger("values_check")
+
+def _build_screening_prompt(company_website_url: str) -> str:
+    return f"""
 You are an AI assistant designed to identify if a company, based *entirely on comprehensive web search results*, has *any* confirmed business relationship with Israel or Israeli entities, OR engages in activities widely considered 'haram' (e.g., gambling, pork products, interest-based lending, explicit adult content).
 
 **Company to analyze (identified from website URL):** {company_website_url}
@@ -20,46 +26,83 @@ You are an AI assistant designed to identify if a company, based *entirely on co
 - Follow the TRUE/FALSE with a brief, concise sentence explaining the **main reason** for your decision. This explanation MUST directly state which condition(s) were met and provide a specific, concise detail from the web search results (e.g., "TRUE. The company has a partnership with [Israeli company name].").
 """
 
-    # Call Gemini and get response text
-    response_text = search_with_gemini(instructions, return_response=True)
 
+def _parse_verdict(response_text: str) -> bool:
     # Determine boolean from response start (case-insensitive)
-    is_true = response_text.strip().upper().startswith("TRUE")
+    return response_text.strip().upper().startswith("TRUE")
+
+
+def analyze_company_support(company_website_url: str, prospect_social_content: str, verdict_cache: VerdictCache | None = None):
+    def screen():
+        instructions = _build_screening_prompt(company_website_url)
+
+        # Call Gemini and get response text
+        response_text = search_with_gemini(instructions, return_response=True)
+
+        is_true = _parse_verdict(response_text)
+
+        return is_true, response_text
+
+    # Contacts at the same company share one verdict, keyed by domain
+    if verdict_cache is not None:
+        return verdict_cache.get_or_compute(company_website_url, screen)
+    return screen()
+
+
+async def analyze_company_support_async(company_website_url: str, prospect_social_content: str,
+                                        verdict_cache: VerdictCache | None = None):
+    async def screen():
+        instructions = _build_screening_prompt(company_website_url)
+
+        response_text = await search_with_gemini_async(instructions)
+
+        is_true = _parse_verdict(response_text)
+
+        return is_true, response_text
 
-    return is_true, response_text
+    if verdict_cache is not None:
+        return await verdict_cache.get_or_compute_async(company_website_url, screen)
+    return await screen()
 
 
-def process_excel_and_write_true_only(input_filename='apollo_data.xlsx', output_filename='apollo_results_true_only.xlsx'):
+def process_excel_and_write_true_only(input_filename='apollo_data.xlsx', output_filename='apollo_results_true_only.xlsx',
+                                      verdict_cache: VerdictCache | None = None,
+                                      limit_rows=3):  # limit row for testing, put -1 for full data
+    ensure_logging()
     # Read Excel file
     df = pd.read_excel(input_filename, usecols=["company website", "posts"], engine='openpyxl')
 
-    # Limit to first 3 rows for testing
-    df = df.head(3)
+    if limit_rows != -1:
+        df = df.head(limit_rows)
 
     results = []
     for index, row in df.iterrows():
         company_website_url = str(row["company website"]).strip()
         prospect_social_content = str(row["posts"]).strip()
 
-        print(f"\nProcessing row {index + 1}: {company_website_url}")
-        is_true, explanation = analyze_company_support(company_website_url, prospect_social_content)
+        log_event(logger, logging.DEBUG, "row started", sample=True, row=index + 1, website=company_website_url)
+        try:
+            is_true, explanation = analyze_company_support(company_website_url, prospect_social_content, verdict_cache)
+        except GeminiCallError as e:
+            log_event(logger, logging.WARNING, "screening failed, row skipped", row=index + 1, error=str(e))
+            continue
 
         if is_true:
-            print(f"Result TRUE - adding to output Excel")
+            log_event(logger, logging.INFO, "row done", sample=True, row=index + 1, verdict="TRUE")
             results.append({
                 "company website": company_website_url,
                 "posts": prospect_social_content,
                 "explanation": explanation
             })
         else:
-            print(f"Result FALSE - skipping writing to Excel")
+            log_event(logger, logging.INFO, "row done", sample=True, row=index + 1, verdict="FALSE")
 
     if results:
         results_df = pd.DataFrame(results)
         results_df.to_excel(output_filename, index=False)
-        print(f"\nResults saved to {output_filename}")
+        log_event(logger, logging.INFO, "output saved", filename=output_filename, rows=len(results))
     else:
-        print("\nNo TRUE results found. No Excel file created.")
+        log_event(logger, logging.INFO, "no TRUE results, no output file created")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_VERDICT_CACHE_PATH = "verdict_cache.sqlite3"
+DEFAULT_VERDICT_TTL_SECONDS = 30 * 24 * 3600
+
+
+def normalize_domain(company_website_url: str) -> str:
+    """
+    Reduce a company website to the domain used as the verdict key:
+    "https://www.Example.com/about/" -> "example.com". Returns "" for blank/missing URLs.
+    """
+    url = (company_website_url or "").strip().lower()
+    if not url or url in ("nan", "none"):
+        return ""
+    if "://" not in url:
+        url = "//" + url
+    host = urlsplit(url).hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    return host.rstrip(".")
+
+
+class VerdictCache:
+    """
+    SQLite store of screening verdicts (TRUE/FALSE plus explanation) keyed by normalized domain.
+
+    Entries expire after `ttl_seconds`. Concurrent async lookups for the same domain share a
+    single in-flight screening call, so repeated companies within a run are screened once.
+    """
+
+    def __init__(self, path: str = DEFAULT_VERDICT_CACHE_PATH, ttl_seconds: float | None = DEFAULT_VERDICT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " domain TEXT PRIMARY KEY, is_true INTEGER NOT NULL, explanation TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, domain: str):
+        """Return (is_true, explanation) for a fresh cached verdict, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT is_true, explanation, created_at FROM verdicts WHERE domain = ?", (domain,)
+            ).fetchone()
+        if row is None or (self.ttl_seconds is not None and time.time() - row[2] > self.ttl_seconds):
+            return None
+        return bool(row[0]), row[1]
+
+    def peek(self, company_website_url: str):
+        """Return the fresh cached verdict for the URL's domain without counting a hit, else None."""
+        domain = normalize_domain(company_website_url)
+        return self.get(domain) if domain else None
+
+    def set(self, domain: str, is_true: bool, explanation: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (domain, is_true, explanation, created_at) VALUES (?, ?, ?, ?)",
+                (domain, int(is_true), explanation, time.time()),
+            )
+
+    def get_or_compute(self, company_website_url: str, compute):
+        """Return the cached verdict for the URL's domain, or call compute() and store its result."""
+        domain = normalize_domain(company_website_url)
+        if not domain:
+            return compute()
+        cached = self.get(domain)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        is_true, explanation = compute()
+        self.set(domain, is_true, explanation)
+        return is_true, explanation
+
+    async def get_or_compute_async(self, company_website_url: str, compute):
+        """Async variant of get_or_compute(); compute is a zero-argument coroutine function."""
+        domain = normalize_domain(company_website_url)
+        if not domain:
+            return await compute()
+        cached = self.get(domain)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        pending = self._inflight.get(domain)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        pending = self._inflight[domain] = asyncio.ensure_future(compute())
+        # Store and forget the verdict when the call finishes, even if this caller was cancelled
+        pending.add_done_callback(lambda task: self._finish_inflight(domain, task))
+        return await asyncio.shield(pending)
+
+    def _finish_inflight(self, domain: str, task) -> None:
+        self._inflight.pop(domain, None)
+        if not task.cancelled() and task.exception() is None:
+            is_true, explanation = task.result()
+            self.set(domain, is_true, explanation)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,224 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_QUEUE_PATH = "work_queue.sqlite3"
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+# Rollback journal: works on network filesystems shared by several hosts, unlike WAL
+DEFAULT_JOURNAL_MODE = "DELETE"
+
+
+def default_worker_id() -> str:
+    """host:pid:random, unique per worker process even across machines sharing one queue."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """
+    Durable row queue in a single SQLite file, shared by any number of worker processes.
+
+    Workers claim rows with a lease; a row whose lease expires (its worker crashed or was
+    killed) becomes claimable again, up to `max_attempts` claims. Completing a row is only
+    accepted from the worker that currently holds its lease, so a slow worker whose row
+    was reclaimed cannot overwrite the new owner's result.
+
+    The file uses SQLite's rollback journal (journal_mode=DELETE) by default, which only
+    relies on byte-range file locks, so workers on several machines can share it over a
+    network filesystem with working POSIX locks (NFSv4 with lockd, SMB). Every claim,
+    completion and lease renewal is a short write transaction; writers on other hosts wait
+    up to a minute for the lock. Pass journal_mode="WAL" for faster writes when every worker
+    runs on one machine: WAL keeps its index in shared memory, which network filesystems
+    do not share between hosts, so remote workers would corrupt the queue. Filesystems
+    without working locks (many FUSE mounts, some NFS setups) cannot share the file at all;
+    give each machine its own campaign there.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, journal_mode: str = DEFAULT_JOURNAL_MODE):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        # Autocommit mode: every claim runs its own BEGIN IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS queue_rows (
+                campaign TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                company_website TEXT NOT NULL,
+                posts TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (campaign, row_index)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_rows_status ON queue_rows (campaign, status, row_index)")
+
+    def enqueue(self, campaign: str, rows) -> int:
+        """Add (row_index, company_website, posts) rows; rows already queued are left untouched. Returns rows added."""
+        before = self._conn.total_changes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO queue_rows (campaign, row_index, company_website, posts) VALUES (?, ?, ?, ?)",
+                ((campaign, index, company_website, posts) for index, company_website, posts in rows),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self._conn.total_changes - before
+
+    def claim(self, campaign: str, worker: str, limit: int = 1) -> list[tuple[int, str, str]]:
+        """
+        Lease up to `limit` rows, lowest index first: pending rows and rows whose lease has
+        expired. Returns [(row_index, company_website, posts)].
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows whose lease already expired too often are parked as failed instead of retried forever
+            self._conn.execute(
+                """
+                UPDATE queue_rows SET status = 'failed', worker = NULL, error = 'lease expired too many times'
+                WHERE campaign = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?
+                """,
+                (campaign, now, self.max_attempts),
+            )
+            rows = self._conn.execute(
+                """
+                SELECT row_index, company_website, posts FROM queue_rows
+                WHERE campaign = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY row_index LIMIT ?
+                """,
+                (campaign, now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                """
+                UPDATE queue_rows SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE campaign = ? AND row_index = ?
+                """,
+                ((worker, now + self.lease_seconds, campaign, row[0]) for row in rows),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def renew(self, campaign: str, worker: str, row_indices) -> None:
+        """Extend this worker's leases on rows that are taking longer than expected."""
+        self._conn.executemany(
+            "UPDATE queue_rows SET lease_expires = ? WHERE campaign = ? AND row_index = ? AND worker = ? AND status = 'leased'",
+            ((time.time() + self.lease_seconds, campaign, index, worker) for index in row_indices),
+        )
+
+    def heartbeat(self, campaign: str, worker: str, row_indices, interval: float | None = None) -> "LeaseHeartbeat":
+        """Keep this worker's leases on `row_indices` alive while they are processed (see LeaseHeartbeat)."""
+        return LeaseHeartbeat(self, campaign, worker, row_indices, interval)
+
+    def complete(self, campaign: str, row_index: int, worker: str, result: dict) -> bool:
+        """Store a row's result. Returns False if the lease was lost to another worker meanwhile."""
+        cursor = self._conn.execute(
+            """
+            UPDATE queue_rows SET status = 'done', result = ?, error = NULL, lease_expires = NULL
+            WHERE campaign = ? AND row_index = ? AND worker = ? AND status = 'leased'
+            """,
+            (json.dumps(result, ensure_ascii=False), campaign, row_index, worker),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, campaign: str, row_index: int, worker: str, error: str) -> None:
+        """Release a row after an error: back to pending while attempts remain, else failed."""
+        self._conn.execute(
+            """
+            UPDATE queue_rows
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                error = ?, worker = NULL, lease_expires = NULL
+            WHERE campaign = ? AND row_index = ? AND worker = ? AND status = 'leased'
+            """,
+            (self.max_attempts, error, campaign, row_index, worker),
+        )
+
+    def counts(self, campaign: str) -> dict:
+        """Number of rows per status ("pending", "leased", "done", "failed")."""
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for status, count in self._conn.execute(
+            "SELECT status, COUNT(*) FROM queue_rows WHERE campaign = ? GROUP BY status", (campaign,)
+        ):
+            counts[status] = count
+        return counts
+
+    def iter_results(self, campaign: str):
+        """Yield (row_index, company_website, posts, result or None, error) in row order."""
+        for index, company_website, posts, result, error in self._conn.execute(
+            "SELECT row_index, company_website, posts, result, error FROM queue_rows WHERE campaign = ? ORDER BY row_index",
+            (campaign,),
+        ):
+            yield index, company_website, posts, json.loads(result) if result else None, error
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class LeaseHeartbeat:
+    """
+    Renews a worker's leases from a background thread every `interval` seconds (a third of
+    the lease by default) while its claimed rows are processed, so a claim slowed down by
+    circuit-breaker waits and retries is not reclaimed and paid for again by another worker.
+    Use as a context manager, add() rows as they are claimed and release() each as it finishes. The thread has its own
+    SQLite connection, so it never runs inside the worker's transactions.
+    """
+
+    def __init__(self, queue: WorkQueue, campaign: str, worker: str, row_indices, interval: float | None = None):
+        self.path = queue.path
+        self.lease_seconds = queue.lease_seconds
+        self.journal_mode = queue.journal_mode
+        self.campaign = campaign
+        self.worker = worker
+        self.interval = interval if interval is not None else queue.lease_seconds / 3
+        self._rows = set(row_indices)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def add(self, row_indices) -> None:
+        """Start renewing rows claimed after the heartbeat started."""
+        with self._lock:
+            self._rows.update(row_indices)
+
+    def release(self, row_index: int) -> None:
+        """Stop renewing a row once its result (or failure) is stored."""
+        with self._lock:
+            self._rows.discard(row_index)
+
+    def _run(self) -> None:
+        queue = WorkQueue(self.path, lease_seconds=self.lease_seconds, journal_mode=self.journal_mode)
+        try:
+            while not self._stopped.wait(self.interval):
+                with self._lock:
+                    rows = list(self._rows)
+                if rows:
+                    queue.renew(self.campaign, self.worker, rows)
+        finally:
+            queue.close()
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stopped.set()
+        self._thread.join()